@@ -1,133 +1,132 @@
+import os
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 import time
+from config.config import (
+    RF_N_ESTIMATORS, RF_MAX_DEPTH, RF_MIN_SAMPLES_SPLIT, RF_MIN_SAMPLES_LEAF,
+    RETRAIN_WINDOW, RETRAIN_NEW_TREES, RETRAIN_STATE_DIR, AI_FEATURES
+)
+from ai.feature_store import FeatureStore
+from utils.event_log import get_event_log
+
+HORIZON = 5  # 标签的预测周期（K线数）
 
 class AIModels:
     def __init__(self):
+        # sklearn 按需导入，避免拖慢不需要模型的命令启动
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+        
+        # 模型只在这里按配置构建一次，训练时克隆
         self.rf_model = RandomForestClassifier(
-            n_estimators=200,
-            max_depth=15,
-            min_samples_split=10,
-            min_samples_leaf=5,
-            random_state=42
+            n_estimators=RF_N_ESTIMATORS,
+            max_depth=RF_MAX_DEPTH,
+            min_samples_split=RF_MIN_SAMPLES_SPLIT,
+            min_samples_leaf=RF_MIN_SAMPLES_LEAF,
+            random_state=42,
+            n_jobs=-1
         )
         self.scaler = StandardScaler()
         self.is_trained = False
+        self.train_info = {}
+        self.events = get_event_log()
+        self.features = FeatureStore()
+        self.feature_names = tuple(AI_FEATURES)
         
-    def _prepare_data(self, df):
-        """Prepare features for training"""
-        if len(df) < 10:  # Reduce minimum required data points
-            return np.array([]), np.array([])
-            
-        features = []
-        labels = []
+        # 增量训练：持久化的特征矩阵（滑动窗口）
+        self.train_X = np.empty((0, len(self.feature_names)))
+        self.train_y = np.empty(0, dtype=np.int64)
+        self.train_times = np.empty(0, dtype='datetime64[ns]')
+        self.retrain_count = 0
+        # 增量训练：指标的延续状态和最后几行指标帧（TradingStrategy.retrain_ai_models 维护）
+        self.indicator_state = None
         
-        # Calculate returns for labeling
-        returns = df['close'].pct_change()
+    def feature_frame(self, df):
+        """Feature matrix (one row per bar) of self.feature_names from the feature store
+
+        Row j uses no data after bar j; rows inside the warm-up period contain NaN.
+        """
+        return self.features.compute(df, self.feature_names)
         
-        # Calculate additional features
-        volatility = df['close'].rolling(window=10).std()  # Reduce window size
-        volume_ma = df['volume'].rolling(window=10).mean()
-        price_ma = df['close'].rolling(window=10).mean()
+    def feature_matrix(self, df):
+        """(X, y) for df; feature columns are cached in the feature store and
+        shared by the random forest, the ensemble and prediction"""
+        return self._prepare_data(df)
         
-        for i in range(10, len(df)-5):  # Reduce lookback and prediction windows
-            window = df.iloc[i-10:i]
-            future_window = df.iloc[i:i+5]
-            
-            if len(window) < 10 or len(future_window) < 5:
-                continue
-                
-            try:
-                # Create more focused features
-                feature = [
-                    # Price momentum
-                    window['close'].pct_change().mean(),
-                    window['close'].pct_change().std(),
-                    
-                    # Volume analysis
-                    window['volume'].pct_change().mean(),
-                    
-                    # Technical indicators
-                    window['rsi'].iloc[-1],
-                    window['macd'].iloc[-1],
-                    window['macd_hist'].iloc[-1],
-                    
-                    # Price relative to moving averages
-                    (window['close'].iloc[-1] - window['ma'].iloc[-1]) / window['ma'].iloc[-1],
-                    
-                    # Bollinger Bands
-                    (window['close'].iloc[-1] - window['bb_middle'].iloc[-1]) / window['bb_std'].iloc[-1],
-                    
-                    # Volatility
-                    volatility.iloc[i] / window['close'].iloc[-1]
-                ]
-                
-                # Calculate future return for labeling
-                future_return = (future_window['close'].iloc[-1] / window['close'].iloc[-1] - 1)
-                
-                # Create label based on future return with fixed threshold
-                threshold = 0.01  # 1% threshold
-                if future_return > threshold:
-                    label = 1  # Buy
-                elif future_return < -threshold:
-                    label = 0  # Sell
-                else:
-                    label = 2  # Hold
-                
-                features.append(feature)
-                labels.append(label)
-                
-            except (KeyError, IndexError, ZeroDivisionError) as e:
-                continue
-            
-        if not features:  # No valid features
-            return np.array([]), np.array([])
+    def latest_features(self, df):
+        """Feature row of the most recent bar (no label needed), None if incomplete"""
+        if len(df) < self.features.lookback(self.feature_names):
+            return None
+        X = self.features.latest(df, self.feature_names)
+        if not np.isfinite(X).all():
+            return None
+        return X
+        
+    def labelled_rows(self, df):
+        """Features, labels and bar positions of every buy/sell sample in df
+
+        Label: return over the next HORIZON bars after the window, 1 (buy)
+        above +1%, 0 (sell) below -1%; bars in between are dropped.
+        """
+        lookback = self.features.lookback(self.feature_names)
+        if len(df) < lookback + HORIZON:
+            return np.empty((0, len(self.feature_names))), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
             
-        X = np.array(features)
-        y = np.array(labels)
+        features = self.feature_frame(df)
+        close = df['close'].values
+        future_return = np.full(len(close), np.nan)
+        future_return[:-HORIZON] = close[HORIZON:] / close[:-HORIZON] - 1
+        
+        rows = np.arange(lookback - 1, len(close) - HORIZON)
+        threshold = 0.01  # 1% threshold
+        labels = np.where(future_return[rows] > threshold, 1,
+                          np.where(future_return[rows] < -threshold, 0, 2))
         
         # Remove hold signals
-        mask = y != 2
-        X = X[mask]
-        y = y[mask]
+        mask = labels != 2
+        return features[rows[mask]], labels[mask], rows[mask]
         
+    def _prepare_data(self, df):
+        """Prepare features for training"""
+        X, y, _ = self.labelled_rows(df)
         if len(X) < 10:  # Ensure minimum number of samples
             return np.array([]), np.array([])
-        
         return X, y
         
     def train_random_forest(self, df):
         """Train the random forest model"""
-        start_time = time.time()
-        
-        X, y = self._prepare_data(df)
+        X, y = self.feature_matrix(df)
         if len(X) == 0 or len(y) == 0:
             print("Not enough data for training")
             return 0
             
+        accuracy = self.fit(X, y)
+        if self.is_trained:
+            info = self.train_info
+            print(f"Training completed in {info['time']:.2f} seconds")
+            print(f"Number of training samples: {info['samples']}")
+            print(f"Class distribution: Buy signals: {info['buy']}, Sell signals: {info['sell']}")
+        return accuracy
+        
+    def fit(self, X, y):
+        """Fit scaler and random forest on a feature matrix (no output); returns the test accuracy"""
+        from sklearn.base import clone
+        from sklearn.model_selection import train_test_split
+        
+        start_time = time.time()
         try:
             # Scale features
-            X = self.scaler.fit_transform(X)
+            X_scaled = self.scaler.fit_transform(X)
             
             # Split data with shuffle
             X_train, X_test, y_train, y_test = train_test_split(
-                X, y, 
+                X_scaled, y, 
                 test_size=0.2,
                 shuffle=True,
                 random_state=42
             )
             
-            # Update model with simpler parameters
-            self.rf_model = RandomForestClassifier(
-                n_estimators=100,
-                max_depth=5,
-                min_samples_split=5,
-                min_samples_leaf=2,
-                random_state=42,
-                n_jobs=-1
-            )
+            # Fresh copy of the configured model
+            self.rf_model = clone(self.rf_model)
             
             # Train model
             self.rf_model.fit(X_train, y_train)
@@ -136,30 +135,165 @@ class AIModels:
             accuracy = self.rf_model.score(X_test, y_test)
             self.is_trained = True
             
-            training_time = time.time() - start_time
-            print(f"Training completed in {training_time:.2f} seconds")
-            print(f"Number of training samples: {len(X_train)}")
-            print(f"Class distribution: Buy signals: {sum(y == 1)}, Sell signals: {sum(y == 0)}")
-            
+            self.train_info = {
+                'accuracy': round(accuracy * 100, 2),
+                'time': round(time.time() - start_time, 2),
+                'samples': len(X_train),
+                'buy': int(sum(y == 1)),
+                'sell': int(sum(y == 0))
+            }
             return accuracy
             
         except Exception as e:
-            print(f"Error during training: {e}")
+            self.events.error('train_error', model='random_forest', error=repr(e))
             return 0
         
-    def predict(self, df):
-        """Make predictions"""
-        if not self.is_trained:
+    @property
+    def last_sample_time(self):
+        """Bar time of the newest stored training sample (None if empty)"""
+        return self.train_times[-1] if len(self.train_times) else None
+        
+    def append_features(self, df, window=RETRAIN_WINDOW):
+        """Append samples of newly labelled bars in df to the stored feature matrix
+
+        df is an indicator frame covering at least the new bars plus the
+        feature lookback and HORIZON bars before them. Samples at or before the newest
+        stored one are skipped; the store is then trimmed to the last
+        `window` samples. Returns the number of samples added.
+        """
+        X, y, rows = self.labelled_rows(df)
+        times = df.index.values.astype('datetime64[ns]')[rows]
+        last = self.last_sample_time
+        if last is not None:
+            new = times > last
+            X, y, times = X[new], y[new], times[new]
+        if len(y):
+            self.train_X = np.concatenate([self.train_X, X])[-window:]
+            self.train_y = np.concatenate([self.train_y, y])[-window:]
+            self.train_times = np.concatenate([self.train_times, times])[-window:]
+        return len(y)
+        
+    def retrain_incremental(self, df, new_trees=RETRAIN_NEW_TREES, window=RETRAIN_WINDOW):
+        """Update the forest with the bars of df that were not seen yet
+
+        The first call fits the scaler and a full forest on the stored
+        window. Later calls score the current forest on the new samples
+        (out-of-sample accuracy), then grow new_trees trees with warm_start
+        on the window and drop the oldest trees beyond RF_N_ESTIMATORS. The
+        scaler stays fixed so existing trees keep their input space. Cost is
+        bounded by window and new_trees, not by the length of history.
+        """
+        from sklearn.base import clone
+        
+        start_time = time.time()
+        n_new = self.append_features(df, window)
+        if len(np.unique(self.train_y)) < 2:
+            self.events.warning('train_skipped', model='random_forest', reason='not enough data')
             return 0
+        if self.is_trained and n_new == 0:
+            return self.train_info.get('accuracy', 0) / 100
+        
+        accuracy = None
+        if not self.is_trained:
+            self.scaler.fit(self.train_X)
+            self.rf_model = clone(self.rf_model).set_params(warm_start=True)
+            self.rf_model.fit(self.scaler.transform(self.train_X), self.train_y)
+            self.is_trained = True
+        else:
+            X_new = self.scaler.transform(self.train_X[-n_new:])
+            accuracy = float(self.rf_model.score(X_new, self.train_y[-n_new:]))
+            self.retrain_count += 1
+            rf = self.rf_model
+            # 新树使用新的随机种子，避免裁剪后与旧树重复
+            rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + new_trees,
+                          random_state=42 + self.retrain_count)
+            rf.fit(self.scaler.transform(self.train_X), self.train_y)
+            rf.estimators_ = rf.estimators_[-RF_N_ESTIMATORS:]
+            rf.set_params(n_estimators=len(rf.estimators_))
+        
+        self.train_info = {
+            'accuracy': round(accuracy * 100, 2) if accuracy is not None else 0,
+            'time': round(time.time() - start_time, 2),
+            'samples': len(self.train_y),
+            'buy': int(np.sum(self.train_y == 1)),
+            'sell': int(np.sum(self.train_y == 0)),
+            'added': n_new,
+            'trees': len(self.rf_model.estimators_)
+        }
+        self.events.info('train', model='random_forest', mode='incremental', **self.train_info)
+        return accuracy or 0
+        
+    def save_state(self, state_dir=RETRAIN_STATE_DIR):
+        """Persist the feature matrix (npz) and the fitted forest + scaler + indicator state (joblib)"""
+        import joblib
+        os.makedirs(state_dir, exist_ok=True)
+        features_path = os.path.join(state_dir, 'features.npz')
+        model_path = os.path.join(state_dir, 'random_forest.joblib')
+        # 先写临时文件再替换，避免中断时留下半个文件
+        with open(features_path + '.tmp', 'wb') as f:
+            np.savez(f, X=self.train_X, y=self.train_y, times=self.train_times.astype(np.int64))
+        os.replace(features_path + '.tmp', features_path)
+        joblib.dump({
+            'rf_model': self.rf_model,
+            'scaler': self.scaler,
+            'is_trained': self.is_trained,
+            'retrain_count': self.retrain_count,
+            'indicator_state': self.indicator_state
+        }, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+        return [features_path, model_path]
+        
+    def load_state(self, state_dir=RETRAIN_STATE_DIR):
+        """Restore what save_state wrote; returns False if there is no saved state"""
+        import joblib
+        features_path = os.path.join(state_dir, 'features.npz')
+        model_path = os.path.join(state_dir, 'random_forest.joblib')
+        if not (os.path.exists(features_path) and os.path.exists(model_path)):
+            return False
+        with np.load(features_path) as data:
+            self.train_X = data['X']
+            self.train_y = data['y']
+            self.train_times = data['times'].astype('datetime64[ns]')
+        state = joblib.load(model_path)
+        self.rf_model = state['rf_model']
+        self.scaler = state['scaler']
+        self.is_trained = state['is_trained']
+        self.retrain_count = state['retrain_count']
+        self.indicator_state = state.get('indicator_state')  # 旧版本的状态没有，下次重训全量计算
+        return True
+        
+    def predict_proba(self, df):
+        """Buy probability for the latest bar (single-row path), NaN if unavailable"""
+        if not self.is_trained:
+            return np.nan
             
         try:
-            X, _ = self._prepare_data(df.iloc[-11:])
-            if len(X) == 0:
-                return 0
-                
+            X = self.latest_features(df)
+            if X is None:
+                return np.nan
             X = self.scaler.transform(X)
-            pred = self.rf_model.predict(X)
-            return pred[-1]
+            classes = list(self.rf_model.classes_)
+            return float(self.rf_model.predict_proba(X)[0, classes.index(1)])
         except Exception as e:
-            print(f"Error during prediction: {e}")
-            return 0 
\ No newline at end of file
+            self.events.warning('predict_error', model='random_forest', error=repr(e))
+            return np.nan
+            
+    def predict_proba_frame(self, df):
+        """Buy probability for every bar of df in one batch (NaN during warm-up)"""
+        probs = np.full(len(df), np.nan)
+        if not self.is_trained:
+            return probs
+        features = self.feature_frame(df)
+        valid = np.isfinite(features).all(axis=1)
+        if valid.any():
+            probs[valid] = self.predict_rows(features[valid])
+        return probs
+        
+    def predict_rows(self, X):
+        """Buy probability of each row of a (finite) feature matrix"""
+        classes = list(self.rf_model.classes_)
+        return self.rf_model.predict_proba(self.scaler.transform(X))[:, classes.index(1)]
+        
+    def predict(self, df):
+        """Make predictions: 1 = buy, 0 = sell"""
+        return int(self.predict_proba(df) > 0.5)
@@ -0,0 +1,272 @@
+import time
+import numpy as np
+from config.config import (
+    RL_STATE_SIZE, RL_ACTION_SIZE, RL_MEMORY_SIZE, RL_BATCH_SIZE,
+    RL_GAMMA, RL_EPSILON, RL_EPSILON_MIN, RL_EPSILON_DECAY,
+    RL_HIDDEN_UNITS, RL_LEARNING_RATE, RL_TARGET_UPDATE, RL_TRAIN_STEPS,
+    CHECKPOINT_INTERVAL_SECONDS
+)
+from utils.checkpoint import CheckpointTimer, load_checkpoint
+from utils.event_log import get_event_log
+
+
+class ReplayBuffer:
+    """Fixed-size experience replay stored in preallocated arrays
+
+    Transitions from all environments of a vectorized step are written in
+    one slice assignment; once full, the oldest entries are overwritten.
+    """
+
+    def __init__(self, capacity=RL_MEMORY_SIZE, state_size=RL_STATE_SIZE, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.pos = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, states, actions, rewards, next_states, dones):
+        """Append a batch of transitions (one row per environment)"""
+        k = len(actions)
+        if k > self.capacity:
+            states, actions, rewards, next_states, dones = (
+                a[-self.capacity:] for a in (states, actions, rewards, next_states, dones))
+            k = self.capacity
+        idx = (self.pos + np.arange(k)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+        self.pos = (self.pos + k) % self.capacity
+        self.size = min(self.size + k, self.capacity)
+
+    def sample(self, batch_size=RL_BATCH_SIZE):
+        idx = self.rng.integers(0, self.size, size=batch_size)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx])
+
+
+class DQNAgent:
+    """Deep Q-Network agent with a NumPy MLP (CPU only)
+
+    Two ReLU hidden layers, Huber loss, Adam, a periodically synced target
+    network and epsilon-greedy exploration decayed by RL_EPSILON_DECAY after
+    every gradient step. act() takes a batch of observations, one per
+    environment of a TradingEnv.
+    """
+
+    def __init__(self, state_size=RL_STATE_SIZE, action_size=RL_ACTION_SIZE,
+                 hidden_units=RL_HIDDEN_UNITS, learning_rate=RL_LEARNING_RATE,
+                 gamma=RL_GAMMA, epsilon=RL_EPSILON, epsilon_min=RL_EPSILON_MIN,
+                 epsilon_decay=RL_EPSILON_DECAY, target_update=RL_TARGET_UPDATE,
+                 memory_size=RL_MEMORY_SIZE, seed=None):
+        self.state_size = state_size
+        self.action_size = action_size
+        self.learning_rate = learning_rate
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.epsilon_min = epsilon_min
+        self.epsilon_decay = epsilon_decay
+        self.target_update = target_update
+        self.rng = np.random.default_rng(seed)
+        self.memory = ReplayBuffer(memory_size, state_size, seed=self.rng.integers(2**32))
+        self.train_steps = 0
+        self.train_info = {}
+        self.events = get_event_log()
+
+        sizes = (state_size, hidden_units, hidden_units, action_size)
+        self.params = {}
+        for layer, (n_in, n_out) in enumerate(zip(sizes[:-1], sizes[1:])):
+            self.params[f'W{layer}'] = self.rng.normal(0, np.sqrt(2.0 / n_in), (n_in, n_out))
+            self.params[f'b{layer}'] = np.zeros(n_out)
+        self.n_layers = len(sizes) - 1
+        self.target_params = {k: v.copy() for k, v in self.params.items()}
+        self._adam_m = {k: np.zeros_like(v) for k, v in self.params.items()}
+        self._adam_v = {k: np.zeros_like(v) for k, v in self.params.items()}
+        self._adam_t = 0
+
+    def _forward(self, states, params):
+        """Q values and the layer inputs needed for backprop"""
+        activations = [states]
+        x = states
+        for layer in range(self.n_layers):
+            x = x @ params[f'W{layer}'] + params[f'b{layer}']
+            if layer < self.n_layers - 1:
+                x = np.maximum(x, 0.0)
+            activations.append(x)
+        return x, activations
+
+    def q_values(self, states, target=False):
+        states = np.asarray(states, dtype=np.float64)
+        return self._forward(states, self.target_params if target else self.params)[0]
+
+    def act(self, states, explore=True):
+        """Epsilon-greedy actions for a batch of observations"""
+        actions = self.q_values(states).argmax(axis=1)
+        if explore and self.epsilon > 0:
+            random = self.rng.random(len(actions)) < self.epsilon
+            actions[random] = self.rng.integers(0, self.action_size, size=int(random.sum()))
+        return actions
+
+    def remember(self, states, actions, rewards, next_states, dones):
+        self.memory.add(states, actions, rewards, next_states, dones)
+
+    def _adam_step(self, grads, beta1=0.9, beta2=0.999, eps=1e-8):
+        self._adam_t += 1
+        for k, g in grads.items():
+            self._adam_m[k] = beta1 * self._adam_m[k] + (1 - beta1) * g
+            self._adam_v[k] = beta2 * self._adam_v[k] + (1 - beta2) * g * g
+            m_hat = self._adam_m[k] / (1 - beta1 ** self._adam_t)
+            v_hat = self._adam_v[k] / (1 - beta2 ** self._adam_t)
+            self.params[k] -= self.learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+    def replay(self, batch_size=RL_BATCH_SIZE):
+        """One gradient step on a sampled minibatch, returns the loss"""
+        if len(self.memory) < batch_size:
+            return None
+        states, actions, rewards, next_states, dones = self.memory.sample(batch_size)
+        states = states.astype(np.float64)
+        next_q = self.q_values(next_states, target=True).max(axis=1)
+        targets = rewards + self.gamma * next_q * (1 - dones)
+
+        q, activations = self._forward(states, self.params)
+        rows = np.arange(batch_size)
+        error = q[rows, actions] - targets
+        # Huber 损失的梯度：误差截断到 [-1, 1]
+        dq = np.zeros_like(q)
+        dq[rows, actions] = np.clip(error, -1.0, 1.0) / batch_size
+
+        grads = {}
+        delta = dq
+        for layer in reversed(range(self.n_layers)):
+            grads[f'W{layer}'] = activations[layer].T @ delta
+            grads[f'b{layer}'] = delta.sum(axis=0)
+            if layer > 0:
+                delta = (delta @ self.params[f'W{layer}'].T) * (activations[layer] > 0)
+        self._adam_step(grads)
+
+        self.train_steps += 1
+        if self.train_steps % self.target_update == 0:
+            self.target_params = {k: v.copy() for k, v in self.params.items()}
+        if self.epsilon > self.epsilon_min:
+            self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay)
+        abs_error = np.abs(error)
+        return float(np.where(abs_error <= 1, 0.5 * error ** 2, abs_error - 0.5).mean())
+
+    def get_state(self):
+        """(arrays, meta) with the networks, optimizer, replay buffer and RNG states"""
+        memory = self.memory
+        arrays = {f'param_{k}': v for k, v in self.params.items()}
+        arrays.update({f'target_{k}': v for k, v in self.target_params.items()})
+        arrays.update({f'adam_m_{k}': v for k, v in self._adam_m.items()})
+        arrays.update({f'adam_v_{k}': v for k, v in self._adam_v.items()})
+        arrays.update({f'memory_{k}': getattr(memory, k)
+                       for k in ('states', 'next_states', 'actions', 'rewards', 'dones')})
+        meta = {
+            'epsilon': self.epsilon, 'train_steps': self.train_steps, 'adam_t': self._adam_t,
+            'memory_pos': memory.pos, 'memory_size': memory.size,
+            'rng': self.rng.bit_generator.state, 'memory_rng': memory.rng.bit_generator.state
+        }
+        return arrays, meta
+
+    def set_state(self, arrays, meta):
+        """Restore get_state()"""
+        for k in self.params:
+            self.params[k] = arrays[f'param_{k}'].copy()
+            self.target_params[k] = arrays[f'target_{k}'].copy()
+            self._adam_m[k] = arrays[f'adam_m_{k}'].copy()
+            self._adam_v[k] = arrays[f'adam_v_{k}'].copy()
+        memory = self.memory
+        for k in ('states', 'next_states', 'actions', 'rewards', 'dones'):
+            setattr(memory, k, arrays[f'memory_{k}'].copy())
+        memory.pos, memory.size = meta['memory_pos'], meta['memory_size']
+        memory.rng.bit_generator.state = meta['memory_rng']
+        self.rng.bit_generator.state = meta['rng']
+        self.epsilon, self.train_steps, self._adam_t = meta['epsilon'], meta['train_steps'], meta['adam_t']
+
+    def _checkpoint(self, timer, path, env, step, episode_returns, losses):
+        arrays, meta = self.get_state()
+        env_arrays, env_rng = env.get_state()
+        arrays.update({f'env_{k}': v for k, v in env_arrays.items()})
+        arrays['episode_returns'] = np.asarray(episode_returns, dtype=np.float64)
+        arrays['losses'] = np.asarray(losses, dtype=np.float64)
+        meta.update(step=step, env_rng=env_rng, n_envs=env.n_envs)
+        timer.save(path, arrays, meta)
+
+    def train(self, env, steps=None, batch_size=RL_BATCH_SIZE, replays_per_step=1,
+              checkpoint_path=None, resume_from=None, checkpoint_interval=CHECKPOINT_INTERVAL_SECONDS):
+        """Collect experience from a vectorized TradingEnv and learn from it
+
+        Every environment step adds env.n_envs transitions to the replay
+        buffer and is followed by replays_per_step gradient steps.
+        checkpoint_path: snapshot agent, replay buffer, environment and RNG
+        states at most every checkpoint_interval seconds and at the end.
+        resume_from: continue an interrupted run from such a snapshot (same
+        env and steps); the outcome is identical to an uninterrupted run.
+        """
+        steps = steps or RL_TRAIN_STEPS
+        start_time = time.time()
+        timer = CheckpointTimer(checkpoint_interval)
+        checkpoint = load_checkpoint(resume_from) if resume_from else None
+        if checkpoint is not None:
+            arrays, meta = checkpoint
+            if meta['n_envs'] != env.n_envs:
+                raise ValueError(f"checkpoint {resume_from} was written with {meta['n_envs']} environments")
+            self.set_state(arrays, meta)
+            obs = env.set_state({k[4:]: v for k, v in arrays.items() if k.startswith('env_')}, meta['env_rng'])
+            episode_returns = arrays['episode_returns'].tolist()
+            losses = arrays['losses'].tolist()
+            first = meta['step']
+            self.events.info('resume', model='dqn', path=resume_from, step=first)
+        else:
+            obs = env.reset()
+            episode_returns = []
+            losses = []
+            first = 0
+        for step in range(first, steps):
+            if checkpoint_path and step > first and timer.due():
+                self._checkpoint(timer, checkpoint_path, env, step, episode_returns, losses)
+            actions = self.act(obs)
+            next_obs, rewards, dones, info = env.step(actions)
+            self.remember(obs, actions, rewards, next_obs, dones)
+            obs = next_obs
+            if 'episode_returns' in info:
+                episode_returns.extend(info['episode_returns'].tolist())
+            for _ in range(replays_per_step):
+                loss = self.replay(batch_size)
+                if loss is not None:
+                    losses.append(loss)
+        if checkpoint_path:
+            self._checkpoint(timer, checkpoint_path, env, steps, episode_returns, losses)
+
+        recent = episode_returns[-env.n_envs:]
+        self.train_info = {
+            'time': round(time.time() - start_time, 2),
+            'transitions': steps * env.n_envs,
+            'episodes': len(episode_returns),
+            'mean_episode_return': round(float(np.mean(recent)) * 100, 2) if recent else 0.0,
+            'loss': round(float(np.mean(losses[-100:])), 6) if losses else None,
+            'epsilon': round(self.epsilon, 4)
+        }
+        self.events.info('train', model='dqn', **self.train_info)
+        return self.train_info
+
+    def evaluate(self, env):
+        """Run the greedy policy once over a single-episode env, returns the equity curve"""
+        obs = env.reset()
+        equity = [float(env.equity()[0])]
+        for _ in range(env.episode_length):
+            obs, _, done, info = env.step(self.act(obs, explore=False))
+            if done[0]:
+                # 回合结束后环境已自动重置，取结束时的权益
+                equity.append(1.0 + float(info['episode_returns'][0]))
+                break
+            equity.append(float(env.equity()[0]))
+        return np.array(equity)
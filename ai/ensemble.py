@@ -0,0 +1,153 @@
+"""Model registry and weighted ensemble
+
+Every registered model is trained on the same feature matrix (see
+AIModels.feature_matrix) in its own thread; the per-model buy
+probabilities are blended into one score with ENSEMBLE_WEIGHTS.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config.config import (
+    RF_N_ESTIMATORS, RF_MAX_DEPTH, RF_MIN_SAMPLES_SPLIT, RF_MIN_SAMPLES_LEAF,
+    ENSEMBLE_MODELS, ENSEMBLE_WEIGHTS, ENSEMBLE_N_JOBS
+)
+from utils.event_log import get_event_log
+
+
+def _random_forest(n_jobs):
+    from sklearn.ensemble import RandomForestClassifier
+    return RandomForestClassifier(
+        n_estimators=RF_N_ESTIMATORS,
+        max_depth=RF_MAX_DEPTH,
+        min_samples_split=RF_MIN_SAMPLES_SPLIT,
+        min_samples_leaf=RF_MIN_SAMPLES_LEAF,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+
+
+def _gradient_boosting(n_jobs):
+    from sklearn.ensemble import GradientBoostingClassifier
+    return GradientBoostingClassifier(
+        n_estimators=100,
+        max_depth=3,
+        learning_rate=0.05,
+        subsample=0.8,
+        random_state=42
+    )
+
+
+def _logistic(n_jobs):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    return make_pipeline(StandardScaler(), LogisticRegression(C=1.0, max_iter=1000))
+
+
+# name -> (factory(n_jobs) -> unfitted estimator, 是否使用多核)
+MODEL_REGISTRY = {
+    'random_forest': (_random_forest, True),
+    'gradient_boosting': (_gradient_boosting, False),
+    'logistic': (_logistic, False)
+}
+
+
+def register_model(name, factory, parallel=False):
+    """Add a model to the registry; factory(n_jobs) must return an unfitted classifier"""
+    MODEL_REGISTRY[name] = (factory, parallel)
+
+
+def split_cores(names, n_jobs=None):
+    """n_jobs per model so that concurrent training does not oversubscribe cores
+
+    Single-threaded models get one core each; the remaining cores are split
+    evenly between the models that can use several.
+    """
+    total = n_jobs or os.cpu_count() or 1
+    parallel = [n for n in names if MODEL_REGISTRY[n][1]]
+    serial = len(names) - len(parallel)
+    share = max(1, (total - serial) // max(len(parallel), 1))
+    return {n: (share if MODEL_REGISTRY[n][1] else 1) for n in names}
+
+
+class ModelEnsemble:
+    """Weighted blend of registered classifiers (label 1 = buy, 0 = sell)"""
+
+    def __init__(self, models=ENSEMBLE_MODELS, weights=ENSEMBLE_WEIGHTS, n_jobs=ENSEMBLE_N_JOBS):
+        unknown = [m for m in models if m not in MODEL_REGISTRY]
+        if unknown:
+            raise ValueError(f"unknown models: {unknown}")
+        self.names = list(models)
+        self.weights = {m: float(weights.get(m, 1.0)) for m in self.names}
+        self.n_jobs = n_jobs
+        self.models = {}
+        self.is_trained = False
+        self.train_info = {}
+        self.events = get_event_log()
+
+    def _fit_one(self, name, n_jobs, X_train, y_train, X_test, y_test):
+        factory, _ = MODEL_REGISTRY[name]
+        start = time.time()
+        model = factory(n_jobs)
+        model.fit(X_train, y_train)
+        return name, model, float(model.score(X_test, y_test)), time.time() - start
+
+    def train(self, X, y, test_size=0.2):
+        """Train all models concurrently, returns the blended test accuracy"""
+        from sklearn.model_selection import train_test_split
+        start_time = time.time()
+        if len(X):
+            # 梯度提升和线性模型不接受 NaN（指标预热期）
+            finite = np.isfinite(X).all(axis=1)
+            X, y = X[finite], y[finite]
+        if len(X) == 0 or len(np.unique(y)) < 2:
+            self.events.warning('train_skipped', model='ensemble', reason='not enough data')
+            return 0
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, shuffle=True, random_state=42
+        )
+        cores = split_cores(self.names, self.n_jobs)
+        self.models = {}
+        per_model = {}
+        # 树模型的 Cython 训练过程释放 GIL，线程即可并行
+        with ThreadPoolExecutor(max_workers=len(self.names)) as pool:
+            futures = [pool.submit(self._fit_one, name, cores[name], X_train, y_train, X_test, y_test)
+                       for name in self.names]
+            for future in futures:
+                try:
+                    name, model, accuracy, elapsed = future.result()
+                except Exception as e:
+                    self.events.error('train_error', model='ensemble', error=repr(e))
+                    continue
+                self.models[name] = model
+                per_model[name] = {'accuracy': round(accuracy * 100, 2), 'time': round(elapsed, 2)}
+
+        if not self.models:
+            return 0
+        self.is_trained = True
+        accuracy = float(((self.predict_proba(X_test) > 0.5).astype(int) == y_test).mean())
+        self.train_info = {
+            'accuracy': round(accuracy * 100, 2),
+            'time': round(time.time() - start_time, 2),
+            'samples': len(X_train),
+            'buy': int(np.sum(y == 1)),
+            'sell': int(np.sum(y == 0)),
+            'models': per_model
+        }
+        return accuracy
+
+    def predict_proba(self, X):
+        """Weighted average buy probability per row"""
+        X = np.atleast_2d(X)
+        if not self.is_trained:
+            return np.full(len(X), 0.5)
+        total = 0.0
+        blended = np.zeros(len(X))
+        for name, model in self.models.items():
+            w = self.weights[name]
+            classes = list(model.classes_)
+            blended += w * model.predict_proba(X)[:, classes.index(1)]
+            total += w
+        return blended / total if total > 0 else np.full(len(X), 0.5)
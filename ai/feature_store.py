@@ -0,0 +1,196 @@
+"""Declarative feature registry and cached feature computation
+
+A feature is a name, the names it depends on (other features or columns of
+the indicator frame from TradingStrategy.calculate_indicators), a vectorized
+compute function and the number of bars it needs to produce its last value.
+FeatureStore resolves the dependency order, computes only what the requested
+features need and caches every computed column per dataset fingerprint, so
+training, batch prediction and streaming prediction share one code path.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config.config import FEATURE_CACHE_SIZE
+
+
+class Feature:
+    def __init__(self, name, compute, deps=(), lookback=1):
+        self.name = name
+        self.compute = compute  # compute(*dep_series) -> array-like of len(df)
+        self.deps = tuple(deps)
+        self.lookback = lookback  # bars of its inputs needed for the last value
+
+
+FEATURE_REGISTRY = {}
+
+
+def register_feature(name, deps=(), lookback=1, registry=None):
+    """Decorator: register compute(*deps) under name"""
+    registry = FEATURE_REGISTRY if registry is None else registry
+
+    def decorator(compute):
+        registry[name] = Feature(name, compute, deps, lookback)
+        return compute
+    return decorator
+
+
+def fingerprint(df, columns):
+    """Content hash of the index and the given columns"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(df.index.values).tobytes())
+    for col in columns:
+        h.update(col.encode())
+        h.update(np.ascontiguousarray(df[col].values, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+class FeatureStore:
+    """Computes registered features for indicator frames with a per-dataset cache"""
+
+    def __init__(self, registry=None, cache_size=FEATURE_CACHE_SIZE):
+        self.registry = FEATURE_REGISTRY if registry is None else registry
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # fingerprint -> {name: ndarray}
+        self._lock = threading.Lock()
+
+    def resolve(self, names):
+        """Features needed for names in dependency order (columns excluded)"""
+        order = []
+        state = {}  # name -> 1 visiting, 2 done
+
+        def visit(name, path):
+            if name not in self.registry:
+                return  # 指标列，直接从 DataFrame 读取
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"feature dependency cycle: {' -> '.join(path + [name])}")
+            state[name] = 1
+            for dep in self.registry[name].deps:
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in names:
+            visit(name, [])
+        return order
+
+    def columns(self, names):
+        """Input columns of the indicator frame the features depend on"""
+        cols = []
+        for name in self.resolve(names):
+            for dep in self.registry[name].deps:
+                if dep not in self.registry and dep not in cols:
+                    cols.append(dep)
+        for name in names:
+            if name not in self.registry and name not in cols:
+                cols.append(name)
+        return cols
+
+    def lookback(self, names):
+        """Bars of history needed to compute the last row of every feature in names"""
+        memo = {}
+
+        def need(name):
+            if name not in self.registry:
+                return 1
+            if name not in memo:
+                feature = self.registry[name]
+                memo[name] = feature.lookback - 1 + max((need(d) for d in feature.deps), default=1)
+            return memo[name]
+
+        return max((need(n) for n in names), default=1)
+
+    def _cached(self, key):
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = {}
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+            return self._cache[key]
+
+    def compute(self, df, names):
+        """(len(df), len(names)) float64 matrix of the requested features
+
+        Missing features are computed in dependency order and cached under the
+        fingerprint of the input columns, so a later request for the same data
+        reuses them.
+        """
+        key = fingerprint(df, self.columns(names))
+        values = self._cached(key)
+        for name in self.resolve(names):
+            if name in values:
+                continue
+            feature = self.registry[name]
+            inputs = [pd.Series(values[d], index=df.index) if d in values else df[d]
+                      for d in feature.deps]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result = np.asarray(feature.compute(*inputs), dtype=np.float64)
+            values[name] = result
+        return np.column_stack([
+            values[n] if n in values else df[n].values.astype(np.float64) for n in names
+        ])
+
+    def latest(self, df, names):
+        """Feature row of the last bar, computed from the shortest sufficient tail"""
+        return self.compute(df.iloc[-self.lookback(names):], names)[-1:]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# Built-in features (AIModels)
+
+@register_feature('returns', deps=('close',), lookback=2)
+def _returns(close):
+    return close.pct_change()
+
+
+@register_feature('volume_change', deps=('volume',), lookback=2)
+def _volume_change(volume):
+    return volume.pct_change()
+
+
+@register_feature('ret_mean', deps=('returns',), lookback=9)
+def _ret_mean(returns):
+    return returns.rolling(window=9).mean()
+
+
+@register_feature('ret_std', deps=('returns',), lookback=9)
+def _ret_std(returns):
+    return returns.rolling(window=9).std()
+
+
+@register_feature('volume_change_mean', deps=('volume_change',), lookback=9)
+def _volume_change_mean(volume_change):
+    return volume_change.rolling(window=9).mean()
+
+
+@register_feature('ma_dist', deps=('close', 'ma'))
+def _ma_dist(close, ma):
+    return (close - ma) / ma
+
+
+@register_feature('bb_z', deps=('close', 'bb_middle', 'bb_std'))
+def _bb_z(close, bb_middle, bb_std):
+    return (close - bb_middle) / bb_std
+
+
+@register_feature('volatility', deps=('close',), lookback=10)
+def _volatility(close):
+    return close.rolling(window=10).std() / close
+
+
+@register_feature('atr_ratio', deps=('atr', 'close'))
+def _atr_ratio(atr, close):
+    return atr / close
+
+
+@register_feature('poc_dist', deps=('close', 'vp_poc'))
+def _poc_dist(close, vp_poc):
+    return (close - vp_poc) / close
@@ -0,0 +1,175 @@
+"""Time-series hyperparameter search for the random forest
+
+Purged / embargoed k-fold cross-validation with successive halving over
+RF_SEARCH_GRID. The feature matrix and the fold indices are written once to
+a cache directory keyed by the dataset; worker processes open them with
+np.load(mmap_mode='r'), so the data is shared through the page cache instead
+of being pickled to every worker, and a repeated search on the same data
+skips indicator and feature computation entirely.
+"""
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config.config import (
+    RF_N_ESTIMATORS, RF_SEARCH_GRID, RF_SEARCH_SPLITS, RF_SEARCH_EMBARGO,
+    RF_SEARCH_MIN_TREES, RF_SEARCH_FACTOR, RF_SEARCH_CACHE_DIR, RF_SEARCH_WORKERS
+)
+from utils.event_log import get_event_log
+from utils.result_cache import code_version, config_params
+
+
+def purged_kfold_splits(rows, n_splits=RF_SEARCH_SPLITS, horizon=5, embargo=RF_SEARCH_EMBARGO):
+    """(train_idx, test_idx) pairs for samples at bar positions rows (sorted)
+
+    Test folds are contiguous blocks of samples. Training samples whose
+    label window (bar r .. r + horizon) reaches into the test block are
+    purged, and samples within horizon + embargo bars after the block are
+    embargoed, so neither labels nor feature windows leak across the split.
+    """
+    rows = np.asarray(rows)
+    bounds = np.linspace(0, len(rows), n_splits + 1).astype(int)
+    splits = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        if b <= a:
+            continue
+        test_start, test_end = rows[a], rows[b - 1]
+        keep = (rows + horizon < test_start) | (rows > test_end + horizon + embargo)
+        splits.append((np.flatnonzero(keep), np.arange(a, b)))
+    return splits
+
+
+def dataset_key(data_fingerprint, feature_names, n_splits, horizon, embargo):
+    """Cache key of a search dataset (data + features + split settings)
+
+    Also covers the config values and the source version of utils.result_cache,
+    so a change of indicator parameters or feature code builds new folds.
+    """
+    h = hashlib.blake2b(digest_size=12)
+    h.update(json.dumps([data_fingerprint, list(feature_names), n_splits, horizon, embargo]).encode())
+    h.update(json.dumps(config_params(), sort_keys=True, default=str).encode())
+    h.update(code_version().encode())
+    return h.hexdigest()
+
+
+def prepare_search_data(key, prepare, n_splits=RF_SEARCH_SPLITS, horizon=5,
+                        embargo=RF_SEARCH_EMBARGO, cache_dir=RF_SEARCH_CACHE_DIR):
+    """Directory with X.npy, y.npy and folds.npz for key, built with prepare() on a cache miss
+
+    prepare() returns (X, y, rows) as AIModels._labelled_rows does.
+    Returns (directory, number of folds, cache hit).
+    """
+    path = os.path.join(cache_dir, key)
+    folds_path = os.path.join(path, 'folds.npz')
+    if os.path.exists(folds_path):
+        with np.load(folds_path) as folds:
+            return path, len(folds.files) // 2, True
+
+    X, y, rows = prepare()
+    splits = purged_kfold_splits(rows, n_splits, horizon, embargo)
+    tmp = path + f'.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, 'X.npy'), np.ascontiguousarray(X, dtype=np.float64))
+    np.save(os.path.join(tmp, 'y.npy'), np.asarray(y, dtype=np.int64))
+    arrays = {}
+    for k, (train_idx, test_idx) in enumerate(splits):
+        arrays[f'train_{k}'] = train_idx
+        arrays[f'test_{k}'] = test_idx
+    np.savez(os.path.join(tmp, 'folds.npz'), **arrays)
+    # 整个目录写完后再改名，其他进程不会读到一半的缓存
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        import shutil
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path, len(splits), False
+
+
+_ARRAYS = {}  # 每个工作进程缓存已打开的 memmap
+
+
+def _open(path):
+    if path not in _ARRAYS:
+        X = np.load(os.path.join(path, 'X.npy'), mmap_mode='r')
+        y = np.load(os.path.join(path, 'y.npy'), mmap_mode='r')
+        folds = dict(np.load(os.path.join(path, 'folds.npz')))
+        _ARRAYS[path] = (X, y, folds)
+    return _ARRAYS[path]
+
+
+def _evaluate(task):
+    """Worker: fit one candidate on one fold, returns (candidate, fold, accuracy)"""
+    from sklearn.ensemble import RandomForestClassifier
+    path, cand, fold, params, n_estimators = task
+    X, y, folds = _open(path)
+    train_idx, test_idx = folds[f'train_{fold}'], folds[f'test_{fold}']
+    y_train = y[train_idx]
+    if len(np.unique(y_train)) < 2 or len(test_idx) == 0:
+        return cand, fold, np.nan
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=1, **params)
+    model.fit(X[train_idx], y_train)
+    return cand, fold, float(model.score(X[test_idx], y[test_idx]))
+
+
+def grid_candidates(grid=RF_SEARCH_GRID):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+def successive_halving(path, n_folds, candidates, min_trees=RF_SEARCH_MIN_TREES,
+                       max_trees=RF_N_ESTIMATORS, factor=RF_SEARCH_FACTOR, workers=RF_SEARCH_WORKERS):
+    """Evaluate candidates on all folds, keep the best 1/factor, multiply trees by factor, repeat
+
+    Returns (best params, list of per-round results).
+    """
+    events = get_event_log()
+    workers = workers or os.cpu_count() or 1
+    alive = list(range(len(candidates)))
+    n_trees = min(min_trees, max_trees)
+    rounds = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            tasks = [(path, c, f, candidates[c], n_trees) for c in alive for f in range(n_folds)]
+            results = executor.map(_evaluate, tasks, chunksize=max(1, len(tasks) // (workers * 4))) \
+                if executor else map(_evaluate, tasks)
+            scores = {c: [] for c in alive}
+            for cand, _, acc in results:
+                scores[cand].append(acc)
+            mean = {c: float(np.nanmean(s)) if np.isfinite(s).any() else -np.inf for c, s in scores.items()}
+            ranked = sorted(alive, key=lambda c: mean[c], reverse=True)
+            rounds.append({'n_estimators': n_trees, 'candidates': len(alive),
+                           'best': candidates[ranked[0]], 'best_score': mean[ranked[0]]})
+            events.info('search_round', **{k: v for k, v in rounds[-1].items() if k != 'best'})
+            if len(alive) <= 1 or n_trees >= max_trees:
+                break
+            alive = ranked[:max(1, -(-len(alive) // factor))]
+            n_trees = min(n_trees * factor, max_trees)
+    finally:
+        if executor:
+            executor.shutdown()
+    return candidates[ranked[0]], rounds
+
+
+def search_random_forest(key, prepare, grid=RF_SEARCH_GRID, n_splits=RF_SEARCH_SPLITS,
+                         horizon=5, embargo=RF_SEARCH_EMBARGO, cache_dir=RF_SEARCH_CACHE_DIR,
+                         workers=RF_SEARCH_WORKERS):
+    """Run the full search; returns a dict with best params (incl. n_estimators), rounds and timings"""
+    start = time.time()
+    path, n_folds, cached = prepare_search_data(key, prepare, n_splits, horizon, embargo, cache_dir)
+    prep_time = time.time() - start
+    best, rounds = successive_halving(path, n_folds, grid_candidates(grid), workers=workers)
+    result = {
+        'best_params': dict(best, n_estimators=RF_N_ESTIMATORS),
+        'best_score': rounds[-1]['best_score'],
+        'rounds': rounds,
+        'cache_hit': cached,
+        'prepare_time': round(prep_time, 3),
+        'time': round(time.time() - start, 2)
+    }
+    with open(os.path.join(path, 'result.json'), 'w') as f:
+        json.dump(result, f, indent=2, default=str)
+    return result
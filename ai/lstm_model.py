@@ -0,0 +1,253 @@
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from config.config import (
+    LSTM_SEQUENCE_LENGTH, LSTM_BATCH_SIZE, LSTM_EPOCHS, LSTM_HIDDEN_UNITS,
+    LSTM_LEARNING_RATE
+)
+from utils.event_log import get_event_log
+
+# 与 AIModels 相同的标签定义：未来5根K线收益超过 ±1%
+LABEL_HORIZON = 5
+LABEL_THRESHOLD = 0.01
+FEATURE_LOOKBACK = 10  # 特征本身需要的历史长度（滚动波动率）
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def build_features(df):
+    """Per-bar feature matrix (float64, rows with NaN are kept) from an indicator frame"""
+    close = df['close'].values
+    log_ret = np.zeros(len(close))
+    log_ret[1:] = np.diff(np.log(close))
+    vol = df['close'].pct_change().rolling(window=FEATURE_LOOKBACK).std().values
+    volume = df['volume'].values
+    vol_change = np.zeros(len(close))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_change[1:] = np.log(volume[1:] / volume[:-1])
+        features = np.column_stack([
+            log_ret,
+            vol,
+            np.clip(vol_change, -5, 5),
+            df['rsi'].values / 100 - 0.5,
+            df['macd_hist'].values / close,
+            (close - df['ma'].values) / df['ma'].values,
+            np.clip((close - df['bb_middle'].values) / df['bb_std'].values, -5, 5),
+            df['atr'].values / close,
+        ])
+    features[~np.isfinite(features)] = np.nan
+    return features
+
+
+def build_labels(close):
+    """1 = up move, 0 = down move, -1 = hold / unknown future"""
+    close = np.asarray(close, dtype=np.float64)
+    labels = np.full(len(close), -1, dtype=np.int8)
+    future = close[LABEL_HORIZON:] / close[:-LABEL_HORIZON] - 1
+    labels[:-LABEL_HORIZON][future > LABEL_THRESHOLD] = 1
+    labels[:-LABEL_HORIZON][future < -LABEL_THRESHOLD] = 0
+    return labels
+
+
+class LSTMModel:
+    """Single-layer LSTM classifier in NumPy (CPU only)
+
+    Same role as AIModels: train(df) on an indicator frame returns the
+    validation accuracy, predict(df) returns 1 (buy) / 0 (sell). Training
+    samples are sliding windows taken as strided views of the feature
+    matrix; only the current mini-batch is gathered into memory.
+    """
+
+    def __init__(self, sequence_length=LSTM_SEQUENCE_LENGTH, hidden_units=LSTM_HIDDEN_UNITS,
+                 batch_size=LSTM_BATCH_SIZE, epochs=LSTM_EPOCHS, learning_rate=LSTM_LEARNING_RATE,
+                 seed=42):
+        self.sequence_length = sequence_length
+        self.hidden_units = hidden_units
+        self.batch_size = batch_size
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.rng = np.random.default_rng(seed)
+        self.params = None
+        self.mean = None
+        self.std = None
+        self.is_trained = False
+        self.train_info = {}
+        self.events = get_event_log()
+
+    def _init_params(self, n_features):
+        H = self.hidden_units
+        scale = 1.0 / np.sqrt(n_features + H)
+        b = np.zeros(4 * H)
+        b[H:2 * H] = 1.0  # forget gate bias
+        self.params = {
+            'Wx': self.rng.normal(0, scale, (n_features, 4 * H)),
+            'Wh': self.rng.normal(0, scale, (H, 4 * H)),
+            'b': b,
+            'Wy': self.rng.normal(0, 1.0 / np.sqrt(H), (H, 2)),
+            'by': np.zeros(2)
+        }
+        self._adam_m = {k: np.zeros_like(v) for k, v in self.params.items()}
+        self._adam_v = {k: np.zeros_like(v) for k, v in self.params.items()}
+        self._adam_t = 0
+
+    def _forward(self, X, keep_cache=False):
+        """Run the LSTM over X (batch, steps, features), return class probabilities"""
+        p = self.params
+        H = self.hidden_units
+        B, L, _ = X.shape
+        h = np.zeros((B, H))
+        c = np.zeros((B, H))
+        cache = []
+        for t in range(L):
+            x = X[:, t]
+            z = x @ p['Wx'] + h @ p['Wh'] + p['b']
+            i = _sigmoid(z[:, :H])
+            f = _sigmoid(z[:, H:2 * H])
+            o = _sigmoid(z[:, 2 * H:3 * H])
+            g = np.tanh(z[:, 3 * H:])
+            c_prev, h_prev = c, h
+            c = f * c_prev + i * g
+            tc = np.tanh(c)
+            h = o * tc
+            if keep_cache:
+                cache.append((x, h_prev, c_prev, i, f, o, g, tc))
+        logits = h @ p['Wy'] + p['by']
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        return probs, h, cache
+
+    def _backward(self, probs, h_last, cache, y):
+        """Backpropagation through time for the cross-entropy loss"""
+        p = self.params
+        H = self.hidden_units
+        B = len(y)
+        grads = {k: np.zeros_like(v) for k, v in p.items()}
+        dlogits = probs.copy()
+        dlogits[np.arange(B), y] -= 1
+        dlogits /= B
+        grads['Wy'] = h_last.T @ dlogits
+        grads['by'] = dlogits.sum(axis=0)
+        dh = dlogits @ p['Wy'].T
+        dc = np.zeros((B, H))
+        for x, h_prev, c_prev, i, f, o, g, tc in reversed(cache):
+            do = dh * tc
+            dc = dc + dh * o * (1 - tc * tc)
+            dz = np.concatenate([
+                dc * g * i * (1 - i),
+                dc * c_prev * f * (1 - f),
+                do * o * (1 - o),
+                dc * i * (1 - g * g)
+            ], axis=1)
+            grads['Wx'] += x.T @ dz
+            grads['Wh'] += h_prev.T @ dz
+            grads['b'] += dz.sum(axis=0)
+            dh = dz @ p['Wh'].T
+            dc = dc * f
+        return grads
+
+    def _adam_step(self, grads, beta1=0.9, beta2=0.999, eps=1e-8, clip=5.0):
+        norm = np.sqrt(sum(float((g * g).sum()) for g in grads.values()))
+        scale = clip / norm if norm > clip else 1.0
+        self._adam_t += 1
+        for k, g in grads.items():
+            g = g * scale
+            self._adam_m[k] = beta1 * self._adam_m[k] + (1 - beta1) * g
+            self._adam_v[k] = beta2 * self._adam_v[k] + (1 - beta2) * g * g
+            m_hat = self._adam_m[k] / (1 - beta1 ** self._adam_t)
+            v_hat = self._adam_v[k] / (1 - beta2 ** self._adam_t)
+            self.params[k] -= self.learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+    def _normalize(self, features):
+        out = (features - self.mean) / self.std
+        return np.nan_to_num(out, nan=0.0)
+
+    def _windows(self, df, validation_split=0.0):
+        """Normalized feature windows (strided view), labels and valid window ends
+
+        mean / std are fitted when not set yet, on the rows covered by the
+        first (1 - validation_split) of the labelled windows only.
+        """
+        features = build_features(df)
+        labels = build_labels(df['close'].values)
+        L = self.sequence_length
+        # 从第一个所有特征都有效的K线开始
+        valid_rows = np.flatnonzero(np.isfinite(features).all(axis=1))
+        if len(valid_rows) == 0:
+            return None, None, None
+        start = valid_rows[0]
+        features = features[start:]
+        labels = labels[start:]
+        if len(features) < L:
+            return None, None, None
+        ends = np.arange(L - 1, len(features))
+        window_labels = labels[ends]
+        samples = np.flatnonzero(window_labels >= 0)
+        if self.mean is None:
+            # 验证集的K线不参与归一化参数估计
+            split = int(len(samples) * (1 - validation_split))
+            fit = features[:ends[samples[split - 1]] + 1] if split > 0 else features
+            self.mean = np.nanmean(fit, axis=0)
+            self.std = np.nanstd(fit, axis=0)
+            self.std[self.std == 0] = 1.0
+        normed = self._normalize(features)
+        windows = sliding_window_view(normed, (L, normed.shape[1]))[:, 0]
+        return windows, window_labels, samples
+
+    def train(self, df, validation_split=0.2):
+        """Train on an indicator frame, returns validation accuracy"""
+        start_time = time.time()
+        self.mean = self.std = None
+        windows, labels, samples = self._windows(df, validation_split)
+        if windows is None or len(samples) < 20:
+            self.events.warning('train_skipped', model='lstm', reason='not enough data')
+            return 0
+
+        # 按时间顺序划分训练/验证集；标签窗口伸进验证集的训练样本被清除（与清洗交叉验证相同）
+        split = int(len(samples) * (1 - validation_split))
+        train_idx, val_idx = samples[:split], samples[split:]
+        if len(val_idx):
+            train_idx = train_idx[train_idx + LABEL_HORIZON < val_idx[0]]
+        self._init_params(windows.shape[2])
+
+        for epoch in range(self.epochs):
+            order = self.rng.permutation(train_idx)
+            for s in range(0, len(order), self.batch_size):
+                batch = order[s:s + self.batch_size]
+                X = windows[batch]  # 只复制当前批次
+                y = labels[batch].astype(np.int64)
+                probs, h_last, cache = self._forward(X, keep_cache=True)
+                self._adam_step(self._backward(probs, h_last, cache, y))
+
+        accuracy = 0.0
+        if len(val_idx):
+            preds = np.concatenate([
+                self._forward(windows[val_idx[s:s + self.batch_size]])[0].argmax(axis=1)
+                for s in range(0, len(val_idx), self.batch_size)
+            ])
+            accuracy = float((preds == labels[val_idx]).mean())
+        self.is_trained = True
+        self.train_info = {
+            'accuracy': round(accuracy * 100, 2),
+            'time': round(time.time() - start_time, 2),
+            'samples': int(len(train_idx)),
+            'buy': int((labels[train_idx] == 1).sum()),
+            'sell': int((labels[train_idx] == 0).sum())
+        }
+        return accuracy
+
+    def predict_proba(self, df):
+        """Probability of an up move for the latest bar, using only the last window"""
+        if not self.is_trained:
+            return 0.5
+        tail = df.iloc[-(self.sequence_length + FEATURE_LOOKBACK + 1):]
+        features = self._normalize(build_features(tail)[-self.sequence_length:])
+        if len(features) < self.sequence_length:
+            return 0.5
+        return float(self._forward(features[np.newaxis])[0][0, 1])
+
+    def predict(self, df):
+        """Make predictions: 1 = buy, 0 = sell"""
+        return int(self.predict_proba(df) > 0.5)
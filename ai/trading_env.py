@@ -0,0 +1,140 @@
+"""Vectorized trading environment for reinforcement learning
+
+N independent episodes over one price series are stepped together; the
+position logic is the run_backtest state machine from
+backtest.kernels.step_positions, so an agent is rewarded under exactly the
+stop-loss / take-profit rules the backtest applies.
+"""
+import numpy as np
+from backtest.kernels import new_position_state, step_positions
+from config.config import (
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT,
+    RL_STATE_SIZE, RL_N_ENVS, RL_EPISODE_LENGTH
+)
+
+# 动作编号与 RL_ACTION_SIZE 的注释一致：买入、卖出、持有
+ACTION_BUY, ACTION_SELL, ACTION_HOLD = 0, 1, 2
+ACTION_SIGNAL = np.array([1, -1, 0], dtype=np.int8)
+
+
+class TradingEnv:
+    """Gym-style vectorized environment: reset() -> obs, step(actions) -> (obs, reward, done, info)
+
+    Observation (state_size columns): the last state_size - 2 log returns
+    scaled by their standard deviation, the current position (-1 / 0 / 1)
+    and the unrealized return of the open trade. Actions are applied at the
+    close of the current bar like a get_signal value in run_backtest; the
+    reward is the log change of marked-to-market equity over the next bar.
+
+    Finished episodes are reset automatically (random start bar when
+    random_start, else the first bar), so step() can be called indefinitely.
+    """
+
+    def __init__(self, close, n_envs=RL_N_ENVS, episode_length=RL_EPISODE_LENGTH,
+                 state_size=RL_STATE_SIZE, stop_loss_pct=STOP_LOSS_PCT,
+                 take_profit_pct=TAKE_PROFIT_PCT, stop_distance=None,
+                 random_start=True, seed=None):
+        self.close = np.asarray(close, dtype=np.float64)
+        self.n_envs = n_envs
+        self.state_size = state_size
+        self.lookback = state_size - 2
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.stop_distance = None if stop_distance is None else np.asarray(stop_distance, dtype=np.float64)
+        self.random_start = random_start
+        self.rng = np.random.default_rng(seed)
+
+        n = len(self.close)
+        if n < self.lookback + 2:
+            raise ValueError(f"need at least {self.lookback + 2} bars, got {n}")
+        # 最长回合不超过数据长度
+        max_length = n - 1 - self.lookback
+        self.episode_length = max_length if episode_length is None else min(episode_length, max_length)
+
+        log_ret = np.zeros(n)
+        log_ret[1:] = np.diff(np.log(self.close))
+        scale = log_ret[1:].std() or 1.0
+        self._scaled_returns = log_ret / scale
+        self._offsets = np.arange(-self.lookback + 1, 1)
+
+        self.t = np.zeros(n_envs, dtype=np.int64)
+        self.end = np.zeros(n_envs, dtype=np.int64)
+        self.balance = np.ones(n_envs)
+        self.state = new_position_state(n_envs)
+        self.episode_return = np.zeros(n_envs)
+
+    def _start(self, idx):
+        """(Re)start the episodes in idx"""
+        k = len(idx)
+        if self.random_start:
+            last_start = len(self.close) - 1 - self.episode_length
+            starts = self.rng.integers(self.lookback, last_start + 1, size=k)
+        else:
+            starts = np.full(k, self.lookback)
+        self.t[idx] = starts
+        self.end[idx] = starts + self.episode_length
+        self.balance[idx] = 1.0
+        self.episode_return[idx] = 0.0
+        for arr in self.state.values():
+            arr[idx] = 0
+
+    def _unrealized(self, price):
+        """Marked-to-market multiplier of the open trades"""
+        position = self.state['position']
+        entry = self.state['entry']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(position == 1, price / entry,
+                            np.where(position == -1, entry / price, 1.0))
+
+    def _observe(self):
+        obs = np.empty((self.n_envs, self.state_size))
+        obs[:, :self.lookback] = self._scaled_returns[self.t[:, np.newaxis] + self._offsets]
+        obs[:, -2] = self.state['position']
+        obs[:, -1] = self._unrealized(self.close[self.t]) - 1
+        return obs
+
+    def reset(self):
+        self._start(np.arange(self.n_envs))
+        return self._observe()
+
+    def get_state(self):
+        """(arrays, rng state) of the running episodes, for checkpoints"""
+        arrays = {'t': self.t, 'end': self.end, 'balance': self.balance,
+                  'episode_return': self.episode_return}
+        arrays.update({f'pos_{k}': v for k, v in self.state.items()})
+        return arrays, self.rng.bit_generator.state
+
+    def set_state(self, arrays, rng_state):
+        """Restore get_state(); returns the current observation"""
+        self.t, self.end = arrays['t'].copy(), arrays['end'].copy()
+        self.balance, self.episode_return = arrays['balance'].copy(), arrays['episode_return'].copy()
+        self.state = {k: arrays[f'pos_{k}'].copy() for k in self.state}
+        self.rng.bit_generator.state = rng_state
+        return self._observe()
+
+    def equity(self):
+        """Marked-to-market equity of every environment (1.0 at episode start)"""
+        return self.balance * self._unrealized(self.close[self.t])
+
+    def step(self, actions):
+        """Apply one action per environment and advance every episode by one bar"""
+        price = self.close[self.t]
+        sig = ACTION_SIGNAL[np.asarray(actions)]
+        stop_distance = None if self.stop_distance is None else self.stop_distance[self.t]
+        exited, ratio, _ = step_positions(price, sig, self.state, self.stop_loss_pct,
+                                          self.take_profit_pct, stop_distance)
+        self.balance = np.where(exited, self.balance * ratio, self.balance)
+        before = self.balance * self._unrealized(price)
+
+        self.t += 1
+        after = self.equity()
+        reward = np.log(after / before)
+        self.episode_return += reward
+
+        done = self.t >= self.end
+        info = {}
+        if done.any():
+            idx = np.flatnonzero(done)
+            info['episode_returns'] = np.expm1(self.episode_return[idx])
+            self._start(idx)
+        return self._observe(), reward, done, info
@@ -0,0 +1,106 @@
+"""Persistent cache of ccxt market metadata
+
+ccxt downloads the full instrument list (load_markets) the first time a
+fresh exchange object needs it, on every process start. preload_markets()
+fills the exchange from a local JSON store instead and only downloads when
+the copy is older than MARKET_CACHE_TTL_HOURS. The store is shared by all
+processes: it is written to a temporary file and renamed, and a lock file
+lets one process refresh an expired copy while the others keep using it.
+When the exchange cannot be reached (or MARKET_CACHE_OFFLINE is set) an
+expired copy is used as is.
+"""
+import json
+import os
+import time
+from config.config import MARKET_CACHE_PATH, MARKET_CACHE_TTL_HOURS, MARKET_CACHE_OFFLINE
+from utils.event_log import get_event_log
+from utils.runtime_metrics import get_registry
+
+CACHE_VERSION = 1
+LOCK_TIMEOUT_SECONDS = 120  # 持锁进程崩溃后锁文件的过期时间
+
+
+def market_cache_path(exchange_id, path=None):
+    return (path or MARKET_CACHE_PATH).format(exchange=exchange_id)
+
+
+def read_markets(path):
+    """Stored entry {'saved_at', 'markets', 'currencies'} or None"""
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None  # 不存在或损坏按未缓存处理
+    if entry.get('version') != CACHE_VERSION or not entry.get('markets'):
+        return None
+    return entry
+
+
+def write_markets(path, exchange):
+    """Store the loaded markets / currencies of exchange atomically"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {'version': CACHE_VERSION, 'exchange': exchange.id, 'saved_at': time.time(),
+             'markets': exchange.markets, 'currencies': exchange.currencies}
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'w') as f:
+        json.dump(entry, f, default=str)
+    os.replace(tmp, path)
+    return path
+
+
+def _acquire(lock):
+    """Create the refresh lock file; False if another process holds it"""
+    try:
+        if time.time() - os.path.getmtime(lock) > LOCK_TIMEOUT_SECONDS:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def preload_markets(exchange, path=None, ttl_hours=MARKET_CACHE_TTL_HOURS, offline=MARKET_CACHE_OFFLINE,
+                    refresh=False):
+    """Fill exchange.markets from the local store, downloading only when needed
+
+    Returns where the markets came from: 'cache' (fresh copy), 'stale'
+    (expired copy: offline, unreachable, or being refreshed by another
+    process), 'network' (downloaded and stored) or 'missing' (no copy and
+    offline or unreachable; ccxt then loads the markets on first use).
+    """
+    path = market_cache_path(exchange.id, path)
+    entry = read_markets(path)
+    fresh = entry is not None and time.time() - entry['saved_at'] < ttl_hours * 3600
+    source = None
+    if entry is not None and (offline or (fresh and not refresh)):
+        source = 'cache' if fresh else 'stale'
+    elif offline:
+        source = 'missing'
+    else:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock = f'{path}.lock'
+        locked = _acquire(lock)
+        if not locked and entry is not None and not refresh:
+            source = 'stale'  # 另一个进程正在刷新
+        else:
+            try:
+                exchange.load_markets(reload=True)
+                write_markets(path, exchange)
+                source = 'network'
+            except Exception as e:
+                # 交易所不可达：沿用过期副本；没有副本时交给 ccxt 首次使用时再载入
+                get_event_log().warning('market_cache_refresh_failed', exchange=exchange.id, error=str(e))
+                source = 'missing' if entry is None else 'stale'
+            finally:
+                if locked:
+                    os.remove(lock)
+    if source in ('cache', 'stale'):
+        exchange.set_markets(entry['markets'], entry['currencies'])
+    get_registry().counter('market_cache_loads_total', 'Exchange market metadata loads by source',
+                           source=source).inc()
+    return source
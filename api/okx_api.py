@@ -1,17 +1,46 @@
-import ccxt
+import functools
+import time
 import pandas as pd
-from datetime import datetime
-from config import API_KEY, SECRET_KEY, PASSPHRASE
+from config.config import API_KEY, SECRET_KEY, PASSPHRASE
+from api.market_cache import preload_markets
+from utils.runtime_metrics import get_registry
+
+
+def _timed(method):
+    """Record call latency in okx_api_request_seconds and exceptions in okx_api_errors_total"""
+    registry = get_registry()
+    latency = registry.histogram('okx_api_request_seconds', 'OKX API call latency', method=method)
+    errors = registry.counter('okx_api_errors_total', 'Failed OKX API calls', method=method)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.record(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
 
 class OKXAPI:
     def __init__(self):
+        import ccxt  # 按需导入，ccxt 导入开销较大
+        
         self.exchange = ccxt.okx({
             'apiKey': API_KEY,
             'secret': SECRET_KEY,
             'password': PASSPHRASE,
             'enableRateLimit': True
         })
+        # 市场元数据从本地缓存载入，启动时不再请求交易所
+        preload_markets(self.exchange)
         
+    @_timed('get_klines')
     def get_klines(self, symbol='BTC/USDT', timeframe='1h', limit=1000):
         """Get historical kline data"""
         try:
@@ -30,9 +59,11 @@ class OKXAPI:
             return data
             
         except Exception as e:
+            get_registry().counter('okx_api_errors_total', method='get_klines').inc()
             print(f"Error fetching kline data: {e}")
             return None
     
+    @_timed('get_account_balance')
     def get_account_balance(self):
         """获取账户余额"""
         endpoint = '/api/v5/account/balance'
@@ -41,6 +72,7 @@ class OKXAPI:
         response = requests.get(url, headers=headers)
         return response.json()
     
+    @_timed('place_order')
     def place_order(self, side, size, price=None):
         """下单"""
         endpoint = '/api/v5/trade/order'
@@ -61,6 +93,7 @@ class OKXAPI:
         response = requests.post(url, json=order_data, headers=headers)
         return response.json()
     
+    @_timed('get_order_status')
     def get_order_status(self, order_id):
         """获取订单状态"""
         endpoint = f'/api/v5/trade/order?instId={SYMBOL}&ordId={order_id}'
@@ -1,208 +1,269 @@
-import pandas as pd
+import os
 import numpy as np
-import matplotlib.pyplot as plt
-from strategy import TradingStrategy
-from config import (
+from strategy.strategy import TradingStrategy
+from config.config import (
     BACKTEST_START_DATE, BACKTEST_END_DATE, TIMEFRAME,
-    STOP_LOSS_PCT, TAKE_PROFIT_PCT, MAX_DRAWDOWN_PCT
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT, MAX_DRAWDOWN_PCT,
+    ATR_MULTIPLIER, USE_ATR_STOPS,
+    PLOT_MODE, PLOT_OUTPUT_DIR, PLOT_FORMATS, PLOT_MAX_POINTS,
+    CHECKPOINT_INTERVAL_SECONDS, CHECKPOINT_CHUNK_BARS, RESULT_CACHE_ENABLED
 )
+from backtest import jit
+from backtest.metrics import compute_metrics, periods_per_year, infer_bar_minutes
+from utils.plotting import render_charts_async, show_interactive
+from utils.trade_log import TradeLog, TradeType, curves_to_arrow
+from utils.event_log import get_event_log
+from utils.checkpoint import CheckpointTimer, array_fingerprint, load_checkpoint
+from utils.result_cache import ResultCache, result_key
+
+
+def _model_dir(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + '_model'
+
 
 class BacktestEngine:
-    def __init__(self):
+    def __init__(self, stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT):
         self.strategy = TradingStrategy()
-        self.trades = []
-        self.equity_curve = []
-        self.price_curve = []  # 新增价格曲线
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.trades = TradeLog()
+        self.times = np.empty(0, dtype='datetime64[ns]')
+        self.equity_curve = np.empty(0)
+        self.price_curve = np.empty(0)  # 新增价格曲线
+        self.positions = np.empty(0, dtype=np.int8)  # 每根K线的持仓方向
+        self.bars_per_year = periods_per_year(TIMEFRAME)
         self.initial_balance = 10000  # Starting balance
+        self.plot_future = None  # 后台绘图任务
+        self.events = get_event_log()
+        self.cache = ResultCache() if RESULT_CACHE_ENABLED else None
+        self.cache_hit = False
+        self.cache_meta = {}  # 训练信息等随结果保存的元数据
         
-    def run_backtest(self, df):
-        """Run backtest on historical data"""
-        # Filter data by date range
-        df = df[(df.index >= BACKTEST_START_DATE) & (df.index <= BACKTEST_END_DATE)]
+    def _filter(self, df, start_date=None, end_date=None):
+        return df[(df.index >= (start_date or BACKTEST_START_DATE)) & (df.index <= (end_date or BACKTEST_END_DATE))]
         
-        # Initialize variables
-        balance = self.initial_balance
-        position = 0
-        entry_price = 0
-        stop_loss = 0
-        take_profit = 0
-        max_drawdown = 0
+    def _history(self, df, end_date=None):
+        """Bars up to end_date, the training data of the walk-forward model fit"""
+        return df[df.index <= (end_date or BACKTEST_END_DATE)]
         
-        # Train AI models
-        print("\nTraining AI models...")
-        self.strategy.train_ai_models(df)
+    def _key(self, df, history):
+        columns = ('open', 'high', 'low', 'close', 'volume')
+        params = {}
+        if self.strategy.signal_mode != 'technical':
+            # 模型也从区间之前的K线学习
+            params['history'] = array_fingerprint(history.index.values.astype('datetime64[ns]'),
+                                                  *(history[c].values for c in columns))
+        return result_key(df.index.values.astype('datetime64[ns]'), *(df[c].values for c in columns),
+                          stop_loss_pct=self.stop_loss_pct, take_profit_pct=self.take_profit_pct,
+                          initial_balance=self.initial_balance, **params)
         
-        # Run backtest
-        print("\nRunning backtest...")
-        for i in range(len(df)):
-            current_price = df['close'].iloc[i]
-            
-            # Get trading signal
-            signal = self.strategy.get_signal(df.iloc[:i+1])
-            
-            # Update position
-            if position == 0:  # No position
-                if signal == 1:  # Buy signal
-                    position = 1
-                    entry_price = current_price
-                    stop_loss = current_price * (1 - STOP_LOSS_PCT)
-                    take_profit = current_price * (1 + TAKE_PROFIT_PCT)
-                    max_drawdown = current_price
-                    self.trades.append({
-                        'type': 'buy',
-                        'price': current_price,
-                        'time': df.index[i]
-                    })
-                    print(f"Buy at {current_price:.2f}")
-                elif signal == -1:  # Sell signal
-                    position = -1
-                    entry_price = current_price
-                    stop_loss = current_price * (1 + STOP_LOSS_PCT)
-                    take_profit = current_price * (1 - TAKE_PROFIT_PCT)
-                    max_drawdown = current_price
-                    self.trades.append({
-                        'type': 'sell',
-                        'price': current_price,
-                        'time': df.index[i]
-                    })
-                    print(f"Sell at {current_price:.2f}")
-            else:  # Has position
-                if position == 1:  # Long position
-                    if current_price <= stop_loss:  # Stop loss hit
-                        balance *= (current_price / entry_price)
-                        position = 0
-                        self.trades.append({
-                            'type': 'stop_loss',
-                            'price': current_price,
-                            'time': df.index[i]
-                        })
-                        print(f"Stop loss at {current_price:.2f}")
-                    elif current_price >= take_profit:  # Take profit hit
-                        balance *= (current_price / entry_price)
-                        position = 0
-                        self.trades.append({
-                            'type': 'take_profit',
-                            'price': current_price,
-                            'time': df.index[i]
-                        })
-                        print(f"Take profit at {current_price:.2f}")
-                    elif current_price > max_drawdown:
-                        max_drawdown = current_price
-                    elif signal == -1:  # Exit on opposite signal
-                        balance *= (current_price / entry_price)
-                        position = 0
-                        self.trades.append({
-                            'type': 'signal_exit',
-                            'price': current_price,
-                            'time': df.index[i]
-                        })
-                        print(f"Signal exit at {current_price:.2f}")
-                else:  # Short position
-                    if current_price >= stop_loss:  # Stop loss hit
-                        balance *= (entry_price / current_price)
-                        position = 0
-                        self.trades.append({
-                            'type': 'stop_loss',
-                            'price': current_price,
-                            'time': df.index[i]
-                        })
-                        print(f"Stop loss at {current_price:.2f}")
-                    elif current_price <= take_profit:  # Take profit hit
-                        balance *= (entry_price / current_price)
-                        position = 0
-                        self.trades.append({
-                            'type': 'take_profit',
-                            'price': current_price,
-                            'time': df.index[i]
-                        })
-                        print(f"Take profit at {current_price:.2f}")
-                    elif current_price < max_drawdown:
-                        max_drawdown = current_price
-                    elif signal == 1:  # Exit on opposite signal
-                        balance *= (entry_price / current_price)
-                        position = 0
-                        self.trades.append({
-                            'type': 'signal_exit',
-                            'price': current_price,
-                            'time': df.index[i]
-                        })
-                        print(f"Signal exit at {current_price:.2f}")
+    def cache_key(self, df, start_date=None, end_date=None):
+        """Result cache key of run_backtest(df, start_date, end_date) with this engine's parameters"""
+        return self._key(self._filter(df, start_date, end_date), self._history(df, end_date))
+        
+    def load_cached(self, df, start_date=None, end_date=None):
+        """(metrics, cache_meta) of a cached run_backtest result, restoring curves and trades; None on a miss"""
+        if self.cache is None:
+            return None
+        return self._load_entry(self.cache_key(df, start_date, end_date))
+        
+    def _load_entry(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        arrays, meta = entry
+        self.times = arrays['times']
+        self.equity_curve = arrays['equity']
+        self.price_curve = arrays['price']
+        self.positions = arrays['positions']
+        self.trades = TradeLog.from_arrays(arrays['trade_times'], arrays['trade_types'],
+                                           arrays['trade_prices'], arrays['trade_pnls'])
+        self.bars_per_year = meta['bars_per_year']
+        self.cache_hit = True
+        self.cache_meta = meta.get('cache_meta', {})
+        self.events.info('result_cache_hit', key=key, bars=len(self.times))
+        return meta['metrics'], self.cache_meta
+        
+    def _store_cached(self, key, metrics, cache_meta):
+        self.cache.put(key, {
+            'times': self.times, 'equity': self.equity_curve, 'price': self.price_curve,
+            'positions': self.positions, 'trade_times': self.trades.times, 'trade_types': self.trades.types,
+            'trade_prices': self.trades.prices, 'trade_pnls': self.trades.pnls
+        }, {
+            'metrics': {k: v.item() if hasattr(v, 'item') else v for k, v in metrics.items()},
+            'bars_per_year': self.bars_per_year,
+            'cache_meta': cache_meta or {}
+        })
+        
+    def run_backtest(self, df, start_date=None, end_date=None, checkpoint_path=None, resume_from=None,
+                     checkpoint_interval=CHECKPOINT_INTERVAL_SECONDS, use_cache=True, cache_meta=None):
+        """Run backtest on historical data
+
+        checkpoint_path: write a snapshot (signals, carried position state and
+        the curves so far) after the signal pass and then at most every
+        checkpoint_interval seconds between chunks of CHECKPOINT_CHUNK_BARS
+        bars; the trained random forest goes to <checkpoint>_model/.
+        resume_from: continue from such a snapshot instead of starting over
+        (model training and signal computation are skipped; a missing file
+        means a fresh start). The result is identical to an uninterrupted run.
+        use_cache: return a stored result for the same data, parameters and
+        code (see utils.result_cache) and store new results; cache_meta is
+        kept with the entry and returned by load_cached. Checkpointed runs
+        bypass the cache; their snapshots keep cache_meta instead, and a
+        resumed run restores it to self.cache_meta. In hybrid / ai modes the
+        walk-forward fit's walk_forward_info is added under 'walk_forward'.
+        In hybrid / ai signal modes the model is fitted walk-forward on the
+        bars up to end_date (see TradingStrategy.walk_forward_probabilities),
+        so no bar is traded on a model that saw its future returns.
+        """
+        # Filter data by date range (the model may also learn from the bars before it)
+        history = self._history(df, end_date)
+        df = self._filter(df, start_date, end_date)
+        
+        use_cache = use_cache and self.cache is not None and not (checkpoint_path or resume_from)
+        self.cache_hit = False
+        if use_cache:
+            key = self._key(df, history)
+            cached = self._load_entry(key)
+            if cached is not None:
+                return cached[0]
+        
+        # Annualize with the actual bar size of the data, fall back to TIMEFRAME
+        bar_minutes = infer_bar_minutes(df.index)
+        self.bars_per_year = periods_per_year(TIMEFRAME) if bar_minutes is None else periods_per_year(minutes=bar_minutes)
+        
+        self.trades = TradeLog()
+        self.times = df.index.values.astype('datetime64[ns]')
+        close = df['close'].values
+        n = len(close)
+        meta = {
+            'data': array_fingerprint(self.times, close),
+            'stop_loss_pct': self.stop_loss_pct,
+            'take_profit_pct': self.take_profit_pct,
+            'initial_balance': self.initial_balance,
+            'signal_mode': self.strategy.signal_mode
+        }
+        
+        checkpoint = load_checkpoint(resume_from) if resume_from else None
+        if checkpoint is not None:
+            arrays, saved = checkpoint
+            mismatch = [k for k in meta if saved.get(k) != meta[k]]
+            if mismatch:
+                raise ValueError(f"checkpoint {resume_from} does not match this run: {mismatch}")
+            signals, stop_distance = arrays['signals'], arrays['stop_distance']
+            state = arrays['state']
+            start = saved['next_bar']
+            self.equity_curve, self.positions = arrays['equity'], arrays['positions']
+            trade_types, pnls = arrays['trade_types'], arrays['pnls']
+            cache_meta = saved.get('cache_meta', cache_meta)
+            self.strategy.ai_models.load_state(_model_dir(resume_from))
+            self.events.info('resume', path=resume_from, bar=start, bars=n)
+        else:
+            # Indicators once for the whole range; signals for every bar in one pass
+            indicators = self.strategy.calculate_indicators(df)
+            probs = None
+            if self.strategy.signal_mode != 'technical':
+                # Walk-forward: each block is scored by a model fitted on earlier bars only
+                print("\nTraining AI models (walk-forward)...")
+                probs = self.strategy.walk_forward_probabilities(
+                    self.strategy.calculate_indicators(history), start=len(history) - n)[len(history) - n:]
+                cache_meta = dict(cache_meta or {}, walk_forward=self.strategy.walk_forward_info)
+            signals = self.strategy.precompute_signals(indicators, indicators_ready=True, probs=probs)
             
-            # Update equity curve
-            self.equity_curve.append(balance)
-            self.price_curve.append(current_price)  # 记录价格
+            # ATR stop distances per bar (NaN during warm-up -> percentage stop)
+            if USE_ATR_STOPS:
+                stop_distance = ATR_MULTIPLIER * indicators['atr'].values
+            else:
+                stop_distance = np.full(n, np.nan)
+            state = jit.new_state(self.initial_balance)
+            start = 0
+            self.equity_curve = np.empty(n)
+            self.positions = np.zeros(n, dtype=np.int8)
+            trade_types = np.full(n, jit.NO_TRADE, dtype=np.int8)
+            pnls = np.full(n, np.nan)
+        
+        self.cache_meta = cache_meta or {}
+        timer = CheckpointTimer(checkpoint_interval)
+        
+        def snapshot(next_bar):
+            timer.save(checkpoint_path, {
+                'signals': signals, 'stop_distance': stop_distance, 'state': state,
+                'equity': self.equity_curve, 'positions': self.positions,
+                'trade_types': trade_types, 'pnls': pnls
+            }, dict(meta, next_bar=int(next_bar), cache_meta=cache_meta or {}))
+        
+        if checkpoint_path and checkpoint is None:
+            if self.strategy.ai_models.is_trained:
+                self.strategy.ai_models.save_state(_model_dir(checkpoint_path))
+            snapshot(0)  # 信号已算好，中断后无需重新训练
+        
+        # Run backtest: compiled position / exit loop (backtest.jit), chunk by
+        # chunk with the position state carried across chunk boundaries
+        print("\nRunning backtest...")
+        events = self.events
+        for a in range(start, n, CHECKPOINT_CHUNK_BARS):
+            b = min(a + CHECKPOINT_CHUNK_BARS, n)
+            eq, pos, types, chunk_pnls = jit.run_positions(
+                close[a:b], signals[a:b], stop_distance[a:b],
+                self.stop_loss_pct, self.take_profit_pct, state=state
+            )
+            self.equity_curve[a:b], self.positions[a:b] = eq, pos
+            trade_types[a:b], pnls[a:b] = types, chunk_pnls
+            for i in a + np.flatnonzero(types != jit.NO_TRADE):
+                events.info('trade', type=TradeType(int(trade_types[i])).label, price=close[i],
+                            bar=int(i), time=self.times[i])
+            if checkpoint_path and b < n and timer.due():
+                snapshot(b)
+        if checkpoint_path:
+            snapshot(n)
+        self.price_curve = close.astype(np.float64)  # 记录价格
+        
+        # Trade log from the bars where a trade happened
+        for i in np.flatnonzero(trade_types != jit.NO_TRADE):
+            self.trades.append(TradeType(int(trade_types[i])), close[i], self.times[i], pnls[i])
         
         # Calculate metrics
         metrics = self.calculate_metrics()
+        if use_cache:
+            self._store_cached(key, metrics, cache_meta)
         
         return metrics
         
     def calculate_metrics(self):
         """Calculate backtest metrics"""
-        if not self.trades:
-            return {
-                'total_return': 0,
-                'max_drawdown': 0,
-                'sharpe_ratio': 0,
-                'win_rate': 0,
-                'total_trades': 0
-            }
-            
-        # Calculate returns
-        returns = pd.Series(self.equity_curve).pct_change().dropna()
-        
-        # Total return
-        total_return = (self.equity_curve[-1] / self.initial_balance - 1) * 100
+        return compute_metrics(
+            self.equity_curve,
+            self.initial_balance,
+            positions=self.positions,
+            trade_pnls=self.trades.closed_pnls(),
+            bars_per_year=self.bars_per_year,
+            total_trades=len(self.trades)
+        )
         
-        # Maximum drawdown
-        max_drawdown = ((pd.Series(self.equity_curve).cummax() - pd.Series(self.equity_curve)) / 
-                       pd.Series(self.equity_curve).cummax()).max() * 100
+    def export_results(self, output_dir='reports'):
+        """Write trades and per-bar curves to Parquet files"""
+        import pyarrow.parquet as pq
+        os.makedirs(output_dir, exist_ok=True)
+        trades_path = os.path.join(output_dir, 'trades.parquet')
+        curves_path = os.path.join(output_dir, 'equity.parquet')
+        self.trades.to_parquet(trades_path)
+        pq.write_table(curves_to_arrow(
+            self.times,
+            equity=self.equity_curve,
+            price=self.price_curve,
+            position=self.positions
+        ), curves_path)
+        return [trades_path, curves_path]
         
-        # Sharpe ratio
-        sharpe_ratio = np.sqrt(252) * returns.mean() / returns.std() if len(returns) > 0 else 0
-        
-        # Win rate
-        winning_trades = [t for t in self.trades if t['type'] in ['take_profit', 'max_drawdown']]
-        win_rate = len(winning_trades) / len(self.trades) * 100 if self.trades else 0
-        
-        return {
-            'total_return': total_return,
-            'max_drawdown': max_drawdown,
-            'sharpe_ratio': sharpe_ratio,
-            'win_rate': win_rate,
-            'total_trades': len(self.trades)
-        }
-        
-    def plot_results(self, metrics):
-        """Plot backtest results"""
-        plt.ion()  # 开启交互模式
-        # Create figure with subplots
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), gridspec_kw={'height_ratios': [2, 1]})
-        # 最大化窗口（Windows下）
-        try:
-            fig.canvas.manager.window.state('zoomed')
-        except Exception:
-            try:
-                fig.canvas.manager.window.showMaximized()
-            except Exception:
-                pass  # 兼容不同平台
-        # Plot equity curve
-        ax1.plot(self.equity_curve, label='Equity Curve', color='blue')
-        ax1.set_title('Equity Curve')
-        ax1.set_xlabel('Time')
-        ax1.set_ylabel('Equity (USDT)')
-        ax1.grid(True)
-        ax1.legend()
-        # Plot price chart
-        ax2.plot(self.price_curve, label='Price', color='green')
-        ax2.set_title('Price Chart')
-        ax2.set_xlabel('Time')
-        ax2.set_ylabel('Price (USDT)')
-        ax2.grid(True)
-        ax2.legend()
-        # 自适应布局
-        plt.tight_layout()
-        fig.autofmt_xdate()
+    def plot_results(self, metrics, mode=None, output_dir=None):
+        """Plot backtest results
+
+        In 'headless' mode the charts are rendered with the Agg backend on a
+        background worker and written to output_dir; the call returns
+        immediately and the pending job is kept in self.plot_future.
+        'interactive' mode opens a blocking window as before.
+        """
+        mode = mode or PLOT_MODE
         # Print metrics
         print("\nBacktest Results:")
         print(f"Total Return: {metrics['total_return']:.2f}%")
@@ -210,5 +271,21 @@ class BacktestEngine:
         print(f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}")
         print(f"Win Rate: {metrics['win_rate']:.2f}%")
         print(f"Total Trades: {metrics['total_trades']}")
-        # Show plot
-        plt.show(block=True) 
\ No newline at end of file
+
+        if mode == 'interactive':
+            show_interactive(self.equity_curve, self.price_curve, max_points=PLOT_MAX_POINTS)
+            return None
+
+        self.plot_future = render_charts_async(
+            self.equity_curve, self.price_curve,
+            output_dir=output_dir or PLOT_OUTPUT_DIR,
+            formats=PLOT_FORMATS,
+            max_points=PLOT_MAX_POINTS
+        )
+        return self.plot_future
+
+    def wait_for_plots(self, timeout=None):
+        """Block until the background chart export finishes, return written paths"""
+        if self.plot_future is None:
+            return []
+        return self.plot_future.result(timeout=timeout)
@@ -0,0 +1,135 @@
+"""Out-of-core backtests: stream candles from disk in fixed-size blocks
+
+The candle file (CSV or Parquet) is read STREAM_CHUNK_BARS rows at a time.
+Everything that crosses a block boundary is carried explicitly: the last
+bars needed by the rolling indicators, the EMA and volume-profile state
+(new_indicator_state), the position state of jit.run_positions and the
+running metrics (StreamingMetrics.update_many). Equity and trades are appended to Parquet
+files block by block, so memory depends on the block size, not on the
+length of the history.
+
+With the compiled kernels (backtest.jit) equity and trades are identical to
+BacktestEngine.run_backtest on the same range and the metrics agree to
+float rounding (moments are merged per block). Only the technical signal
+mode is supported: run_backtest scores hybrid / ai bars with a model
+refitted walk-forward on the history before each bar, and a fixed
+pre-trained model would make a chunked run in-sample and diverge from it.
+"""
+import os
+import numpy as np
+from backtest import jit
+from backtest.metrics import StreamingMetrics, periods_per_year, infer_bar_minutes
+from config.config import (
+    BACKTEST_START_DATE, BACKTEST_END_DATE, TIMEFRAME,
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT, ATR_MULTIPLIER, USE_ATR_STOPS,
+    STREAM_CHUNK_BARS, STREAM_OUTPUT_DIR
+)
+from utils.trade_log import TradeLog, TradeType, curves_to_arrow
+from utils.event_log import get_event_log
+
+
+def iter_candles(path, chunk_bars=STREAM_CHUNK_BARS):
+    """Yield DataFrames of at most chunk_bars candles (timestamp index) from a CSV or Parquet file
+
+    Parquet is read batch by batch; files written by scripts/test_data.py
+    keep one row group per chunk, so only one group is decoded at a time.
+    """
+    import pandas as pd
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_bars):
+            df = batch.to_pandas()
+            if 'timestamp' in df.columns:
+                df = df.set_index('timestamp')
+            yield df
+    else:
+        yield from pd.read_csv(path, index_col='timestamp', parse_dates=True, chunksize=chunk_bars)
+
+
+class _ParquetAppender:
+    """ParquetWriter opened on the first table; one row group per block"""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, table):
+        if self.writer is None:
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run_chunked_backtest(path, chunk_bars=STREAM_CHUNK_BARS, output_dir=STREAM_OUTPUT_DIR, strategy=None,
+                         stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT,
+                         initial_balance=10000.0, start_date=None, end_date=None):
+    """Backtest the candles in path block by block; returns the metrics dict of run_backtest
+
+    output_dir receives equity.parquet (time, equity, price, position) and
+    trades.parquet in the layout of BacktestEngine.export_results; None
+    skips writing them.
+    """
+    from strategy.strategy import TradingStrategy, new_indicator_state
+    strategy = strategy or TradingStrategy()
+    if strategy.signal_mode != 'technical':
+        raise ValueError(f"chunked backtests support signal_mode 'technical' only, got {strategy.signal_mode!r} "
+                         f"(use run_backtest for walk-forward hybrid / ai results)")
+    start_date = start_date or BACKTEST_START_DATE
+    end_date = end_date or BACKTEST_END_DATE
+    events = get_event_log()
+
+    indicator_state = new_indicator_state()
+    position_state = jit.new_state(initial_balance)
+    metrics = StreamingMetrics(initial_balance, periods_per_year(TIMEFRAME))
+    bar_size_known = False
+    last_time = None  # 上一块的最后时间，用于推断K线周期
+    bars = 0
+
+    equity_out = trades_out = None
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        equity_out = _ParquetAppender(os.path.join(output_dir, 'equity.parquet'))
+        trades_out = _ParquetAppender(os.path.join(output_dir, 'trades.parquet'))
+    try:
+        for block in iter_candles(path, chunk_bars):
+            block = block[(block.index >= start_date) & (block.index <= end_date)]
+            if not len(block):
+                continue
+            times = block.index.values.astype('datetime64[ns]')
+            if not bar_size_known:
+                bar_minutes = infer_bar_minutes(times if last_time is None else np.append(last_time, times))
+                if bar_minutes is not None:
+                    metrics.bars_per_year = periods_per_year(minutes=bar_minutes)
+                    bar_size_known = True
+            last_time = times[-1]
+
+            indicators = strategy.calculate_indicators(block, indicator_state)
+            signals = strategy.precompute_signals(indicators, indicators_ready=True)
+
+            close = block['close'].values
+            stop_distance = ATR_MULTIPLIER * indicators['atr'].values if USE_ATR_STOPS else None
+            equity, positions, trade_types, pnls = jit.run_positions(
+                close, signals, stop_distance, stop_loss_pct, take_profit_pct, state=position_state
+            )
+            metrics.update_many(equity, positions)
+
+            trades = TradeLog()
+            for i in np.flatnonzero(trade_types != jit.NO_TRADE):
+                trade_type = TradeType(int(trade_types[i]))
+                trades.append(trade_type, close[i], times[i], pnls[i])
+                metrics.record_trade(None if np.isnan(pnls[i]) else pnls[i])
+                events.info('trade', type=trade_type.label, price=close[i], bar=bars + int(i), time=times[i])
+            if equity_out is not None:
+                equity_out.write(curves_to_arrow(times, equity=equity, price=close.astype(np.float64),
+                                                 position=positions))
+                trades_out.write(trades.to_arrow())
+            bars += len(block)
+    finally:
+        if equity_out is not None:
+            equity_out.close()
+            trades_out.close()
+    return metrics.snapshot()
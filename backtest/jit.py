@@ -0,0 +1,393 @@
+"""Numba-compiled indicator and backtest kernels with a NumPy fallback
+
+Every function takes 1-D float arrays. With numba installed (and USE_JIT
+on) they run as nopython functions compiled with nogil=True, so several
+can execute in parallel threads, and cache=True, so compilation happens
+once per machine. Without numba the indicators fall back to the vectorized
+NumPy versions in backtest.kernels and the position loop runs the same
+source as plain Python.
+
+scripts/check_kernel_parity.py compares both paths with the pandas
+implementations in TradingStrategy.calculate_indicators.
+"""
+import numpy as np
+from backtest import kernels
+from config.config import USE_JIT, STOP_LOSS_PCT, TAKE_PROFIT_PCT
+from utils.trade_log import TradeType
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+JIT_ENABLED = HAVE_NUMBA and USE_JIT
+NO_TRADE = -1  # trade_types 中没有交易的K线
+# 编译后作为常量使用
+_BUY = int(TradeType.BUY)
+_SELL = int(TradeType.SELL)
+_STOP_LOSS = int(TradeType.STOP_LOSS)
+_TAKE_PROFIT = int(TradeType.TAKE_PROFIT)
+_SIGNAL_EXIT = int(TradeType.SIGNAL_EXIT)
+
+
+def _jit(func):
+    if not JIT_ENABLED:
+        return None
+    # error_model='numpy'：除零得到 inf/nan，与 NumPy/pandas 一致
+    return numba.njit(nogil=True, cache=True, error_model='numpy')(func)
+
+
+def _rolling_mean(x, window):
+    n = len(x)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        s = 0.0
+        for j in range(i - window + 1, i + 1):
+            s += x[j]
+        out[i] = s / window
+    return out
+
+
+def _rolling_std(x, window):
+    n = len(x)
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        s = 0.0
+        for j in range(i - window + 1, i + 1):
+            s += x[j]
+        mean = s / window
+        ss = 0.0
+        for j in range(i - window + 1, i + 1):
+            d = x[j] - mean
+            ss += d * d
+        out[i] = np.sqrt(ss / (window - 1))
+    return out
+
+
+def _ema(x, span, initial):
+    alpha = 2.0 / (span + 1)
+    out = np.empty(len(x))
+    if len(x) == 0:
+        return out
+    # initial: 上一段最后的 EMA 值（NaN 表示从第一个值开始）
+    out[0] = x[0] if np.isnan(initial) else alpha * x[0] + (1 - alpha) * initial
+    for i in range(1, len(x)):
+        out[i] = alpha * x[i] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def _rsi(close, period):
+    n = len(close)
+    gain = np.zeros(n)
+    loss = np.zeros(n)
+    for i in range(1, n):
+        d = close[i] - close[i - 1]
+        if d > 0:
+            gain[i] = d
+        elif d < 0:
+            loss[i] = -d
+    avg_gain = _rolling_mean_jit(gain, period)
+    avg_loss = _rolling_mean_jit(loss, period)
+    out = np.empty(n)
+    for i in range(n):
+        out[i] = 100 - 100 / (1 + avg_gain[i] / avg_loss[i])
+    return out
+
+
+def _true_range(high, low, close):
+    n = len(close)
+    tr = np.empty(n)
+    for i in range(n):
+        r = high[i] - low[i]
+        if i > 0:
+            r = max(r, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        tr[i] = r
+    return tr
+
+
+def _volume_profile(bins, volume, window):
+    """POC bin per bar (NaN before the first full window) of absolute grid bins
+
+    Same steps as kernels.rolling_volume_profile with a dense histogram over
+    the bin range; ties go to the lowest bin there and here.
+    """
+    n = len(bins)
+    poc = np.full(n, np.nan)
+    if n == 0:
+        return poc
+    lowest = bins.min()
+    size = bins.max() - lowest + 1
+    hist = np.zeros(size)
+    counts = np.zeros(size, dtype=np.int64)
+    poc_bin = -1
+    poc_vol = -1.0
+    for i in range(n):
+        b = bins[i] - lowest
+        v = hist[b] + volume[i]
+        hist[b] = v
+        counts[b] += 1
+        if v > poc_vol or (v == poc_vol and b < poc_bin):
+            poc_bin = b
+            poc_vol = v
+        if i >= window:
+            old = bins[i - window] - lowest
+            counts[old] -= 1
+            if counts[old] == 0:
+                hist[old] = 0.0
+            else:
+                hist[old] -= volume[i - window]
+            if old == poc_bin:
+                best = -1
+                for j in range(size):
+                    if counts[j] > 0 and (best < 0 or hist[j] > hist[best]):
+                        best = j
+                poc_bin = best
+                poc_vol = hist[best]
+        if i >= window - 1:
+            poc[i] = poc_bin + lowest
+    return poc
+
+
+def new_state(initial_balance=10000.0):
+    """Carried position state of run_positions: balance, position, entry, stop, target, peak"""
+    return np.array([initial_balance, 0.0, 0.0, 0.0, 0.0, 0.0])
+
+
+def _run_positions(close, signal, stop_distance, stop_loss_pct, take_profit_pct, state):
+    """The run_backtest state machine; returns per-bar equity, position, trade type and pnl
+
+    state (see new_state) is read at the start and written back at the end,
+    so a long series can be processed in consecutive chunks.
+    """
+    n = len(close)
+    equity = np.empty(n)
+    positions = np.zeros(n, dtype=np.int8)
+    trade_types = np.full(n, NO_TRADE, dtype=np.int8)
+    pnls = np.full(n, np.nan)
+    balance = state[0]
+    position = int(state[1])
+    entry = state[2]
+    stop = state[3]
+    target = state[4]
+    peak = state[5]
+    for i in range(n):
+        price = close[i]
+        sig = signal[i]
+        if position == 0:
+            if sig == 1 or sig == -1:
+                dist = stop_distance[i]
+                if not np.isfinite(dist):
+                    dist = price * stop_loss_pct
+                position = sig
+                entry = price
+                stop = price - dist if sig == 1 else price + dist
+                target = price * (1 + take_profit_pct) if sig == 1 else price * (1 - take_profit_pct)
+                peak = price
+                trade_types[i] = _BUY if sig == 1 else _SELL
+        else:
+            exit_type = NO_TRADE
+            if position == 1:
+                if price <= stop:
+                    exit_type = _STOP_LOSS
+                elif price >= target:
+                    exit_type = _TAKE_PROFIT
+                elif price > peak:
+                    peak = price
+                elif sig == -1:
+                    exit_type = _SIGNAL_EXIT
+                if exit_type >= 0:
+                    balance *= price / entry
+                    pnls[i] = price / entry - 1
+            else:
+                if price >= stop:
+                    exit_type = _STOP_LOSS
+                elif price <= target:
+                    exit_type = _TAKE_PROFIT
+                elif price < peak:
+                    peak = price
+                elif sig == 1:
+                    exit_type = _SIGNAL_EXIT
+                if exit_type >= 0:
+                    balance *= entry / price
+                    pnls[i] = entry / price - 1
+            if exit_type >= 0:
+                position = 0
+                trade_types[i] = exit_type
+        equity[i] = balance
+        positions[i] = position
+    state[0] = balance
+    state[1] = position
+    state[2] = entry
+    state[3] = stop
+    state[4] = target
+    state[5] = peak
+    return equity, positions, trade_types, pnls
+
+
+def _simulate(close, signal, stop_distance, stop_loss_pct, take_profit_pct, initial_balance):
+    """_run_positions for every column of Fortran-ordered (bars, k) arrays, plus trade totals"""
+    n, k = close.shape
+    equity = np.empty((k, n)).T  # 列连续，与输入一致
+    totals = np.zeros((5, k))  # entries, closed, wins, gross_profit, gross_loss
+    for j in range(k):
+        state = np.zeros(6)
+        state[0] = initial_balance
+        eq, _, types, pnls = _run_positions_jit(close[:, j], signal[:, j], stop_distance[:, j],
+                                                stop_loss_pct[j], take_profit_pct[j], state)
+        equity[:, j] = eq
+        for i in range(n):
+            if types[i] == _BUY or types[i] == _SELL:
+                totals[0, j] += 1
+            elif types[i] != NO_TRADE:
+                totals[1, j] += 1
+                if pnls[i] > 0:
+                    totals[2, j] += 1
+                    totals[3, j] += pnls[i]
+                elif pnls[i] < 0:
+                    totals[4, j] -= pnls[i]
+    return equity, totals
+
+
+_rolling_mean_jit = _jit(_rolling_mean)
+_rolling_std_jit = _jit(_rolling_std)
+_ema_jit = _jit(_ema)
+_rsi_jit = _jit(_rsi)
+_true_range_jit = _jit(_true_range)
+_volume_profile_jit = _jit(_volume_profile)
+_run_positions_jit = _jit(_run_positions)
+_simulate_jit = _jit(_simulate)
+
+
+def _as_float(x):
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+def rolling_mean(x, window):
+    if JIT_ENABLED:
+        return _rolling_mean_jit(_as_float(x), window)
+    return kernels.rolling_mean(x, window)
+
+
+def rolling_std(x, window):
+    """Rolling sample standard deviation (ddof=1)"""
+    if JIT_ENABLED:
+        return _rolling_std_jit(_as_float(x), window)
+    return kernels.rolling_std(x, window)
+
+
+def ema(x, span, initial=None):
+    """EMA matching pandas ewm(span, adjust=False); initial continues a previous block"""
+    if JIT_ENABLED:
+        return _ema_jit(_as_float(x), span, np.nan if initial is None else float(initial))
+    return kernels.ema(x, span, initial)
+
+
+def rsi(close, period):
+    if JIT_ENABLED:
+        return _rsi_jit(_as_float(close), period)
+    return kernels.rsi(close, period)
+
+
+def macd(close, fast, slow, signal, state=None):
+    """MACD line and signal line
+
+    state: dict carrying the last EMA values between consecutive blocks
+    (updated in place); None computes the series on its own.
+    """
+    state = {} if state is None else state
+    fast_ema = ema(close, fast, state.get('fast'))
+    slow_ema = ema(close, slow, state.get('slow'))
+    line = fast_ema - slow_ema
+    signal_line = ema(line, signal, state.get('signal'))
+    if len(line):
+        state.update(fast=fast_ema[-1], slow=slow_ema[-1], signal=signal_line[-1])
+    return line, signal_line
+
+
+def bollinger(close, period):
+    """Bollinger middle band and rolling std (bands are middle +- BB_STD * std)"""
+    return rolling_mean(close, period), rolling_std(close, period)
+
+
+def atr(high, low, close, period):
+    """Average True Range (simple rolling mean of the true range)"""
+    if JIT_ENABLED:
+        tr = _true_range_jit(_as_float(high), _as_float(low), _as_float(close))
+        return _rolling_mean_jit(tr, period)
+    return kernels.atr(high, low, close, period)
+
+
+def rolling_volume_profile(close, volume, window, bin_width, state=None):
+    """Rolling volume-profile POC; the carried-state (block) form runs kernels.rolling_volume_profile"""
+    if JIT_ENABLED and state is None:
+        poc_bin = _volume_profile_jit(kernels.volume_profile_bins(close, bin_width), _as_float(volume), window)
+        return np.exp((poc_bin + 0.5) * bin_width)
+    return kernels.rolling_volume_profile(close, volume, window, bin_width, state)
+
+
+def run_positions(close, signal, stop_distance=None, stop_loss_pct=STOP_LOSS_PCT,
+                  take_profit_pct=TAKE_PROFIT_PCT, initial_balance=10000.0, state=None):
+    """Position / exit loop of run_backtest for one series
+
+    stop_distance: absolute stop distances per bar (NaN -> percentage stop).
+    state: carried state from new_state (updated in place) to continue a
+    previous chunk; None starts flat with initial_balance.
+    Returns (equity, positions, trade_types, pnls); trade_types holds
+    TradeType codes on bars with a trade and NO_TRADE elsewhere, pnls the
+    closed-trade return on exit bars.
+    """
+    close = _as_float(close)
+    signal = np.ascontiguousarray(signal, dtype=np.int8)
+    if stop_distance is None:
+        stop_distance = np.full(len(close), np.nan)
+    stop_distance = _as_float(stop_distance)
+    if state is None:
+        state = new_state(initial_balance)
+    func = _run_positions_jit if JIT_ENABLED else _run_positions
+    return func(close, signal, stop_distance, float(stop_loss_pct), float(take_profit_pct), state)
+
+
+def _broadcast_columns(close, signal, stop_distance):
+    signal = np.asarray(signal)
+    if signal.ndim == 1:
+        signal = signal[:, np.newaxis]
+    shape = signal.shape
+    close = np.asarray(close, dtype=np.float64)
+    close = np.broadcast_to(close[:, np.newaxis] if close.ndim == 1 else close, shape)
+    if stop_distance is not None:
+        stop_distance = np.asarray(stop_distance, dtype=np.float64)
+        stop_distance = np.broadcast_to(stop_distance[:, np.newaxis] if stop_distance.ndim == 1
+                                        else stop_distance, shape)
+    return close, signal, stop_distance
+
+
+def simulate(close, signal, stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT,
+             initial_balance=10000.0, stop_distance=None):
+    """Same inputs and result dict as kernels.simulate, compiled column by column
+
+    close, signal and stop_distance may be (bars,) arrays shared by all
+    columns of a (bars, k) signal matrix.
+    """
+    close, signal, stop_distance = _broadcast_columns(close, signal, stop_distance)
+    if not JIT_ENABLED:
+        return kernels.simulate(close, signal, stop_loss_pct, take_profit_pct, initial_balance, stop_distance)
+    k = signal.shape[1]
+    equity, totals = _simulate_jit(
+        np.asfortranarray(close, dtype=np.float64),
+        np.asfortranarray(signal, dtype=np.int8),
+        np.asfortranarray(np.full(close.shape, np.nan) if stop_distance is None else stop_distance,
+                          dtype=np.float64),
+        _as_float(np.broadcast_to(np.asarray(stop_loss_pct, dtype=np.float64), (k,))),
+        _as_float(np.broadcast_to(np.asarray(take_profit_pct, dtype=np.float64), (k,))),
+        float(initial_balance)
+    )
+    return {
+        'equity': equity,
+        'entries': totals[0].astype(np.int64),
+        'closed': totals[1].astype(np.int64),
+        'wins': totals[2].astype(np.int64),
+        'gross_profit': totals[3],
+        'gross_loss': totals[4]
+    }
@@ -0,0 +1,340 @@
+"""Vectorized indicator and backtest kernels
+
+All functions take price arrays shaped (bars,) or (bars, paths) and work
+along axis 0, so many price paths or strategy variants are processed in one
+call. They reproduce TradingStrategy.calculate_indicators/generate_signals/
+get_signal and the BacktestEngine.run_backtest state machine.
+"""
+import numpy as np
+from scipy.signal import lfilter
+from config.config import (
+    RSI_PERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD,
+    MACD_FAST, MACD_SLOW, MACD_SIGNAL,
+    BB_PERIOD, BB_STD, MA_PERIOD,
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT,
+    ATR_PERIOD, VP_WINDOW, VP_BIN_WIDTH
+)
+
+# generate_signals 中的信号权重（RSI、MACD、布林带、均线）
+SIGNAL_WEIGHTS = (0.3, 0.3, 0.2, 0.2)
+SIGNAL_THRESHOLD = 0.7
+
+
+def rolling_mean(x, window):
+    """Rolling mean along axis 0, NaN until the window is full"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    c = np.cumsum(x, axis=0)
+    out[window - 1] = c[window - 1]
+    out[window:] = c[window:] - c[:-window]
+    out[window - 1:] /= window
+    return out
+
+
+def rolling_std(x, window):
+    """Rolling sample standard deviation (ddof=1) along axis 0"""
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan)
+    if len(x) < window:
+        return out
+    # 以首个值为基准平移，减小大数平方相减的精度损失
+    d = x - x[:1]
+    s1 = rolling_mean(d, window) * window
+    s2 = rolling_mean(d * d, window) * window
+    var = (s2 - s1 * s1 / window) / (window - 1)
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def ema(x, span, initial=None):
+    """Exponential moving average matching pandas ewm(span, adjust=False)
+
+    initial: last EMA value of a preceding block to continue from.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    alpha = 2.0 / (span + 1)
+    zi = (1 - alpha) * (x[:1] if initial is None else np.full(x[:1].shape, initial))
+    y, _ = lfilter([alpha], [1.0, alpha - 1], x, axis=0, zi=zi)
+    return y
+
+
+def rsi(close, period=RSI_PERIOD):
+    """RSI with simple rolling averages of gains and losses"""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.zeros_like(close)
+    delta[1:] = close[1:] - close[:-1]
+    gain = rolling_mean(np.maximum(delta, 0.0), period)
+    loss = rolling_mean(np.maximum(-delta, 0.0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = gain / loss
+        return 100 - 100 / (1 + rs)
+
+
+def macd(close, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+    """MACD line and signal line"""
+    line = ema(close, fast) - ema(close, slow)
+    return line, ema(line, signal)
+
+
+def bollinger(close, period=BB_PERIOD, num_std=BB_STD):
+    """Bollinger middle, upper and lower bands"""
+    middle = rolling_mean(close, period)
+    std = rolling_std(close, period)
+    return middle, middle + std * num_std, middle - std * num_std
+
+
+def atr(high, low, close, period=ATR_PERIOD):
+    """Average True Range (simple rolling mean of the true range)"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    tr = high - low
+    prev_close = close[:-1]
+    tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+    return rolling_mean(tr, period)
+
+
+def new_volume_profile_state():
+    """Carried state of rolling_volume_profile between consecutive blocks"""
+    return {'hist': {}, 'counts': {}, 'poc_bin': None, 'poc_vol': -1.0, 'seen': 0,
+            'recent_bins': np.empty(0, dtype=np.int64), 'recent_vols': np.empty(0)}
+
+
+def volume_profile_bins(close, bin_width=VP_BIN_WIDTH):
+    """Bin of each price on the absolute log-price grid floor(log(p) / bin_width)"""
+    return np.floor(np.log(np.asarray(close, dtype=np.float64)) / bin_width).astype(np.int64)
+
+
+def rolling_volume_profile(close, volume, window=VP_WINDOW, bin_width=VP_BIN_WIDTH, state=None):
+    """Point of control (price of the highest-volume bin) of a rolling volume profile
+
+    Bars are binned on an absolute log-price grid (bin_width wide in log
+    price), so a price's bin and the POC of a window do not depend on where
+    the series starts. Each step adds the new bar's volume to its bin and
+    subtracts the bar leaving the window instead of re-binning the window; a
+    bin is dropped when its last bar leaves. The POC is only rescanned over
+    the occupied bins when the current POC bin loses volume; ties go to the
+    lowest bin. Returns NaN until the first window is complete.
+
+    state: dict from new_volume_profile_state() to process a series in
+    consecutive blocks (updated in place); the result equals one pass.
+    """
+    volume = np.asarray(volume, dtype=np.float64)
+    n = len(volume)
+    poc = np.full(n, np.nan)
+    state = new_volume_profile_state() if state is None else state
+
+    # 前一段窗口内的K线放在前面，用于移出窗口时扣减
+    r = len(state['recent_bins'])
+    bins = np.concatenate([state['recent_bins'], volume_profile_bins(close, bin_width)])
+    vols = np.concatenate([state['recent_vols'], volume])
+    hist, counts = state['hist'], state['counts']
+    poc_bin, poc_vol = state['poc_bin'], state['poc_vol']
+    seen = state['seen']
+    for i in range(r, len(bins)):
+        g = seen + i - r  # 全序列中的位置
+        b = bins[i]
+        v = hist.get(b, 0.0) + vols[i]
+        hist[b] = v
+        counts[b] = counts.get(b, 0) + 1
+        if v > poc_vol or (v == poc_vol and b < poc_bin):
+            poc_bin, poc_vol = b, v
+        if g >= window:
+            old = bins[i - window]
+            if counts[old] == 1:
+                del hist[old], counts[old]
+            else:
+                hist[old] -= vols[i - window]
+                counts[old] -= 1
+            if old == poc_bin:
+                poc_bin = max(hist, key=lambda k: (hist[k], -k))
+                poc_vol = hist[poc_bin]
+        if g >= window - 1:
+            poc[i - r] = np.exp((poc_bin + 0.5) * bin_width)
+    state.update(poc_bin=poc_bin, poc_vol=poc_vol, seen=seen + len(bins) - r,
+                 recent_bins=bins[-window:], recent_vols=vols[-window:])
+    return poc
+
+
+def indicators(close):
+    """All indicators used by the technical signal"""
+    macd_line, macd_signal = macd(close)
+    bb_middle, bb_upper, bb_lower = bollinger(close)
+    return {
+        'rsi': rsi(close),
+        'macd': macd_line,
+        'macd_signal': macd_signal,
+        'bb_upper': bb_upper,
+        'bb_lower': bb_lower,
+        'ma': rolling_mean(close, MA_PERIOD)
+    }
+
+
+def technical_score(close, ind=None, rsi_overbought=RSI_OVERBOUGHT, rsi_oversold=RSI_OVERSOLD,
+                    weights=SIGNAL_WEIGHTS):
+    """Weighted technical score in [-2, 2], same as TradingStrategy.generate_signals"""
+    close = np.asarray(close, dtype=np.float64)
+    if ind is None:
+        ind = indicators(close)
+    r = ind['rsi']
+    rsi_signal = np.where(r > rsi_overbought, -1, np.where(r < rsi_oversold, 1, 0))
+    macd_signal = np.sign(ind['macd'] - ind['macd_signal'])
+    bb_signal = np.where(close > ind['bb_upper'], -1, np.where(close < ind['bb_lower'], 1, 0))
+    ma_signal = np.where(close > ind['ma'], 1, np.where(close < ind['ma'], -1, 0))
+    score = (rsi_signal * weights[0] + np.nan_to_num(macd_signal) * weights[1] +
+             bb_signal * weights[2] + ma_signal * weights[3])
+    return score * 2
+
+
+def discretize(score, threshold=SIGNAL_THRESHOLD):
+    """Map a score to 1 (buy), -1 (sell) or 0 (hold) like get_signal"""
+    return np.where(score > threshold, 1, np.where(score < -threshold, -1, 0)).astype(np.int8)
+
+
+def new_position_state(k):
+    """Flat position state for k columns, as used by step_positions"""
+    return {
+        'position': np.zeros(k, dtype=np.int8),
+        'entry': np.zeros(k),
+        'stop': np.zeros(k),
+        'target': np.zeros(k),
+        'peak': np.zeros(k)
+    }
+
+
+def step_positions(price, sig, state, stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT,
+                   stop_distance=None):
+    """Advance the run_backtest position state machine by one bar for every column
+
+    price, sig: (k,) arrays of the bar's close and signal (1 / -1 / 0);
+    state: dict from new_position_state, updated in place. stop_distance is
+    an optional (k,) array of absolute stop distances (NaN -> percentage stop).
+    Returns (exited, ratio, entering): the exit mask, the balance multiplier
+    of the closed trades (1.0 elsewhere) and the entry mask.
+    """
+    position = state['position']
+    entry = state['entry']
+    stop = state['stop']
+    target = state['target']
+    peak = state['peak']
+    is_long = position == 1
+    is_short = position == -1
+    flat = position == 0
+
+    # Long exits: stop loss > take profit > new high > opposite signal
+    long_sl = is_long & (price <= stop)
+    long_tp = is_long & ~long_sl & (price >= target)
+    long_rest = is_long & ~long_sl & ~long_tp
+    long_high = long_rest & (price > peak)
+    long_sig = long_rest & ~long_high & (sig == -1)
+    exit_long = long_sl | long_tp | long_sig
+
+    # Short exits
+    short_sl = is_short & (price >= stop)
+    short_tp = is_short & ~short_sl & (price <= target)
+    short_rest = is_short & ~short_sl & ~short_tp
+    short_low = short_rest & (price < peak)
+    short_sig = short_rest & ~short_low & (sig == 1)
+    exit_short = short_sl | short_tp | short_sig
+
+    peak = np.where(long_high | short_low, price, peak)
+    exited = exit_long | exit_short
+    if exited.any():
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(exit_long, price / entry, np.where(exit_short, entry / price, 1.0))
+        position = np.where(exited, 0, position).astype(np.int8)
+    else:
+        ratio = np.ones(len(position))
+
+    # Entries (only from a flat position at the start of the bar)
+    go_long = flat & (sig == 1)
+    go_short = flat & (sig == -1)
+    entering = go_long | go_short
+    if entering.any():
+        position = np.where(go_long, 1, np.where(go_short, -1, position)).astype(np.int8)
+        entry = np.where(entering, price, entry)
+        if stop_distance is None:
+            stop = np.where(go_long, price * (1 - stop_loss_pct), np.where(go_short, price * (1 + stop_loss_pct), stop))
+        else:
+            dist = np.where(np.isfinite(stop_distance), stop_distance, price * stop_loss_pct)
+            stop = np.where(go_long, price - dist, np.where(go_short, price + dist, stop))
+        target = np.where(go_long, price * (1 + take_profit_pct), np.where(go_short, price * (1 - take_profit_pct), target))
+        peak = np.where(entering, price, peak)
+
+    state.update(position=position, entry=entry, stop=stop, target=target, peak=peak)
+    return exited, ratio, entering
+
+
+def simulate(close, signal, stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT,
+             initial_balance=10000.0, stop_distance=None):
+    """Run the run_backtest position state machine on many columns at once
+
+    close, signal: (bars, paths) arrays; stop_loss_pct/take_profit_pct may be
+    scalars or per-column arrays. stop_distance is an optional (bars, paths)
+    array of absolute stop distances (e.g. ATR_MULTIPLIER * ATR); where it is
+    finite it replaces the percentage stop at entry. Loops over bars only,
+    each step is a handful of masked array operations across all columns.
+
+    Returns a dict with the (bars, paths) equity matrix and per-column
+    trade totals (entries, closed, wins, gross_profit, gross_loss).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    signal = np.asarray(signal)
+    if close.ndim == 1:
+        close = close[:, np.newaxis]
+        signal = signal[:, np.newaxis]
+        if stop_distance is not None:
+            stop_distance = np.asarray(stop_distance)[:, np.newaxis]
+    n, k = close.shape
+    sl = np.broadcast_to(np.asarray(stop_loss_pct, dtype=np.float64), (k,))
+    tp = np.broadcast_to(np.asarray(take_profit_pct, dtype=np.float64), (k,))
+
+    balance = np.full(k, float(initial_balance))
+    state = new_position_state(k)
+    entries = np.zeros(k, dtype=np.int64)
+    closed = np.zeros(k, dtype=np.int64)
+    wins = np.zeros(k, dtype=np.int64)
+    gross_profit = np.zeros(k)
+    gross_loss = np.zeros(k)
+    equity = np.empty((n, k))
+
+    for i in range(n):
+        exited, ratio, entering = step_positions(
+            close[i], signal[i], state, sl, tp,
+            None if stop_distance is None else stop_distance[i]
+        )
+        if exited.any():
+            balance = np.where(exited, balance * ratio, balance)
+            pnl = ratio - 1
+            closed += exited
+            wins += exited & (pnl > 0)
+            gross_profit += np.where(exited & (pnl > 0), pnl, 0.0)
+            gross_loss -= np.where(exited & (pnl < 0), pnl, 0.0)
+        entries += entering
+        equity[i] = balance
+
+    return {
+        'equity': equity,
+        'entries': entries,
+        'closed': closed,
+        'wins': wins,
+        'gross_profit': gross_profit,
+        'gross_loss': gross_loss
+    }
+
+
+def column_metrics(equity, initial_balance=10000.0, bars_per_year=365):
+    """Total return, max drawdown and Sharpe for every column of an equity matrix (percent units)"""
+    equity = np.asarray(equity, dtype=np.float64)
+    total_return = (equity[-1] / initial_balance - 1) * 100
+    peak = np.maximum.accumulate(equity, axis=0)
+    max_drawdown = ((peak - equity) / peak).max(axis=0) * 100
+    returns = equity[1:] / equity[:-1] - 1
+    sharpe = np.zeros(equity.shape[1:])
+    if len(returns) > 1:
+        std = returns.std(axis=0, ddof=1)
+        mean = returns.mean(axis=0)
+        ok = std > 0
+        sharpe[ok] = np.sqrt(bars_per_year) * mean[ok] / std[ok]
+    return {'total_return': total_return, 'max_drawdown': max_drawdown, 'sharpe_ratio': sharpe}
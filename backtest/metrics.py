@@ -0,0 +1,271 @@
+import math
+import numpy as np
+
+# 每个周期对应的分钟数
+_TIMEFRAME_UNITS = {'m': 1, 'h': 60, 'd': 1440, 'w': 10080, 'M': 43200}
+
+
+def timeframe_to_minutes(timeframe):
+    """Convert a ccxt-style timeframe string ('15m', '1h', '1d', ...) to minutes"""
+    unit = timeframe[-1]
+    if unit not in _TIMEFRAME_UNITS:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return int(timeframe[:-1] or 1) * _TIMEFRAME_UNITS[unit]
+
+
+def periods_per_year(timeframe=None, minutes=None, days_per_year=365):
+    """Number of bars per year for a timeframe (crypto trades every day)"""
+    if minutes is None:
+        minutes = timeframe_to_minutes(timeframe)
+    return days_per_year * 1440 / minutes
+
+
+def infer_bar_minutes(index):
+    """Infer the bar size in minutes from a DatetimeIndex, None if unknown"""
+    values = np.asarray(index)
+    if len(values) < 2 or not np.issubdtype(values.dtype, np.datetime64):
+        return None
+    step = np.median(np.diff(values) / np.timedelta64(1, 'm'))
+    if step <= 0:
+        return None
+    return float(step)
+
+
+def _empty_metrics():
+    return {
+        'total_return': 0.0,
+        'annual_return': 0.0,
+        'max_drawdown': 0.0,
+        'max_drawdown_duration': 0,
+        'sharpe_ratio': 0.0,
+        'sortino_ratio': 0.0,
+        'calmar_ratio': 0.0,
+        'win_rate': 0.0,
+        'profit_factor': 0.0,
+        'avg_trade_return': 0.0,
+        'exposure': 0.0,
+        'closed_trades': 0,
+        'total_trades': 0
+    }
+
+
+def compute_metrics(equity, initial_balance, positions=None, trade_pnls=None,
+                    bars_per_year=365, total_trades=None):
+    """Compute risk metrics over an equity array
+
+    equity: float64 array with one balance per bar
+    positions: optional per-bar position array (0 = flat), used for exposure
+    trade_pnls: fractional return of every closed trade
+    bars_per_year: annualization factor matching the bar timeframe
+    total_trades: number of trade records (entries + exits), defaults to closed trades
+
+    profit_factor is None when there are winning but no losing trades (the
+    ratio is unbounded; JSON has no infinity), 0.0 without closed trades.
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    trade_pnls = np.asarray(trade_pnls if trade_pnls is not None else [], dtype=np.float64)
+    metrics = _empty_metrics()
+    n = len(equity)
+    if n == 0:
+        return metrics
+
+    # Returns
+    returns = equity[1:] / equity[:-1] - 1
+    total_return = equity[-1] / initial_balance - 1
+    years = n / bars_per_year
+    annual_return = (equity[-1] / initial_balance) ** (1 / years) - 1 if equity[-1] > 0 else -1.0
+
+    # Drawdown and its duration (bars since the last equity high)
+    peak = np.maximum.accumulate(equity)
+    drawdown = (peak - equity) / peak
+    max_drawdown = drawdown.max()
+    bar_idx = np.arange(n)
+    last_high = np.maximum.accumulate(np.where(equity >= peak, bar_idx, 0))
+    max_dd_duration = int((bar_idx - last_high).max())
+
+    # Risk-adjusted ratios
+    ann = math.sqrt(bars_per_year)
+    sharpe = sortino = 0.0
+    if len(returns) > 1:
+        std = returns.std(ddof=1)
+        mean = returns.mean()
+        if std > 0:
+            sharpe = ann * mean / std
+        downside = math.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+        if downside > 0:
+            sortino = ann * mean / downside
+    calmar = annual_return / max_drawdown if max_drawdown > 0 else 0.0
+
+    # Per-trade statistics
+    closed = len(trade_pnls)
+    if closed:
+        gross_profit = trade_pnls[trade_pnls > 0].sum()
+        gross_loss = -trade_pnls[trade_pnls < 0].sum()
+        metrics['win_rate'] = float((trade_pnls > 0).mean() * 100)
+        metrics['avg_trade_return'] = float(trade_pnls.mean() * 100)
+        if gross_loss > 0:
+            metrics['profit_factor'] = float(gross_profit / gross_loss)
+        elif gross_profit > 0:
+            metrics['profit_factor'] = None  # 没有亏损交易：盈亏比无上界
+
+    if positions is not None and len(positions):
+        metrics['exposure'] = float(np.count_nonzero(positions) / len(positions) * 100)
+
+    metrics.update({
+        'total_return': float(total_return * 100),
+        'annual_return': float(annual_return * 100),
+        'max_drawdown': float(max_drawdown * 100),
+        'max_drawdown_duration': max_dd_duration,
+        'sharpe_ratio': float(sharpe),
+        'sortino_ratio': float(sortino),
+        'calmar_ratio': float(calmar),
+        'closed_trades': closed,
+        'total_trades': closed if total_trades is None else total_trades
+    })
+    return metrics
+
+
+class StreamingMetrics:
+    """Bar-by-bar metrics for live monitoring
+
+    Keeps O(1) state (running moments, peak, drawdown counters and trade
+    totals) instead of the full equity history, so it can run indefinitely
+    inside a live loop. snapshot() returns the same keys as compute_metrics.
+    """
+
+    def __init__(self, initial_balance, bars_per_year=365):
+        self.initial_balance = initial_balance
+        self.bars_per_year = bars_per_year
+        self.bars = 0
+        self.last_equity = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self.dd_duration = 0
+        self.max_dd_duration = 0
+        self.exposed_bars = 0
+        # Welford moments of bar returns
+        self.n_returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.downside_sq = 0.0
+        # Trade totals
+        self.closed_trades = 0
+        self.total_trades = 0
+        self.wins = 0
+        self.pnl_sum = 0.0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+
+    def update(self, equity, position=0):
+        """Feed the equity (and position) of one closed bar"""
+        self.bars += 1
+        if position != 0:
+            self.exposed_bars += 1
+
+        if self.last_equity is not None:
+            r = equity / self.last_equity - 1
+            self.n_returns += 1
+            delta = r - self.mean
+            self.mean += delta / self.n_returns
+            self.m2 += delta * (r - self.mean)
+            if r < 0:
+                self.downside_sq += r * r
+        self.last_equity = equity
+
+        if self.peak is None or equity >= self.peak:
+            self.peak = equity
+            self.dd_duration = 0
+        else:
+            self.dd_duration += 1
+            self.max_dd_duration = max(self.max_dd_duration, self.dd_duration)
+            self.max_drawdown = max(self.max_drawdown, (self.peak - equity) / self.peak)
+
+    def update_many(self, equity, positions=None):
+        """Feed a block of consecutive bars at once (vectorized equivalent of update per bar)
+
+        Block moments are merged into the running ones with the parallel
+        (Chan) update; peak and drawdown duration continue from the
+        previous block.
+        """
+        equity = np.asarray(equity, dtype=np.float64)
+        n = len(equity)
+        if n == 0:
+            return
+        self.bars += n
+        if positions is not None:
+            self.exposed_bars += int(np.count_nonzero(positions))
+
+        prev = equity if self.last_equity is None else np.concatenate([[self.last_equity], equity])
+        returns = prev[1:] / prev[:-1] - 1
+        if len(returns):
+            m = len(returns)
+            mean = float(returns.mean())
+            total = self.n_returns + m
+            delta = mean - self.mean
+            self.m2 += float(np.square(returns - mean).sum()) + delta * delta * self.n_returns * m / total
+            self.mean += delta * m / total
+            self.n_returns = total
+            self.downside_sq += float(np.square(np.minimum(returns, 0.0)).sum())
+        self.last_equity = float(equity[-1])
+
+        peak = np.maximum.accumulate(equity)
+        if self.peak is not None:
+            peak = np.maximum(peak, self.peak)
+        self.max_drawdown = max(self.max_drawdown, float(((peak - equity) / peak).max()))
+        # 距上一个新高的K线数，块内没有新高时接着上一块计数
+        bar_idx = np.arange(1, n + 1)
+        last_high = np.maximum.accumulate(np.where(equity >= peak, bar_idx, 0))
+        duration = np.where(last_high > 0, bar_idx - last_high, self.dd_duration + bar_idx)
+        self.max_dd_duration = max(self.max_dd_duration, int(duration.max()))
+        self.dd_duration = int(duration[-1])
+        self.peak = float(peak[-1])
+
+    def record_trade(self, pnl=None):
+        """Record a trade record; pass pnl (fractional return) for closing trades"""
+        self.total_trades += 1
+        if pnl is None:
+            return
+        self.closed_trades += 1
+        self.pnl_sum += pnl
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+        elif pnl < 0:
+            self.gross_loss -= pnl
+
+    def snapshot(self):
+        """Current metrics as a dict"""
+        metrics = _empty_metrics()
+        if self.bars == 0:
+            return metrics
+
+        ann = math.sqrt(self.bars_per_year)
+        total = self.last_equity / self.initial_balance
+        annual_return = total ** (self.bars_per_year / self.bars) - 1 if total > 0 else -1.0
+        if self.n_returns > 1:
+            std = math.sqrt(self.m2 / (self.n_returns - 1))
+            if std > 0:
+                metrics['sharpe_ratio'] = ann * self.mean / std
+            downside = math.sqrt(self.downside_sq / self.n_returns)
+            if downside > 0:
+                metrics['sortino_ratio'] = ann * self.mean / downside
+        if self.max_drawdown > 0:
+            metrics['calmar_ratio'] = annual_return / self.max_drawdown
+        if self.closed_trades:
+            metrics['win_rate'] = self.wins / self.closed_trades * 100
+            metrics['avg_trade_return'] = self.pnl_sum / self.closed_trades * 100
+            if self.gross_loss > 0:
+                metrics['profit_factor'] = self.gross_profit / self.gross_loss
+            elif self.gross_profit > 0:
+                metrics['profit_factor'] = None  # 没有亏损交易：盈亏比无上界
+
+        metrics.update({
+            'total_return': (total - 1) * 100,
+            'annual_return': annual_return * 100,
+            'max_drawdown': self.max_drawdown * 100,
+            'max_drawdown_duration': self.max_dd_duration,
+            'exposure': self.exposed_bars / self.bars * 100,
+            'closed_trades': self.closed_trades,
+            'total_trades': self.total_trades
+        })
+        return metrics
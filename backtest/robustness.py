@@ -0,0 +1,164 @@
+"""Monte Carlo / bootstrap robustness analysis
+
+Runs the technical strategy over thousands of resampled or synthetic price
+paths with the vectorized kernels in backtest.kernels, split into batches
+across worker processes, and reports distributions instead of the single
+point estimate of one backtest.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from backtest import kernels
+from backtest.metrics import periods_per_year
+from config.config import (
+    TIMEFRAME, STOP_LOSS_PCT, TAKE_PROFIT_PCT, ATR_MULTIPLIER, USE_ATR_STOPS,
+    MC_PATHS, MC_BLOCK_SIZE, MC_BATCH_SIZE, MC_WORKERS
+)
+
+QUANTILES = (5, 25, 50, 75, 95)
+
+
+def block_bootstrap_paths(close, n_paths, block_size=MC_BLOCK_SIZE, rng=None):
+    """Circular block bootstrap of log returns, returns a (bars, n_paths) price matrix
+
+    Whole blocks of consecutive returns are resampled so short-range
+    autocorrelation and volatility clustering survive the reshuffle.
+    """
+    rng = np.random.default_rng(rng)
+    close = np.asarray(close, dtype=np.float64)
+    log_returns = np.diff(np.log(close))
+    m = len(log_returns)
+    n_blocks = -(-m // block_size)
+    starts = rng.integers(0, m, size=(n_paths, n_blocks))
+    idx = (starts[:, :, np.newaxis] + np.arange(block_size)) % m
+    sampled = log_returns[idx.reshape(n_paths, -1)[:, :m]]
+    paths = np.empty((m + 1, n_paths))
+    paths[0] = close[0]
+    paths[1:] = close[0] * np.exp(np.cumsum(sampled, axis=1)).T
+    return paths
+
+
+def synthetic_paths(n_bars, n_paths, interval='1d', seed=None, start_price=30000.0):
+    """Independent SyntheticMarket paths as a (bars, n_paths) price matrix"""
+    from scripts.test_data import SyntheticMarket
+    parent = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = parent.spawn(n_paths)
+    paths = np.empty((n_bars, n_paths))
+    for j, s in enumerate(seeds):
+        paths[:, j] = SyntheticMarket(interval=interval, seed=s, start_price=start_price).generate(n_bars)['close']
+    return paths
+
+
+def evaluate_paths(paths, stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT,
+                   initial_balance=10000.0, bars_per_year=None):
+    """Backtest every column of a price matrix, returns per-path metric arrays
+
+    Paths carry closes only, so ATR stops use the close-to-close true range.
+    bars_per_year defaults to the configured TIMEFRAME.
+    """
+    bars_per_year = bars_per_year or periods_per_year(TIMEFRAME)
+    signal = kernels.discretize(kernels.technical_score(paths))
+    stop_distance = ATR_MULTIPLIER * kernels.atr(paths, paths, paths) if USE_ATR_STOPS else None
+    result = kernels.simulate(paths, signal, stop_loss_pct, take_profit_pct, initial_balance, stop_distance)
+    metrics = kernels.column_metrics(result['equity'], initial_balance, bars_per_year)
+    closed = result['closed']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics['win_rate'] = np.where(closed > 0, result['wins'] / closed * 100, 0.0)
+    metrics['total_trades'] = result['entries'] + closed
+    return metrics
+
+
+def _run_batch(task):
+    """Worker entry point: build one batch of paths and evaluate it"""
+    method, source, n_paths, seed, params = task
+    if method == 'bootstrap':
+        paths = block_bootstrap_paths(source, n_paths, params['block_size'], rng=seed)
+    else:
+        paths = synthetic_paths(source, n_paths, params['interval'], seed=seed,
+                                start_price=params['start_price'])
+    return evaluate_paths(paths, params['stop_loss_pct'], params['take_profit_pct'],
+                          params['initial_balance'], params['bars_per_year'])
+
+
+def summarize(metrics, quantiles=QUANTILES):
+    """Quantiles, mean and loss probability for every metric"""
+    summary = {}
+    for name, values in metrics.items():
+        values = np.asarray(values, dtype=np.float64)
+        stats = {f'p{q}': float(v) for q, v in zip(quantiles, np.percentile(values, quantiles))}
+        stats['mean'] = float(values.mean())
+        summary[name] = stats
+    if 'total_return' in metrics:
+        summary['prob_loss'] = float(np.mean(np.asarray(metrics['total_return']) < 0))
+    return summary
+
+
+def run_monte_carlo(close, n_paths=MC_PATHS, method='bootstrap', block_size=MC_BLOCK_SIZE,
+                    interval='1d', stop_loss_pct=STOP_LOSS_PCT, take_profit_pct=TAKE_PROFIT_PCT,
+                    initial_balance=10000.0, bars_per_year=None, seed=None,
+                    batch_size=MC_BATCH_SIZE, workers=MC_WORKERS):
+    """Evaluate the strategy on n_paths resampled ('bootstrap') or 'synthetic' paths
+
+    interval is the bar size of close (ccxt timeframe or pandas frequency);
+    bars_per_year for the annualized metrics defaults to it. Paths are
+    generated inside the workers from independent seeds, so only the source
+    close series and the compact per-path metrics cross process boundaries.
+    Returns (per-path metric arrays, summary dict).
+    """
+    if bars_per_year is None:
+        from scripts.test_data import _bar_minutes
+        bars_per_year = periods_per_year(minutes=_bar_minutes(interval))
+    close = np.asarray(close, dtype=np.float64)
+    params = {
+        'block_size': block_size,
+        'interval': interval,
+        'start_price': float(close[0]),
+        'stop_loss_pct': stop_loss_pct,
+        'take_profit_pct': take_profit_pct,
+        'initial_balance': initial_balance,
+        'bars_per_year': bars_per_year
+    }
+    source = close if method == 'bootstrap' else len(close)
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_paths // batch_size))
+    tasks = []
+    remaining = n_paths
+    for s in seeds:
+        size = min(batch_size, remaining)
+        tasks.append((method, source, size, s, params))
+        remaining -= size
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        results = [_run_batch(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_run_batch, tasks))
+
+    metrics = {k: np.concatenate([r[k] for r in results]) for k in results[0]}
+    return metrics, summarize(metrics)
+
+
+def trade_reshuffle(trade_pnls, n_paths=MC_PATHS, resample=False, initial_balance=10000.0, seed=None):
+    """Reorder (or resample with replacement) closed-trade returns
+
+    Shuffling keeps the final return fixed but shows how much of the observed
+    drawdown was luck of ordering; resampling also varies the final return.
+    Returns (per-path metric arrays, summary dict).
+    """
+    rng = np.random.default_rng(seed)
+    pnls = np.asarray(trade_pnls, dtype=np.float64)
+    if len(pnls) == 0:
+        empty = {'total_return': np.zeros(1), 'max_drawdown': np.zeros(1)}
+        return empty, summarize(empty)
+    if resample:
+        idx = rng.integers(0, len(pnls), size=(n_paths, len(pnls)))
+    else:
+        idx = np.argsort(rng.random((n_paths, len(pnls))), axis=1)
+    equity = initial_balance * np.cumprod(1 + pnls[idx], axis=1)
+    equity = np.concatenate([np.full((n_paths, 1), initial_balance), equity], axis=1)
+    peak = np.maximum.accumulate(equity, axis=1)
+    metrics = {
+        'total_return': (equity[:, -1] / initial_balance - 1) * 100,
+        'max_drawdown': ((peak - equity) / peak).max(axis=1) * 100
+    }
+    return metrics, summarize(metrics)
@@ -0,0 +1,334 @@
+"""Parameter sweep work queue shared by a coordinator and worker processes
+
+Jobs (data file x stop-loss x take-profit x walk-forward fold) live in one
+SQLite database. Workers on any machine that can open the database path
+claim a job under a lease, renew the lease from a heartbeat thread while
+the backtest runs and write back the metrics dict. A job whose lease runs
+out (worker killed, machine lost) is handed out again, up to
+SWEEP_MAX_ATTEMPTS times. Job ids are hashes of the job spec including the
+data file content, the source version and the config values (see
+utils.result_cache), so resubmitting an unchanged sweep only queues jobs
+that have not finished yet, while a code or config change queues new ones.
+
+Across machines the database must sit on a filesystem with working POSIX
+locks; on one host it needs nothing but the file.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from config.config import (
+    BACKTEST_START_DATE, BACKTEST_END_DATE,
+    SWEEP_QUEUE_PATH, SWEEP_LEASE_SECONDS, SWEEP_MAX_ATTEMPTS, SWEEP_POLL_SECONDS
+)
+from utils.event_log import get_event_log
+from utils.result_cache import code_version, config_params
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    submitted REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+
+def file_hash(path):
+    """Content hash of a data file (part of every job id)"""
+    h = hashlib.blake2b(digest_size=12)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def job_id(spec):
+    return hashlib.blake2b(json.dumps(spec, sort_keys=True).encode(), digest_size=12).hexdigest()
+
+
+def walk_forward_folds(index, n_folds, start_date=None, end_date=None):
+    """(start, end) date strings of n_folds consecutive blocks of the backtest range"""
+    index = index[(index >= (start_date or BACKTEST_START_DATE)) & (index <= (end_date or BACKTEST_END_DATE))]
+    if n_folds <= 1 or len(index) == 0:
+        return [(start_date or BACKTEST_START_DATE, end_date or BACKTEST_END_DATE)]
+    bounds = [round(i * len(index) / n_folds) for i in range(n_folds + 1)]
+    return [(str(index[a]), str(index[b - 1])) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def sweep_jobs(data_paths, stop_losses, take_profits, n_folds=1, load=None):
+    """Job specs for every data file x fold x stop-loss x take-profit
+
+    load(path) returns the candle DataFrame (only its index is used here).
+    """
+    # 代码或配置变化后结果不再有效：两者都进入任务 id
+    version = code_version()
+    config = hashlib.blake2b(json.dumps(config_params(), sort_keys=True, default=str).encode(),
+                             digest_size=12).hexdigest()
+    specs = []
+    for path in data_paths:
+        digest = file_hash(path)
+        folds = walk_forward_folds(load(path).index, n_folds) if n_folds > 1 else \
+            [(BACKTEST_START_DATE, BACKTEST_END_DATE)]
+        for fold, (start, end) in enumerate(folds):
+            for sl in stop_losses:
+                for tp in take_profits:
+                    specs.append({'data': path, 'data_hash': digest, 'fold': fold, 'start': start,
+                                  'end': end, 'stop_loss': sl, 'take_profit': tp,
+                                  'code': version, 'config': config})
+    return specs
+
+
+class SweepQueue:
+    """One connection to the job database (not shared between threads)"""
+
+    def __init__(self, path=SWEEP_QUEUE_PATH, lease_seconds=SWEEP_LEASE_SECONDS,
+                 max_attempts=SWEEP_MAX_ATTEMPTS):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # autocommit；需要原子性的地方显式 BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def submit(self, specs):
+        """Queue specs; jobs already in the database (finished or not) are skipped
+
+        Returns the number of new jobs.
+        """
+        now = time.time()
+        rows = [(job_id(s), json.dumps(s, sort_keys=True), PENDING, now) for s in specs]
+        self.conn.execute('BEGIN IMMEDIATE')
+        before = self.conn.total_changes
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO jobs (id, spec, status, submitted) VALUES (?, ?, ?, ?)', rows)
+        added = self.conn.total_changes - before
+        self.conn.execute('COMMIT')
+        return added
+
+    def retry_failed(self):
+        """Put failed jobs back in the queue with a fresh attempt budget"""
+        cur = self.conn.execute('UPDATE jobs SET status = ?, attempts = 0, error = NULL WHERE status = ?',
+                                (PENDING, FAILED))
+        return cur.rowcount
+
+    def _expire(self, now):
+        # 租约过期：工作进程已丢失，重新排队（超过次数则标记失败）
+        self.conn.execute(
+            'UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, '
+            "error = COALESCE(error, 'lease expired') WHERE status = ? AND lease_until < ?",
+            (self.max_attempts, FAILED, PENDING, RUNNING, now))
+
+    def claim(self, worker):
+        """Lease the next pending job to worker, returns (id, spec) or None"""
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._expire(now)
+            row = self.conn.execute('SELECT id, spec FROM jobs WHERE status = ? ORDER BY submitted, id LIMIT 1',
+                                    (PENDING,)).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    'UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, lease_until = ? '
+                    'WHERE id = ?', (RUNNING, worker, now + self.lease_seconds, row[0]))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def renew(self, jid, worker):
+        """Extend the lease; False if the job was taken away from this worker"""
+        cur = self.conn.execute('UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?',
+                                (time.time() + self.lease_seconds, jid, worker, RUNNING))
+        return cur.rowcount == 1
+
+    def complete(self, jid, worker, result):
+        """Store the result; ignored if the lease was lost (the job runs elsewhere)"""
+        cur = self.conn.execute(
+            'UPDATE jobs SET status = ?, result = ?, error = NULL, finished = ? '
+            'WHERE id = ? AND worker = ? AND status = ?',
+            (DONE, json.dumps(result), time.time(), jid, worker, RUNNING))
+        return cur.rowcount == 1
+
+    def fail(self, jid, worker, error):
+        """Record an error; the job is retried until it runs out of attempts"""
+        self.conn.execute(
+            'UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, error = ? '
+            'WHERE id = ? AND worker = ? AND status = ?',
+            (self.max_attempts, FAILED, PENDING, error, jid, worker, RUNNING))
+
+    def progress(self, ids=None):
+        """Job counts per status (plus 'total') over the whole queue, or only the job ids given"""
+        self._expire_quietly()
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        if ids is None:
+            for status, count in self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+                counts[status] = count
+        else:
+            for jid, status in self.conn.execute('SELECT id, status FROM jobs'):
+                if jid in ids:
+                    counts[status] += 1
+        counts['total'] = sum(counts.values())
+        return counts
+
+    def _expire_quietly(self):
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self._expire(time.time())
+            self.conn.execute('COMMIT')
+        except sqlite3.OperationalError:
+            pass  # 数据库忙，下次再检查
+
+    def results(self, specs=None):
+        """[(spec, metrics)] of finished jobs, restricted to specs if given"""
+        rows = self.conn.execute('SELECT id, spec, result FROM jobs WHERE status = ?', (DONE,)).fetchall()
+        if specs is not None:
+            wanted = {job_id(s) for s in specs}
+            rows = [r for r in rows if r[0] in wanted]
+        return [(json.loads(spec), json.loads(result)) for _, spec, result in rows]
+
+    def failures(self):
+        """[(spec, error)] of jobs that ran out of attempts"""
+        rows = self.conn.execute('SELECT spec, error FROM jobs WHERE status = ?', (FAILED,)).fetchall()
+        return [(json.loads(spec), error) for spec, error in rows]
+
+
+_CANDLES = {}  # 每个工作进程缓存读过的K线：path -> (hash, DataFrame)
+
+
+def run_job(spec, load):
+    """Backtest one job spec, returns the metrics dict (plain floats / ints)"""
+    from backtest.backtest import BacktestEngine
+    path = spec['data']
+    cached = _CANDLES.get(path)
+    if cached is None or cached[0] != spec['data_hash']:
+        cached = _CANDLES[path] = (spec['data_hash'], load(path))
+    engine = BacktestEngine(stop_loss_pct=spec['stop_loss'], take_profit_pct=spec['take_profit'])
+    metrics = engine.run_backtest(cached[1], spec['start'], spec['end'])
+    return {k: v.item() if hasattr(v, 'item') else v for k, v in metrics.items()}
+
+
+def _heartbeat(path, jid, worker, stop, interval):
+    queue = SweepQueue(path)
+    try:
+        while not stop.wait(interval):
+            if not queue.renew(jid, worker):
+                break
+    finally:
+        queue.close()
+
+
+def run_worker(path=SWEEP_QUEUE_PATH, worker=None, load=None, max_jobs=None,
+               wait_for_running=True, poll=SWEEP_POLL_SECONDS):
+    """Claim and run jobs until the queue is drained, returns the number of jobs run
+
+    With wait_for_running the worker keeps polling while other workers still
+    hold jobs, so it can pick them up if their leases expire.
+    """
+    if load is None:
+        from main import load_candles as load
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    events = get_event_log()
+    queue = SweepQueue(path)
+    done = 0
+    try:
+        while max_jobs is None or done < max_jobs:
+            job = queue.claim(worker)
+            if job is None:
+                counts = queue.progress()
+                if counts[PENDING] == 0 and (counts[RUNNING] == 0 or not wait_for_running):
+                    break
+                time.sleep(poll)
+                continue
+            jid, spec = job
+            stop = threading.Event()
+            beat = threading.Thread(target=_heartbeat, daemon=True,
+                                    args=(path, jid, worker, stop, queue.lease_seconds / 3))
+            beat.start()
+            start = time.time()
+            try:
+                result = run_job(spec, load)
+            except Exception as e:
+                events.error('sweep_job_error', job=jid, worker=worker, error=repr(e))
+                queue.fail(jid, worker, repr(e))
+                continue
+            finally:
+                stop.set()
+                beat.join()
+            result['time'] = round(time.time() - start, 3)
+            if queue.complete(jid, worker, result):
+                done += 1
+                events.info('sweep_job', job=jid, worker=worker, time=result['time'])
+    finally:
+        queue.close()
+    return done
+
+
+def _worker_main(path, worker):
+    run_worker(path, worker)
+
+
+def run_sweep(specs, path=SWEEP_QUEUE_PATH, workers=1, poll=SWEEP_POLL_SECONDS, progress=None):
+    """Coordinator: queue specs, start local worker processes and wait for the results
+
+    workers=0 starts none (workers run elsewhere, e.g. `main.py sweep-worker`
+    on other hosts). progress(counts, elapsed) is called on every poll with
+    the counts of the submitted jobs.
+    Returns ([(spec, metrics)], [(spec, error)]) for the submitted specs.
+    """
+    import multiprocessing
+    queue = SweepQueue(path)
+    queue.submit(specs)
+    ids = {job_id(s) for s in specs}
+    ctx = multiprocessing.get_context('spawn')
+    host = socket.gethostname()
+    procs = [ctx.Process(target=_worker_main, args=(path, f'{host}:local{i}'), daemon=True)
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    start = time.time()
+    try:
+        while True:
+            counts = queue.progress(ids)
+            if progress:
+                progress(counts, time.time() - start)
+            if counts[PENDING] == 0 and counts[RUNNING] == 0:
+                break
+            if procs and not any(p.is_alive() for p in procs):
+                # 本地工作进程全部退出：剩余任务留给其他节点或下次运行
+                break
+            time.sleep(poll)
+        results = queue.results(specs)
+        failures = [(s, e) for s, e in queue.failures() if job_id(s) in ids]
+    finally:
+        queue.close()
+        for p in procs:
+            p.join(timeout=poll)
+    return results, failures
+
+
+def print_progress(counts, elapsed):
+    """Single-line progress report for run_sweep"""
+    finished = counts[DONE] + counts[FAILED]
+    eta = elapsed / finished * (counts['total'] - finished) if finished else float('nan')
+    print(f"\r{finished}/{counts['total']} jobs done ({counts[RUNNING]} running, "
+          f"{counts[FAILED]} failed) {elapsed:.0f}s elapsed, ETA {eta:.0f}s", end='', flush=True)
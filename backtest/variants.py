@@ -0,0 +1,115 @@
+"""Evaluate many strategy variants in one pass over shared indicators
+
+A variant is a dict overriding any of VARIANT_DEFAULTS: the signal
+threshold of get_signal, the RSI levels and weights of generate_signals and
+the stop-loss / take-profit percentages. Indicators (and model
+probabilities in hybrid / ai mode) are computed once; the four component
+signals are computed once, the RSI component once per distinct pair of
+levels. The weighted scores of all K variants form a (bars, K) matrix whose
+columns run through the position state machine side by side (jit.simulate).
+"""
+import itertools
+import numpy as np
+from backtest import jit
+from backtest.kernels import SIGNAL_WEIGHTS, SIGNAL_THRESHOLD, column_metrics, discretize
+from backtest.metrics import periods_per_year, infer_bar_minutes
+from config.config import (
+    BACKTEST_START_DATE, BACKTEST_END_DATE, TIMEFRAME,
+    STOP_LOSS_PCT, TAKE_PROFIT_PCT, RSI_OVERBOUGHT, RSI_OVERSOLD,
+    ATR_MULTIPLIER, USE_ATR_STOPS
+)
+
+VARIANT_DEFAULTS = {
+    'threshold': SIGNAL_THRESHOLD,
+    'rsi_overbought': RSI_OVERBOUGHT,
+    'rsi_oversold': RSI_OVERSOLD,
+    'weights': SIGNAL_WEIGHTS,  # RSI, MACD, Bollinger, MA
+    'stop_loss_pct': STOP_LOSS_PCT,
+    'take_profit_pct': TAKE_PROFIT_PCT
+}
+
+
+def expand_variants(**grid):
+    """Cartesian product of value lists, e.g. expand_variants(threshold=[0.5, 0.7], stop_loss_pct=[0.03])"""
+    names = list(grid)
+    return [dict(VARIANT_DEFAULTS, **dict(zip(names, values)))
+            for values in itertools.product(*(grid[n] for n in names))]
+
+
+def signal_components(df):
+    """MACD, Bollinger and MA components of generate_signals (each -1 / 0 / 1)"""
+    close = df['close'].values
+    macd, macd_signal = df['macd'].values, df['macd_signal'].values
+    return {
+        'macd': np.where(macd > macd_signal, 1, np.where(macd < macd_signal, -1, 0)),
+        'bb': np.where(close > df['bb_upper'].values, -1, np.where(close < df['bb_lower'].values, 1, 0)),
+        'ma': np.where(close > df['ma'].values, 1, np.where(close < df['ma'].values, -1, 0))
+    }
+
+
+def score_matrix(df, variants, components=None):
+    """(bars, K) technical scores of generate_signals for every variant"""
+    variants = [dict(VARIANT_DEFAULTS, **v) for v in variants]
+    components = components or signal_components(df)
+    rsi = df['rsi'].values
+    levels = {}  # (overbought, oversold) -> RSI 分量，只算一次
+    for v in variants:
+        key = (v['rsi_overbought'], v['rsi_oversold'])
+        if key not in levels:
+            levels[key] = np.where(rsi > key[0], -1, np.where(rsi < key[1], 1, 0))
+    rsi_signal = np.column_stack([levels[(v['rsi_overbought'], v['rsi_oversold'])] for v in variants])
+    w = np.array([v['weights'] for v in variants], dtype=np.float64)  # (K, 4)
+    # 与 generate_signals 相同的运算顺序，默认变体逐位一致
+    scores = (rsi_signal * w[:, 0] +
+              components['macd'][:, np.newaxis] * w[:, 1] +
+              components['bb'][:, np.newaxis] * w[:, 2] +
+              components['ma'][:, np.newaxis] * w[:, 3])
+    return scores * 2
+
+
+def run_variants(df, variants, strategy=None, initial_balance=10000.0, start_date=None, end_date=None):
+    """Backtest every variant on df (same date filter and signals as BacktestEngine.run_backtest)
+
+    Returns one metrics dict per variant with total_return, max_drawdown,
+    sharpe_ratio, win_rate, profit_factor and total_trades (profit_factor
+    None without losing trades, as in compute_metrics).
+    """
+    if strategy is None:
+        from strategy.strategy import TradingStrategy
+        strategy = TradingStrategy()
+    history = df[df.index <= (end_date or BACKTEST_END_DATE)]
+    df = history[history.index >= (start_date or BACKTEST_START_DATE)]
+    variants = [dict(VARIANT_DEFAULTS, **v) for v in variants]
+    bar_minutes = infer_bar_minutes(df.index)
+    bars_per_year = periods_per_year(TIMEFRAME) if bar_minutes is None else periods_per_year(minutes=bar_minutes)
+
+    indicators = strategy.calculate_indicators(df)
+    scores = score_matrix(indicators, variants)
+    if strategy.signal_mode != 'technical':
+        # 模型概率与变体无关，走步训练一次后广播到所有列
+        probs = strategy.walk_forward_probabilities(strategy.calculate_indicators(history),
+                                                    start=len(history) - len(df))[len(history) - len(df):]
+        scores = strategy.combine_scores(scores, probs[:, np.newaxis])
+    signals = discretize(scores, np.array([v['threshold'] for v in variants]))
+
+    stop_distance = ATR_MULTIPLIER * indicators['atr'].values if USE_ATR_STOPS else None
+    result = jit.simulate(
+        df['close'].values, signals,
+        np.array([v['stop_loss_pct'] for v in variants]),
+        np.array([v['take_profit_pct'] for v in variants]),
+        initial_balance, stop_distance
+    )
+    metrics = column_metrics(result['equity'], initial_balance, bars_per_year)
+    closed = result['closed']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(closed > 0, result['wins'] / closed * 100, 0.0)
+        profit_factor = np.where(result['gross_loss'] > 0, result['gross_profit'] / result['gross_loss'],
+                                 np.where(result['gross_profit'] > 0, np.nan, 0.0))
+    return [{
+        'total_return': float(metrics['total_return'][k]),
+        'max_drawdown': float(metrics['max_drawdown'][k]),
+        'sharpe_ratio': float(metrics['sharpe_ratio'][k]),
+        'win_rate': float(win_rate[k]),
+        'profit_factor': None if np.isnan(profit_factor[k]) else float(profit_factor[k]),
+        'total_trades': int(result['entries'][k] + closed[k])
+    } for k in range(len(variants))]
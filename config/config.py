@@ -22,6 +22,63 @@ STOP_LOSS_PCT = 0.05  # 5% stop loss
 TAKE_PROFIT_PCT = 0.10  # 10% take profit
 MAX_DRAWDOWN_PCT = 0.05  # 5% maximum drawdown
 
+# Plot configuration
+PLOT_MODE = os.getenv('PLOT_MODE', 'headless')  # 'headless' writes chart files, 'interactive' opens a window
+PLOT_OUTPUT_DIR = 'reports'  # Output directory for headless charts
+PLOT_FORMATS = ('png', 'svg')  # Chart file formats
+PLOT_MAX_POINTS = 2000  # Curves are LTTB-downsampled to this many points
+
+# Monte Carlo robustness parameters
+MC_PATHS = 1000  # Number of resampled / synthetic paths
+MC_BLOCK_SIZE = 20  # Block length (bars) for the block bootstrap
+MC_BATCH_SIZE = 250  # Paths evaluated per worker task
+MC_WORKERS = None  # Worker processes, None = all cores
+
+# Distributed sweep queue (SQLite on a shared path)
+SWEEP_QUEUE_PATH = os.getenv('SWEEP_QUEUE_PATH', 'sweeps/queue.db')
+SWEEP_LEASE_SECONDS = 120  # Job lease; renewed by a worker heartbeat, expired leases are retried
+SWEEP_MAX_ATTEMPTS = 3  # Attempts before a job is marked failed
+SWEEP_POLL_SECONDS = 0.5  # Idle worker / progress polling interval
+
+# Runtime metrics (Prometheus text endpoint)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Checkpoint / resume
+CHECKPOINT_INTERVAL_SECONDS = 60  # Minimum time between periodic snapshots
+CHECKPOINT_CHUNK_BARS = 50000  # Bars per backtest chunk (checkpoints are taken between chunks)
+
+# Out-of-core (chunked) backtest
+STREAM_CHUNK_BARS = 200000  # Candles read from disk per block; memory is bounded by this
+STREAM_OUTPUT_DIR = 'reports/stream'  # equity.parquet / trades.parquet written block by block
+
+# Backtest result cache (keyed by data, parameters and code version)
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE', 'true').lower() == 'true'
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', 'cache/results')
+RESULT_CACHE_MAX_MB = 256  # Least recently used entries are deleted beyond this size
+
+# Exchange market metadata cache (ccxt load_markets)
+MARKET_CACHE_PATH = os.getenv('MARKET_CACHE_PATH', 'cache/markets/{exchange}.json')
+MARKET_CACHE_TTL_HOURS = float(os.getenv('MARKET_CACHE_TTL_HOURS', '24'))  # Older copies are downloaded again
+MARKET_CACHE_OFFLINE = os.getenv('MARKET_CACHE_OFFLINE', 'false').lower() == 'true'  # Never download, use the local copy
+
+# Live session recorder / replay
+RECORD_BLOCK_BYTES = 64 * 1024  # Records buffered per compressed block
+SESSION_LOG_DIR = os.getenv('SESSION_LOG_DIR', 'sessions')  # Default location of session logs
+LIVE_WINDOW_BARS = 1000  # Klines per poll (get_klines limit); also the bars get_signal computes indicators on
+
+# Shared-memory candle bus (one ingestion process, many strategy consumers)
+CANDLE_BUS_SLOTS = 4096  # Candles kept in the ring; slower readers get an overrun
+CANDLE_BUS_SPIN_SECONDS = 0.001  # Readers busy-poll this long before blocking on the wake-up socket
+CANDLE_BUS_SLEEP_SECONDS = 0.05  # Longest block on the wake-up socket before the header is checked again
+CANDLE_BUS_POLL_SECONDS = float(os.getenv('CANDLE_BUS_POLL_SECONDS', '5'))  # Exchange polling interval of the ingestor
+
+# Event log configuration
+EVENT_LOG_LEVEL = os.getenv('EVENT_LOG_LEVEL', 'INFO')  # Minimum level recorded in the ring buffer / file
+EVENT_CONSOLE_LEVEL = os.getenv('EVENT_CONSOLE_LEVEL', 'WARNING')  # Minimum level printed to the terminal
+EVENT_BUFFER_SIZE = 10000  # In-memory ring buffer size
+EVENT_LOG_PATH = os.getenv('EVENT_LOG_PATH', 'reports/events.jsonl')  # JSONL output, '{pid}' expands to process id
+
 # Technical indicator parameters
 RSI_PERIOD = 14
 RSI_OVERBOUGHT = 70  # More conservative
@@ -60,21 +117,67 @@ BB_STD_DEV = 2
 # ATR parameters
 ATR_PERIOD = 14
 ATR_MULTIPLIER = 2  # Used for calculating stop loss distance
+# Stop loss at ATR_MULTIPLIER * ATR from entry (STOP_LOSS_PCT only during ATR warm-up, so --stop-loss sweeps have no effect)
+USE_ATR_STOPS = os.getenv('USE_ATR_STOPS', 'false').lower() == 'true'
 
 # Volume Profile parameters
-VP_BINS = 20  # Number of volume distribution bins
+VP_BIN_WIDTH = 0.005  # Log-price width of a volume-profile bin (~0.5%); the grid is absolute, not per window
+VP_WINDOW = 50  # Rolling window (bars) of the volume profile
 
 # AI algorithm parameters
 # Random Forest parameters
 RF_N_ESTIMATORS = 100  # Number of decision trees
 RF_MAX_DEPTH = 10  # Maximum depth
 RF_MIN_SAMPLES_SPLIT = 5  # Minimum samples required to split
+RF_MIN_SAMPLES_LEAF = 2  # Minimum samples per leaf
+
+# Random Forest hyperparameter search (purged CV + successive halving)
+RF_SEARCH_GRID = {
+    'max_depth': [3, 5, 10, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 5],
+    'max_features': ['sqrt', 0.5]
+}
+RF_SEARCH_SPLITS = 5  # Purged k-fold splits
+RF_SEARCH_EMBARGO = 10  # Bars dropped after each test fold (>= feature lookback)
+RF_SEARCH_MIN_TREES = 20  # Trees in the first halving round
+RF_SEARCH_FACTOR = 3  # Keep 1/factor candidates per round, multiply trees by factor
+RF_SEARCH_CACHE_DIR = 'models/search_cache'  # Cached feature matrix and folds per dataset
+RF_SEARCH_WORKERS = None  # Worker processes (None = all cores)
+
+# Feature store
+AI_FEATURES = (  # Ordered model inputs, names in ai.feature_store.FEATURE_REGISTRY or indicator columns
+    'ret_mean', 'ret_std', 'volume_change_mean',
+    'rsi', 'macd', 'macd_hist',
+    'ma_dist', 'bb_z', 'volatility',
+    'atr_ratio', 'poc_dist'
+)
+FEATURE_CACHE_SIZE = 8  # Datasets whose computed features are kept in memory
+
+# Incremental retraining
+RETRAIN_WINDOW = 2000  # Max training samples kept (sliding window)
+RETRAIN_NEW_TREES = 20  # Trees grown per incremental retrain (oldest trees beyond RF_N_ESTIMATORS are dropped)
+RETRAIN_STATE_DIR = 'models'  # Persisted feature matrix and model
+
+# Signal parameters
+SIGNAL_MODE = os.getenv('SIGNAL_MODE', 'technical')  # 'technical', 'hybrid' (technical + AI) or 'ai'
+HYBRID_AI_WEIGHT = 0.5  # Share of the AI score in hybrid mode (rest: technical score)
+SIGNAL_LATENCY_BUDGET_MS = 50  # Per-bar budget for the AI part; exceeded -> technical signal only
+WALK_FORWARD_STEP = int(os.getenv('WALK_FORWARD_STEP', '30'))  # 回测中模型每隔多少根K线用之前的数据重新训练
+
+# Ensemble parameters
+ENSEMBLE_ENABLED = os.getenv('ENSEMBLE_ENABLED', 'false').lower() == 'true'  # 用集成模型代替单个随机森林提供 AI 概率
+ENSEMBLE_MODELS = ('random_forest', 'gradient_boosting', 'logistic')  # Names in ai.ensemble.MODEL_REGISTRY
+ENSEMBLE_WEIGHTS = {'random_forest': 0.4, 'gradient_boosting': 0.4, 'logistic': 0.2}
+ENSEMBLE_N_JOBS = None  # Total cores for concurrent training (None = all)
 
 # LSTM parameters
+USE_LSTM = os.getenv('USE_LSTM', 'false').lower() == 'true'  # backtest 也训练 LSTM（目前没有信号使用它）
 LSTM_SEQUENCE_LENGTH = 60  # Sequence length
 LSTM_BATCH_SIZE = 32  # Batch size
 LSTM_EPOCHS = 50  # Number of epochs
 LSTM_HIDDEN_UNITS = 64  # Number of hidden units
+LSTM_LEARNING_RATE = 0.003  # Adam learning rate
 
 # Reinforcement Learning parameters
 RL_STATE_SIZE = 10  # State space size
@@ -84,4 +187,13 @@ RL_BATCH_SIZE = 32  # 训练批次大小
 RL_GAMMA = 0.95  # 折扣因子
 RL_EPSILON = 1.0  # 探索率
 RL_EPSILON_MIN = 0.01  # 最小探索率
-RL_EPSILON_DECAY = 0.995  # 探索率衰减 
\ No newline at end of file
+RL_EPSILON_DECAY = 0.995  # 探索率衰减 
+RL_HIDDEN_UNITS = 64  # Q 网络隐藏层单元数
+RL_LEARNING_RATE = 0.001  # Adam learning rate
+RL_TARGET_UPDATE = 250  # Gradient steps between target network syncs
+RL_N_ENVS = 64  # Environments stepped together
+RL_EPISODE_LENGTH = 100  # Bars per training episode
+RL_TRAIN_STEPS = 2000  # Vectorized environment steps per training run
+
+# Compiled kernels
+USE_JIT = os.getenv('USE_JIT', 'true').lower() == 'true'  # Numba kernels when numba is installed (else NumPy fallback)
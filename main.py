@@ -1,12 +1,85 @@
-import pandas as pd
-from api.okx_api import OKXAPI
-from backtest.backtest import BacktestEngine
-from config.config import BACKTEST_START_DATE, BACKTEST_END_DATE, TIMEFRAME
-from utils.report_generator import ReportGenerator
+import argparse
 import time
-# from scripts.test_data import generate_test_data  # 注释掉
 
-def main():
+# 重量级依赖（pandas、sklearn、matplotlib、ccxt）均在子命令内部按需导入，
+# 保证 `python main.py --help`、`report` 等命令快速启动
+
+DEFAULT_DATA = 'data/btc_okx_2023_1d.csv'
+
+
+def load_candles(path=DEFAULT_DATA):
+    """读取K线CSV（timestamp 为索引）"""
+    import pandas as pd
+    return pd.read_csv(path, index_col='timestamp', parse_dates=True)
+
+
+def load_candle_file(path):
+    """读取K线 CSV 或 Parquet（timestamp 为索引）"""
+    if not path.endswith('.parquet'):
+        return load_candles(path)
+    import pandas as pd
+    df = pd.read_parquet(path)
+    return df.set_index('timestamp') if 'timestamp' in df.columns else df
+
+
+def live_strategy(state_dir):
+    """实盘 / 回放用的策略；hybrid / ai 模式载入 `train --incremental` 保存的随机森林，没有时返回 None"""
+    from config.config import RETRAIN_STATE_DIR
+    from strategy.strategy import TradingStrategy
+    state_dir = state_dir or RETRAIN_STATE_DIR
+    strategy = TradingStrategy()
+    if strategy.signal_mode != 'technical':
+        if not strategy.ai_models.load_state(state_dir):
+            print(f"{state_dir} 中没有已训练的模型，请先运行 train --incremental")
+            return None
+        strategy.use_ensemble = False
+    return strategy
+
+
+def train_lstm(backtest, df):
+    """训练 LSTM 序列模型，返回报告用的训练信息"""
+    print("\nTraining LSTM model...")
+    model2_start = time.time()
+    backtest.strategy.train_lstm_model(df)
+    model2_time = time.time() - model2_start
+    
+    lstm_info = backtest.strategy.lstm_model.train_info
+    return {
+        'model2_accuracy': lstm_info.get('accuracy', 0),
+        'model2_time': round(model2_time, 2),
+        'model2_samples': lstm_info.get('samples', 0),
+        'model2_buy': lstm_info.get('buy', 0),
+        'model2_sell': lstm_info.get('sell', 0)
+    }
+
+
+def models_info(cache_meta):
+    """报告用的模型信息：模型1取回测中走步训练的样本外结果（technical 模式没有）"""
+    info = {k: v for k, v in cache_meta.items() if k != 'walk_forward'}
+    walk_forward = cache_meta.get('walk_forward')
+    if walk_forward:
+        accuracy = walk_forward.get('accuracy')
+        info['model1_accuracy'] = 'N/A' if accuracy is None else accuracy
+        info['model1_time'] = walk_forward.get('time', 0)
+        info['model1_samples'] = walk_forward.get('samples', 0)
+        info['model1_buy'] = walk_forward.get('buy', 0)
+        info['model1_sell'] = walk_forward.get('sell', 0)
+    return info
+
+
+def cmd_backtest(args):
+    """训练模型、运行回测、导出图表并更新报告"""
+    import os
+    from backtest.backtest import BacktestEngine
+    from config.config import EVENT_LOG_PATH, USE_LSTM
+    from utils.report_generator import ReportGenerator
+    from utils.event_log import get_event_log
+    
+    # 事件日志：后台线程批量写入 JSONL
+    events = get_event_log()
+    if EVENT_LOG_PATH:
+        events.open(EVENT_LOG_PATH)
+    
     # 初始化报告生成器
     report_gen = ReportGenerator()
     
@@ -15,46 +88,38 @@ def main():
     
     # 读取真实BTC日线数据
     print("读取OKX BTC/USDT 2023年日线数据...")
-    df = pd.read_csv('data/btc_okx_2023_1d.csv', index_col='timestamp', parse_dates=True)
+    df = load_candles(args.data)
     
     # Run backtest
     print("Running backtest...")
     backtest = BacktestEngine()
     
-    # Train AI models and collect training info
-    print("\nTraining AI models...")
-    ai_models_info = {}
-    
-    # 训练第一个模型
-    model1_start = time.time()
-    backtest.strategy.train_ai_models(df)
-    model1_time = time.time() - model1_start
-    
-    # 收集模型1信息（从输出中解析）
-    ai_models_info['model1_accuracy'] = 64.93  # 从输出中获取
-    ai_models_info['model1_time'] = round(model1_time, 2)
-    ai_models_info['model1_samples'] = 532
-    ai_models_info['model1_buy'] = 376
-    ai_models_info['model1_sell'] = 290
-    
-    # 训练第二个模型（如果有的话）
-    model2_start = time.time()
-    # 这里可以添加第二个模型的训练
-    model2_time = time.time() - model2_start
-    
-    ai_models_info['model2_accuracy'] = 70.37
-    ai_models_info['model2_time'] = round(model2_time, 2)
-    ai_models_info['model2_samples'] = 213
-    ai_models_info['model2_buy'] = 150
-    ai_models_info['model2_sell'] = 117
-    
-    # Run backtest
-    metrics = backtest.run_backtest(df)
+    # 相同数据、参数和代码版本的结果直接从缓存读取（跳过训练和回测）
+    cached = None if (args.checkpoint or args.no_cache) else backtest.load_cached(df)
+    if cached is not None:
+        metrics, cache_meta = cached
+        print("命中回测结果缓存，跳过模型训练和回测")
+    else:
+        resume = args.checkpoint if args.resume else None
+        cache_meta = None
+        # 随机森林在 run_backtest 中走步训练（technical 模式不训练）；
+        # LSTM 不参与信号，只在 --lstm / USE_LSTM 时训练；快照里已有训练信息
+        if (args.lstm or USE_LSTM) and not (resume and os.path.exists(resume)):
+            cache_meta = train_lstm(backtest, df)
+        
+        # Run backtest（--checkpoint 定期保存快照，--resume 从快照继续）
+        metrics = backtest.run_backtest(df, checkpoint_path=args.checkpoint, resume_from=resume,
+                                        use_cache=not args.no_cache, cache_meta=cache_meta)
+        cache_meta = backtest.cache_meta
+    ai_models_info = models_info(cache_meta)
     
     # Plot backtest results
     print("\nPlotting backtest results...")
     backtest.plot_results(metrics)
     
+    # 交易记录和逐K线曲线导出为 Parquet
+    export_paths = backtest.export_results()
+    
     # 计算总运行时间
     total_time = time.time() - start_time
     
@@ -63,7 +128,12 @@ def main():
     print(f"Total Return: {metrics['total_return']:.2f}%")
     print(f"Maximum Drawdown: {metrics['max_drawdown']:.2f}%")
     print(f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}")
+    print(f"Sortino Ratio: {metrics['sortino_ratio']:.2f}")
+    print(f"Calmar Ratio: {metrics['calmar_ratio']:.2f}")
     print(f"Win Rate: {metrics['win_rate']:.2f}%")
+    profit_factor = metrics['profit_factor']
+    print(f"Profit Factor: {'∞' if profit_factor is None else f'{profit_factor:.2f}'}")
+    print(f"Exposure: {metrics['exposure']:.2f}%")
     print(f"Total Trades: {metrics['total_trades']}")
     print(f"Total Runtime: {total_time:.2f} seconds")
     
@@ -76,6 +146,506 @@ def main():
     print("   - reports/executive_summary.md (执行摘要)")
     print("   - reports/trend_analysis.md (趋势分析)")
     print("   - reports/run_history.json (运行历史)")
+    for path in export_paths:
+        print(f"   - {path}")
+    
+    # 交易事件摘要（详细记录见事件日志）
+    trade_events = events.recent(event='trade')
+    print(f"\n记录交易事件 {len(trade_events)} 条" + (f"，详见 {events.path}" if events.path else ""))
+    
+    # 等待后台图表导出完成
+    chart_paths = backtest.wait_for_plots()
+    if chart_paths:
+        print("📈 图表文件:")
+        for path in chart_paths:
+            print(f"   - {path}")
+    events.close()
+
+
+def cmd_fetch(args):
+    """从OKX下载K线数据"""
+    from scripts.fetch_okx_btc_daily import fetch_ohlcv
+    df = fetch_ohlcv(symbol=args.symbol, timeframe=args.timeframe, since=args.since, output=args.output)
+    print(f"已保存 {len(df)} 根K线到 {args.output}")
+
+
+def cmd_train(args):
+    """只训练AI模型"""
+    from strategy.strategy import TradingStrategy
+    df = load_candles(args.data)
+    start = time.time()
+    strategy = TradingStrategy()
+    if args.tune:
+        # 先搜索超参数，随后的训练使用最优参数
+        strategy.tune_ai_models(df, workers=args.workers)
+    if args.incremental:
+        # 载入上次的特征矩阵和模型，只处理新增K线
+        from config.config import RETRAIN_STATE_DIR
+        state_dir = args.state_dir or RETRAIN_STATE_DIR
+        if strategy.ai_models.load_state(state_dir):
+            print(f"Loaded model state from {state_dir} (last sample {strategy.ai_models.last_sample_time})")
+        strategy.retrain_ai_models(df)
+        strategy.ai_models.save_state(state_dir)
+    else:
+        strategy.train_ai_models(df)
+    if args.lstm:
+        strategy.train_lstm_model(df)
+    if args.ensemble:
+        strategy.train_ensemble(df)
+    if args.rl:
+        train_rl_agent(strategy, df, args.rl_steps, args.checkpoint, args.resume)
+    print(f"Training time: {time.time() - start:.2f} seconds")
+
+
+def train_rl_agent(strategy, df, steps, checkpoint=None, resume=False):
+    """在向量化交易环境中训练 DQN 智能体，并在完整数据上用贪心策略评估"""
+    from ai.dqn_agent import DQNAgent
+    from ai.trading_env import TradingEnv
+    from config.config import ATR_MULTIPLIER, USE_ATR_STOPS
+    close = df['close'].values
+    stop_distance = None
+    if USE_ATR_STOPS:
+        stop_distance = ATR_MULTIPLIER * strategy.calculate_indicators(df)['atr'].values
+    
+    agent = DQNAgent()
+    info = agent.train(TradingEnv(close, stop_distance=stop_distance), steps=steps,
+                       checkpoint_path=checkpoint, resume_from=checkpoint if resume else None)
+    print(f"DQN transitions: {info['transitions']}, episodes: {info['episodes']}, "
+          f"time: {info['time']:.2f} seconds ({info['transitions'] / max(info['time'], 1e-9):,.0f} steps/s)")
+    print(f"DQN mean episode return (last batch): {info['mean_episode_return']:.2f}%")
+    
+    equity = agent.evaluate(TradingEnv(close, n_envs=1, episode_length=None,
+                                       stop_distance=stop_distance, random_start=False))
+    print(f"DQN greedy policy return on full data: {(equity[-1] - 1) * 100:.2f}%")
+    return agent
+
+
+def cmd_sweep(args):
+    """止损/止盈参数网格回测（可按数据文件和 walk-forward 分段，经任务队列分发给多个工作进程）"""
+    from backtest.sweep_queue import sweep_jobs, run_job, run_sweep, print_progress
+    stop_losses = [float(v) for v in args.stop_loss.split(',')]
+    take_profits = [float(v) for v in args.take_profit.split(',')]
+    specs = sweep_jobs(args.data.split(','), stop_losses, take_profits, args.folds, load=load_candles)
+    warn_atr_stops()
+    
+    start = time.time()
+    if args.queue or args.workers:
+        # 任务写入 SQLite 队列；其他机器可用 `main.py sweep-worker --queue <同一路径>` 加入
+        from config.config import SWEEP_QUEUE_PATH
+        results, failures = run_sweep(specs, path=args.queue or SWEEP_QUEUE_PATH,
+                                      workers=args.workers or 0, progress=print_progress)
+        print()
+        for spec, error in failures:
+            print(f"失败: {spec['data']} 分段 {spec['fold']} 止损 {spec['stop_loss']} 止盈 {spec['take_profit']}: {error}")
+    else:
+        results = [(spec, run_job(spec, load_candles)) for spec in specs]
+    print(f"\n{len(results)}/{len(specs)} 个回测完成，用时 {time.time() - start:.2f} 秒")
+    
+    print("\n| 数据 | 分段 | 止损 | 止盈 | 总收益率 | 最大回撤 | 夏普比率 | 交易次数 |")
+    print("|------|------|------|------|----------|----------|----------|----------|")
+    for spec, m in sorted(results, key=lambda r: r[1]['sharpe_ratio'], reverse=True):
+        print(f"| {spec['data']} | {spec['fold']} | {spec['stop_loss']:.2%} | {spec['take_profit']:.2%} | "
+              f"{m['total_return']:.2f}% | {m['max_drawdown']:.2f}% | {m['sharpe_ratio']:.2f} | {m['total_trades']} |")
+
+
+def cmd_variants(args):
+    """阈值/RSI 水平/止损止盈变体一次性批量回测（指标只计算一次）"""
+    from backtest.variants import run_variants, expand_variants
+    parse = lambda text: [float(v) for v in text.split(',')]
+    variants = expand_variants(
+        threshold=parse(args.threshold),
+        rsi_overbought=parse(args.rsi_overbought),
+        rsi_oversold=parse(args.rsi_oversold),
+        stop_loss_pct=parse(args.stop_loss),
+        take_profit_pct=parse(args.take_profit)
+    )
+    df = load_candles(args.data)
+    warn_atr_stops()
+    start = time.time()
+    results = run_variants(df, variants)
+    print(f"\n{len(variants)} 个变体，用时 {time.time() - start:.2f} 秒")
+    
+    print("\n| 阈值 | RSI 超买/超卖 | 止损 | 止盈 | 总收益率 | 最大回撤 | 夏普比率 | 交易次数 |")
+    print("|------|---------------|------|------|----------|----------|----------|----------|")
+    ranked = sorted(zip(variants, results), key=lambda r: r[1]['sharpe_ratio'], reverse=True)
+    for v, m in ranked[:args.top]:
+        print(f"| {v['threshold']:.2f} | {v['rsi_overbought']:.0f}/{v['rsi_oversold']:.0f} | "
+              f"{v['stop_loss_pct']:.2%} | {v['take_profit_pct']:.2%} | {m['total_return']:.2f}% | "
+              f"{m['max_drawdown']:.2f}% | {m['sharpe_ratio']:.2f} | {m['total_trades']} |")
+
+
+def warn_atr_stops():
+    """ATR 止损开启时止损百分比只在 ATR 预热期生效"""
+    from config.config import USE_ATR_STOPS
+    if USE_ATR_STOPS:
+        print("注意：USE_ATR_STOPS 已开启，止损距离为 ATR_MULTIPLIER * ATR，--stop-loss 只在 ATR 预热期生效")
+
+
+def cmd_stream(args):
+    """分块流式回测：按块读取K线文件，指标/持仓状态跨块传递，内存只与块大小有关"""
+    from backtest.chunked import run_chunked_backtest
+    from config.config import STREAM_CHUNK_BARS, STREAM_OUTPUT_DIR
+    from strategy.strategy import TradingStrategy
+    output = args.output or STREAM_OUTPUT_DIR
+    strategy = TradingStrategy()
+    if strategy.signal_mode != 'technical':
+        # hybrid / ai 的回测结果来自走步训练（backtest 命令），固定模型的分块回测是样本内结果
+        print(f"stream 只支持 SIGNAL_MODE=technical（当前 {strategy.signal_mode}），hybrid / ai 请使用 backtest 命令")
+        return
+    start = time.time()
+    m = run_chunked_backtest(args.data, args.chunk_bars or STREAM_CHUNK_BARS, output, strategy=strategy)
+    print(f"\n流式回测用时 {time.time() - start:.2f} 秒，结果写入 {output}")
+    print(f"Total Return: {m['total_return']:.2f}%")
+    print(f"Maximum Drawdown: {m['max_drawdown']:.2f}%")
+    print(f"Sharpe Ratio: {m['sharpe_ratio']:.2f}")
+    print(f"Win Rate: {m['win_rate']:.2f}%")
+    print(f"Total Trades: {m['total_trades']}")
+
+
+def cmd_record(args):
+    """纸面实盘会话：逐根K线运行实盘循环，并把行情/指标/信号/订单写入会话日志"""
+    import os
+    from config.config import SESSION_LOG_DIR
+    from strategy.live import run_paper_session
+    output = args.output or os.path.join(SESSION_LOG_DIR, 'paper.rec')
+    df = load_candle_file(args.data)
+    strategy = live_strategy(args.state_dir)
+    if strategy is None:
+        return
+    start = time.time()
+    session = run_paper_session(df, output, bars=args.bars, strategy=strategy)
+    steps = min(args.bars or len(df), len(df) - 1)
+    print(f"记录 {steps} 根K线、{len(session.orders)} 笔订单，"
+          f"用时 {time.time() - start:.2f} 秒，写入 {output}")
+
+
+def cmd_replay(args):
+    """回放会话日志，逐根核对信号、指标和订单"""
+    from strategy.live import replay
+    strategy = live_strategy(args.state_dir)
+    if strategy is None:
+        return
+    r = replay(args.path, strategy=strategy, speed=args.speed)
+    session = r['session']
+    if session.get('signal_mode') not in (None, strategy.signal_mode):
+        print(f"注意：会话以 signal_mode={session['signal_mode']} 记录，当前为 {strategy.signal_mode}")
+    print(f"回放 {r['steps']} 步，用时 {r['elapsed']:.2f} 秒"
+          f"（记录时长 {r['recorded_seconds'] / 3600:.1f} 小时，{r['speedup']:.0f}x）")
+    print(f"信号不一致: {r['signal_mismatches']}  指标不一致: {r['indicator_mismatches']}  "
+          f"订单不一致: {r['order_mismatches']}")
+    for example in r['examples']:
+        print(f"  {example['bar']}: {example['problems']}")
+
+
+def cmd_ingest(args):
+    """行情采集进程：轮询交易所一次，把收盘K线发布到共享内存环形缓冲区"""
+    from backtest.metrics import timeframe_to_minutes
+    from config.config import LIVE_WINDOW_BARS, CANDLE_BUS_POLL_SECONDS
+    from strategy.live import run_ingestor
+    from utils.candle_bus import BusInUse, CandleBus, bus_name
+    bar_ms = int(timeframe_to_minutes(args.timeframe) * 60000)
+    name = bus_name(args.symbol, args.timeframe)
+    interval = args.interval if args.interval is not None else (0.1 if args.data else CANDLE_BUS_POLL_SECONDS)
+    try:
+        bus = CandleBus.create(name, bar_ms=bar_ms)
+    except BusInUse as e:
+        print(f"{e}：该品种/周期已有采集进程在运行")
+        return
+    with bus:
+        print(f"发布到共享内存 {name}（{bus.slots} 根K线的环形缓冲区），Ctrl+C 退出")
+        try:
+            if args.data:
+                # 用历史文件模拟行情：先发布一个窗口的历史，再每 interval 秒发布一根
+                import numpy as np
+                df = load_candle_file(args.data)
+                times = df.index.values.astype('datetime64[ms]').astype(np.float64)
+                rows = np.column_stack([times, df[['open', 'high', 'low', 'close', 'volume']].values])
+                bus.publish(rows[:LIVE_WINDOW_BARS])
+                for row in rows[LIVE_WINDOW_BARS:]:
+                    time.sleep(interval)
+                    bus.publish(row)
+                print(f"已发布 {bus.seq} 根K线")
+                time.sleep(args.linger)
+            else:
+                from api.okx_api import OKXAPI
+                api = OKXAPI()
+                run_ingestor(bus, lambda: api.exchange.fetch_ohlcv(args.symbol, args.timeframe, limit=LIVE_WINDOW_BARS),
+                             bar_ms, poll_seconds=interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def cmd_paper(args):
+    """纸面实盘：订阅共享内存K线总线，每根新K线运行一次实盘循环"""
+    from strategy.live import LiveSession
+    from utils.candle_bus import CandleBus, bus_name
+    from utils.recorder import SessionRecorder
+    strategy = live_strategy(args.state_dir)
+    if strategy is None:
+        return
+    name = bus_name(args.symbol, args.timeframe)
+    try:
+        bus = CandleBus.attach(name)
+    except FileNotFoundError:
+        print(f"共享内存 {name} 不存在，请先运行 ingest --symbol {args.symbol} --timeframe {args.timeframe}")
+        return
+    recorder = SessionRecorder(args.record) if args.record else None
+    session = LiveSession(strategy, recorder=recorder, symbol=args.symbol, timeframe=args.timeframe)
+    if recorder is not None:
+        recorder.session(symbol=args.symbol, timeframe=args.timeframe, mode='paper', signal_mode=strategy.signal_mode)
+    print(f"订阅 {name}，当前序号 {bus.seq}")
+    steps = 0
+    try:
+        steps = session.consume(bus, timeout=args.timeout)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+        if recorder is not None:
+            recorder.close()
+    print(f"处理 {steps} 根K线，{len(session.orders)} 笔订单，当前持仓 {strategy.position}")
+
+
+def cmd_sweep_worker(args):
+    """从共享的 SQLite 队列领取并执行回测任务"""
+    from backtest.sweep_queue import run_worker
+    from config.config import SWEEP_QUEUE_PATH
+    n = run_worker(args.queue or SWEEP_QUEUE_PATH, worker=args.name, load=load_candles, max_jobs=args.max_jobs)
+    print(f"完成 {n} 个任务")
+
+
+def cmd_robustness(args):
+    """蒙特卡洛 / Bootstrap 稳健性分析"""
+    from backtest.backtest import BacktestEngine
+    from backtest.metrics import periods_per_year, infer_bar_minutes
+    from backtest.robustness import run_monte_carlo, trade_reshuffle
+    from config.config import BACKTEST_START_DATE, BACKTEST_END_DATE, TIMEFRAME
+    df = load_candles(args.data)
+    df = df[(df.index >= BACKTEST_START_DATE) & (df.index <= BACKTEST_END_DATE)]
+    # 按数据实际的K线周期年化（与 run_backtest 相同）
+    bar_minutes = infer_bar_minutes(df.index)
+    interval = TIMEFRAME if bar_minutes is None else f'{bar_minutes:g}min'
+    bars_per_year = periods_per_year(TIMEFRAME) if bar_minutes is None else periods_per_year(minutes=bar_minutes)
+    
+    start = time.time()
+    _, summary = run_monte_carlo(df['close'].values, n_paths=args.paths, method=args.method, interval=interval,
+                                 bars_per_year=bars_per_year, seed=args.seed, workers=args.workers)
+    print(f"\n{args.method} 路径 {args.paths} 条，用时 {time.time() - start:.2f} 秒")
+    print("| 指标 | P5 | P25 | P50 | P75 | P95 |")
+    print("|------|----|-----|-----|-----|-----|")
+    for name in ('total_return', 'max_drawdown', 'sharpe_ratio', 'win_rate'):
+        q = summary[name]
+        print(f"| {name} | {q['p5']:.2f} | {q['p25']:.2f} | {q['p50']:.2f} | {q['p75']:.2f} | {q['p95']:.2f} |")
+    print(f"亏损概率: {summary['prob_loss']:.1%}")
+    
+    # 交易顺序重排：同一组交易的回撤分布
+    backtest = BacktestEngine()
+    backtest.run_backtest(df)
+    _, reshuffled = trade_reshuffle(backtest.trades.closed_pnls(), n_paths=args.paths, seed=args.seed)
+    dd = reshuffled['max_drawdown']
+    print(f"交易重排最大回撤: P5 {dd['p5']:.2f}% / P50 {dd['p50']:.2f}% / P95 {dd['p95']:.2f}%")
+
+
+def cmd_metrics(args):
+    """打印运行中进程的指标快照，或用 --probe 在本进程测量实时信号路径"""
+    import json
+    from urllib.request import urlopen
+    from utils.runtime_metrics import get_registry, format_snapshot
+    if args.probe:
+        # 对最近 N 根K线逐根调用 get_signal（与实盘相同的单行路径）
+        from strategy.strategy import TradingStrategy
+        df = load_candles(args.data)
+        strategy = TradingStrategy()
+        if strategy.signal_mode != 'technical':
+            strategy.train_ai_models(df)
+        for end in range(max(len(df) - args.probe, 2), len(df) + 1):
+            strategy.get_signal(df.iloc[:end])
+        registry = get_registry()
+        print(registry.render_prometheus() if args.prometheus else format_snapshot(registry.snapshot()))
+        return
+    if args.url is None:
+        from config.config import METRICS_HOST, METRICS_PORT
+        args.url = f'http://{METRICS_HOST}:{METRICS_PORT}'
+    url = args.url.rstrip('/') + ('/metrics' if args.prometheus else '/metrics.json')
+    with urlopen(url, timeout=5) as response:
+        body = response.read().decode()
+    print(body if args.prometheus else format_snapshot(json.loads(body)))
+
+
+def cmd_cache(args):
+    """回测结果缓存：查看占用或清空"""
+    from utils.result_cache import ResultCache
+    cache = ResultCache()
+    if args.clear:
+        cache.clear()
+        print(f"已清空 {cache.directory}")
+        return
+    entries = cache.entries()
+    print(f"{cache.directory}: {len(entries)} 条结果，{sum(e[1] for e in entries) / 1024 / 1024:.2f} MB "
+          f"(上限 {cache.max_bytes / 1024 / 1024:.0f} MB)")
+
+
+def cmd_markets(args):
+    """交易所市场元数据本地缓存：查看或强制刷新"""
+    import ccxt
+    from api.market_cache import market_cache_path, preload_markets, read_markets
+    exchange = getattr(ccxt, args.exchange)()
+    path = market_cache_path(exchange.id)
+    if args.refresh:
+        print(f"刷新结果: {preload_markets(exchange, refresh=True)}")
+    entry = read_markets(path)
+    if entry is None:
+        print(f"{path}: 无缓存")
+        return
+    print(f"{path}: {len(entry['markets'])} 个交易对，"
+          f"{(time.time() - entry['saved_at']) / 3600:.1f} 小时前更新")
+
+
+def cmd_report(args):
+    """根据运行历史重新生成报告"""
+    from utils.report_generator import ReportGenerator
+    report_gen = ReportGenerator(report_dir=args.report_dir)
+    if not report_gen.report_data.get('runs'):
+        print(f"{args.report_dir} 中没有运行历史")
+        return
+    report_gen.generate_reports()
+    latest = report_gen.report_data['runs'][-1]
+    print(f"最近一次运行: {latest['timestamp']}")
+    for key, value in latest['metrics'].items():
+        print(f"  {key}: {value}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='BTC AI Trading Bot')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    p = subparsers.add_parser('backtest', help='训练模型并运行回测（默认命令）')
+    p.add_argument('--data', default=DEFAULT_DATA, help='K线CSV路径')
+    p.add_argument('--checkpoint', default=None, help='回测快照路径（.npz），定期保存进度')
+    p.add_argument('--resume', action='store_true', help='从 --checkpoint 快照继续（文件不存在时从头开始）')
+    p.add_argument('--no-cache', action='store_true', help='不读取也不写入回测结果缓存')
+    p.add_argument('--lstm', action='store_true', help='同时训练 LSTM 序列模型（报告中的模型2）')
+    p.set_defaults(func=cmd_backtest)
+    
+    p = subparsers.add_parser('fetch', help='从OKX下载K线数据')
+    p.add_argument('--symbol', default='BTC/USDT')
+    p.add_argument('--timeframe', default='1d')
+    p.add_argument('--since', default='2023-01-01T00:00:00Z')
+    p.add_argument('--output', default=DEFAULT_DATA)
+    p.set_defaults(func=cmd_fetch)
+    
+    p = subparsers.add_parser('train', help='只训练AI模型')
+    p.add_argument('--data', default=DEFAULT_DATA)
+    p.add_argument('--lstm', action='store_true', help='同时训练 LSTM 序列模型')
+    p.add_argument('--tune', action='store_true', help='先做随机森林超参数搜索（清洗/禁区交叉验证 + 逐次减半）')
+    p.add_argument('--workers', type=int, default=None, help='超参数搜索的进程数')
+    p.add_argument('--incremental', action='store_true', help='增量训练：载入持久化状态，只用新增K线更新随机森林')
+    p.add_argument('--state-dir', default=None, help='增量训练状态目录（默认 RETRAIN_STATE_DIR）')
+    p.add_argument('--ensemble', action='store_true', help='同时并行训练集成模型（RF / GBDT / Logistic）')
+    p.add_argument('--rl', action='store_true', help='同时训练 DQN 强化学习智能体')
+    p.add_argument('--rl-steps', type=int, default=None, help='向量化环境步数（默认 RL_TRAIN_STEPS）')
+    p.add_argument('--checkpoint', default=None, help='DQN 训练快照路径（.npz）')
+    p.add_argument('--resume', action='store_true', help='从 --checkpoint 快照继续 DQN 训练')
+    p.set_defaults(func=cmd_train)
+    
+    p = subparsers.add_parser('sweep', help='止损/止盈参数网格回测')
+    p.add_argument('--data', default=DEFAULT_DATA, help='K线CSV路径，逗号分隔可同时回测多个品种')
+    p.add_argument('--stop-loss', default='0.03,0.05', help='逗号分隔的止损百分比')
+    p.add_argument('--take-profit', default='0.08,0.10', help='逗号分隔的止盈百分比')
+    p.add_argument('--folds', type=int, default=1, help='walk-forward 分段数')
+    p.add_argument('--workers', type=int, default=0, help='本机启动的队列工作进程数（0 = 不用队列，除非指定 --queue）')
+    p.add_argument('--queue', default=None, help='SQLite 任务队列路径（默认 SWEEP_QUEUE_PATH）')
+    p.set_defaults(func=cmd_sweep)
+    
+    p = subparsers.add_parser('variants', help='策略变体批量回测（共享指标，一次遍历）')
+    p.add_argument('--data', default=DEFAULT_DATA)
+    p.add_argument('--threshold', default='0.5,0.7,0.9', help='逗号分隔的信号阈值')
+    p.add_argument('--rsi-overbought', default='70', help='逗号分隔的 RSI 超买水平')
+    p.add_argument('--rsi-oversold', default='30', help='逗号分隔的 RSI 超卖水平')
+    p.add_argument('--stop-loss', default='0.03,0.05')
+    p.add_argument('--take-profit', default='0.08,0.10')
+    p.add_argument('--top', type=int, default=20, help='只显示夏普比率最高的前 N 个')
+    p.set_defaults(func=cmd_variants)
+    
+    p = subparsers.add_parser('stream', help='分块流式回测（超出内存的K线文件，CSV / Parquet；仅 technical 模式）')
+    p.add_argument('--data', default=DEFAULT_DATA, help='K线 CSV 或 Parquet 路径')
+    p.add_argument('--chunk-bars', type=int, default=None, help='每块读取的K线数（默认 STREAM_CHUNK_BARS）')
+    p.add_argument('--output', default=None, help='equity.parquet / trades.parquet 输出目录（默认 STREAM_OUTPUT_DIR）')
+    p.set_defaults(func=cmd_stream)
+    
+    p = subparsers.add_parser('record', help='纸面实盘会话，写入可回放的会话日志')
+    p.add_argument('--data', default=DEFAULT_DATA, help='K线 CSV 或 Parquet 路径（逐根作为实时行情）')
+    p.add_argument('--bars', type=int, default=None, help='只运行最后 N 根K线')
+    p.add_argument('--output', default=None, help='会话日志路径（默认 SESSION_LOG_DIR/paper.rec）')
+    p.add_argument('--state-dir', default=None, help='hybrid / ai 模式使用的已训练模型目录（默认 RETRAIN_STATE_DIR）')
+    p.set_defaults(func=cmd_record)
+
+    p = subparsers.add_parser('replay', help='回放会话日志并核对信号/指标/订单')
+    p.add_argument('path', help='会话日志路径')
+    p.add_argument('--speed', type=float, default=None, help='按记录节奏的 N 倍回放（默认尽可能快）')
+    p.add_argument('--state-dir', default=None, help='hybrid / ai 模式使用的已训练模型目录（默认 RETRAIN_STATE_DIR）')
+    p.set_defaults(func=cmd_replay)
+
+    p = subparsers.add_parser('ingest', help='行情采集：收盘K线发布到共享内存总线（供多个 paper 进程订阅）')
+    p.add_argument('--symbol', default='BTC/USDT')
+    p.add_argument('--timeframe', default='1h')
+    p.add_argument('--interval', type=float, default=None, help='轮询交易所的间隔秒数（默认 CANDLE_BUS_POLL_SECONDS）；--data 时为发布间隔（默认 0.1）')
+    p.add_argument('--data', default=None, help='用K线文件模拟行情，而不是连接交易所')
+    p.add_argument('--linger', type=float, default=5.0, help='--data 发布完后保留总线的秒数')
+    p.set_defaults(func=cmd_ingest)
+
+    p = subparsers.add_parser('paper', help='订阅共享内存K线总线运行纸面实盘')
+    p.add_argument('--symbol', default='BTC/USDT')
+    p.add_argument('--timeframe', default='1h')
+    p.add_argument('--record', default=None, help='同时写入会话日志（可用 replay 回放）')
+    p.add_argument('--timeout', type=float, default=None, help='超过该秒数没有新K线则退出')
+    p.add_argument('--state-dir', default=None, help='hybrid / ai 模式使用的已训练模型目录（默认 RETRAIN_STATE_DIR）')
+    p.set_defaults(func=cmd_paper)
+
+    p = subparsers.add_parser('sweep-worker', help='加入参数网格回测任务队列')
+    p.add_argument('--queue', default=None, help='SQLite 任务队列路径（与协调进程相同，默认 SWEEP_QUEUE_PATH）')
+    p.add_argument('--name', default=None, help='工作进程名称（默认 主机名:PID）')
+    p.add_argument('--max-jobs', type=int, default=None)
+    p.set_defaults(func=cmd_sweep_worker)
+    
+    p = subparsers.add_parser('robustness', help='蒙特卡洛 / Bootstrap 稳健性分析')
+    p.add_argument('--data', default=DEFAULT_DATA)
+    p.add_argument('--paths', type=int, default=1000)
+    p.add_argument('--method', choices=['bootstrap', 'synthetic'], default='bootstrap')
+    p.add_argument('--seed', type=int, default=None)
+    p.add_argument('--workers', type=int, default=None)
+    p.set_defaults(func=cmd_robustness)
+    
+    p = subparsers.add_parser('metrics', help='运行时指标快照（计数器 / 延迟直方图）')
+    p.add_argument('--url', default=None, help='指标服务地址（默认 http://METRICS_HOST:METRICS_PORT）')
+    p.add_argument('--prometheus', action='store_true', help='输出 Prometheus 文本格式')
+    p.add_argument('--probe', type=int, default=0, help='在本进程对最近 N 根K线运行 get_signal 并输出延迟')
+    p.add_argument('--data', default=DEFAULT_DATA)
+    p.set_defaults(func=cmd_metrics)
+    
+    p = subparsers.add_parser('cache', help='回测结果缓存占用 / 清空')
+    p.add_argument('--clear', action='store_true', help='删除全部缓存结果')
+    p.set_defaults(func=cmd_cache)
+
+    p = subparsers.add_parser('markets', help='交易所市场元数据缓存（查看 / 刷新）')
+    p.add_argument('--exchange', default='okx', help='ccxt 交易所 id')
+    p.add_argument('--refresh', action='store_true', help='立即从交易所重新下载')
+    p.set_defaults(func=cmd_markets)
+    
+    p = subparsers.add_parser('report', help='根据运行历史重新生成报告')
+    p.add_argument('--report-dir', default='reports')
+    p.set_defaults(func=cmd_report)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # 兼容 `python main.py`：默认运行回测
+        args = parser.parse_args(['backtest'] + (argv or []))
+    args.func(args)
+
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
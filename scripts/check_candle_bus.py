@@ -0,0 +1,126 @@
+"""Check the shared-memory candle bus with several reader processes
+
+One writer publishes synthetic candles at a fixed interval; every reader
+process attaches to the bus, waits for each new candle and checks that it
+sees the whole stream in order. The volume column carries the publish time
+(time.perf_counter, CLOCK_MONOTONIC on Linux), so each reader measures the
+fan-out latency. Also checks that a reader that falls behind gets
+BusOverrun and that a second writer gets BusInUse while the first one
+runs, but replaces the block of a writer that died. Exits non-zero on a
+failure.
+"""
+import argparse
+import multiprocessing as mp
+import sys
+import time
+import numpy as np
+from utils.candle_bus import _PID, BusInUse, BusOverrun, CandleBus
+
+BAR_MS = 60000
+
+
+def reader(name, candles, start, results):
+    bus = CandleBus.attach(name)
+    seq, seen, latencies, errors = 0, 0, [], 0
+    while seen < candles:
+        new = bus.wait(seq, timeout=10)
+        received = time.perf_counter()
+        if new == seq:
+            break
+        rows = bus.window(new - seq, new)
+        latencies.append(received - rows[-1, 5])
+        # K线时间必须连续（没有丢失或乱序）
+        expected = start + (np.arange(seq, new) * BAR_MS)
+        errors += int((rows[:, 0] != expected).sum())
+        if not bus.valid(seq):
+            errors += 1
+        del rows
+        seen += new - seq
+        seq = new
+    bus.close()
+    results.put((seen, errors, latencies))
+
+
+def check_overrun(name):
+    with CandleBus.create(name + '_overrun', slots=8) as bus:
+        bus.publish([[i * BAR_MS, 1, 1, 1, 1, 1] for i in range(20)])
+        try:
+            bus.read(4)
+        except BusOverrun:
+            return True
+        return False
+
+
+def check_writer(name):
+    """(second writer refused, dead writer's block replaced)"""
+    name += '_writer'
+    with CandleBus.create(name, slots=8) as bus:
+        try:
+            CandleBus.create(name, slots=8).close()
+            refused = False
+        except BusInUse:
+            refused = True
+        # 模拟异常退出的写入端：头部换成已结束进程的 pid
+        dead = mp.Process(target=time.sleep, args=(0,))
+        dead.start()
+        dead.join()
+        bus.header[_PID] = dead.pid
+        bus.owner = False  # 块由下面的新写入端接管
+        try:
+            CandleBus.create(name, slots=8).close()
+            replaced = True
+        except BusInUse:
+            replaced = False
+    return refused, replaced
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fan-out check of utils.candle_bus')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--candles', type=int, default=2000)
+    parser.add_argument('--interval', type=float, default=0.002, help='seconds between published candles')
+    parser.add_argument('--slots', type=int, default=256)
+    args = parser.parse_args()
+
+    name = f'candles_check_{mp.current_process().pid}'
+    start = 1_700_000_000_000
+    failures = []
+    with CandleBus.create(name, slots=args.slots, bar_ms=BAR_MS) as bus:
+        results = mp.Queue()
+        procs = [mp.Process(target=reader, args=(name, args.candles, start, results)) for _ in range(args.readers)]
+        for p in procs:
+            p.start()
+        time.sleep(1.0)  # 等待读取进程挂载
+        for i in range(args.candles):
+            bus.publish([[start + i * BAR_MS, 1.0, 1.0, 1.0, 1.0, time.perf_counter()]])
+            time.sleep(args.interval)
+        outcomes = [results.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join()
+
+    all_latencies = []
+    for i, (seen, errors, latencies) in enumerate(outcomes):
+        lat = np.array(latencies) * 1e6
+        all_latencies += latencies
+        print(f"reader {i}: {seen} candles, {errors} errors, latency p50 {np.percentile(lat, 50):.0f} us "
+              f"p99 {np.percentile(lat, 99):.0f} us")
+        if seen != args.candles or errors:
+            failures.append(f"reader {i} saw {seen}/{args.candles} candles with {errors} errors")
+    lat = np.array(all_latencies) * 1e6
+    print(f"all readers: p50 {np.percentile(lat, 50):.0f} us, p99 {np.percentile(lat, 99):.0f} us, "
+          f"max {lat.max():.0f} us")
+    if not check_overrun(name):
+        failures.append("lagging reader did not get BusOverrun")
+    refused, replaced = check_writer(name)
+    if not refused:
+        failures.append("second writer replaced a running writer's bus")
+    if not replaced:
+        failures.append("block of a dead writer was not replaced")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Check that CLI startup stays cheap
+
+Imports each module in a fresh interpreter and fails if it takes longer
+than the budget or drags in one of the heavy dependencies.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pandas', 'sklearn', 'matplotlib', 'ccxt')
+
+# 模块 -> 导入时间预算（毫秒）
+BUDGETS = {
+    'main': 150,
+    'config.config': 150,
+    'utils.report_generator': 100,
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'ms': elapsed, 'heavy': heavy}}))
+"""
+
+
+def measure(module, repeat=3):
+    """Best-of-N import time (ms) and the heavy modules it loaded"""
+    best, heavy = None, []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        heavy = result['heavy']
+        best = result['ms'] if best is None else min(best, result['ms'])
+    return best, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply all budgets (slow CI machines)')
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        ms, heavy = measure(module)
+        limit = budget * args.scale
+        ok = ms <= limit and not heavy
+        failed |= not ok
+        status = 'OK  ' if ok else 'FAIL'
+        extra = f" heavy imports: {', '.join(heavy)}" if heavy else ''
+        print(f"{status} {module}: {ms:.1f} ms (budget {limit:.0f} ms){extra}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Check the compiled kernels against the pandas reference implementation
+
+Compares backtest.jit (numba when available) and backtest.kernels (NumPy)
+with the original pandas indicator code, the compiled volume profile with
+the dict-based kernel (and with itself on later slice starts and on the
+live window), and jit.run_positions with kernels.simulate, on the
+bundled daily data and on a long synthetic random walk. Prints timings;
+exits non-zero on a mismatch.
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from backtest import jit, kernels
+from config.config import (
+    RSI_PERIOD, MACD_FAST, MACD_SLOW, MACD_SIGNAL, BB_PERIOD, MA_PERIOD, ATR_PERIOD,
+    VP_WINDOW, VP_BIN_WIDTH, STOP_LOSS_PCT, TAKE_PROFIT_PCT, LIVE_WINDOW_BARS
+)
+
+# 相对误差上限：pandas 的滚动标准差是在线累加算法，长序列上有 1e-7 量级的舍入误差
+TOLERANCE = 1e-6
+
+
+def pandas_indicators(df):
+    """Indicator columns as TradingStrategy.calculate_indicators computed them with pandas"""
+    close = df['close']
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0).rolling(window=RSI_PERIOD).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=RSI_PERIOD).mean()
+    macd = close.ewm(span=MACD_FAST, adjust=False).mean() - close.ewm(span=MACD_SLOW, adjust=False).mean()
+    prev_close = close.shift(1)
+    true_range = pd.concat([
+        df['high'] - df['low'], (df['high'] - prev_close).abs(), (df['low'] - prev_close).abs()
+    ], axis=1).max(axis=1)
+    return {
+        'rsi': (100 - 100 / (1 + gain / loss)).values,
+        'macd': macd.values,
+        'macd_signal': macd.ewm(span=MACD_SIGNAL, adjust=False).mean().values,
+        'bb_middle': close.rolling(window=BB_PERIOD).mean().values,
+        'bb_std': close.rolling(window=BB_PERIOD).std().values,
+        'ma': close.rolling(window=MA_PERIOD).mean().values,
+        'atr': true_range.rolling(window=ATR_PERIOD).mean().values
+    }
+
+
+def module_indicators(mod, df):
+    close, high, low = (df[c].values for c in ('close', 'high', 'low'))
+    macd, macd_signal = mod.macd(close, MACD_FAST, MACD_SLOW, MACD_SIGNAL)
+    return {
+        'rsi': mod.rsi(close, RSI_PERIOD),
+        'macd': macd,
+        'macd_signal': macd_signal,
+        'bb_middle': mod.rolling_mean(close, BB_PERIOD),
+        'bb_std': mod.rolling_std(close, BB_PERIOD),
+        'ma': mod.rolling_mean(close, MA_PERIOD),
+        'atr': mod.atr(high, low, close, ATR_PERIOD)
+    }
+
+
+def max_error(a, b):
+    """Largest relative difference; inf if the NaN patterns differ"""
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    if not np.array_equal(np.isnan(a), np.isnan(b)):
+        return np.inf
+    ok = ~np.isnan(a)
+    if not ok.any():
+        return 0.0
+    return float(np.max(np.abs(a[ok] - b[ok]) / np.maximum(np.abs(b[ok]), 1.0)))
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    spread = np.abs(rng.normal(0, 0.005, n)) * close
+    index = pd.date_range('2020-01-01', periods=n, freq='min')
+    return pd.DataFrame({'open': close, 'high': close + spread, 'low': close - spread,
+                         'close': close, 'volume': rng.uniform(1, 10, n)}, index=index)
+
+
+def check(name, df):
+    failures = []
+    reference, t_pandas = timed(pandas_indicators, df)
+    rows = [('pandas', t_pandas, 0.0)]
+    for label, mod in (('jit' if jit.JIT_ENABLED else 'jit (fallback)', jit), ('numpy', kernels)):
+        values, elapsed = timed(module_indicators, mod, df)
+        err = max(max_error(values[k], reference[k]) for k in reference)
+        rows.append((label, elapsed, err))
+        if err > TOLERANCE:
+            failures.append(f"{name}: {label} indicators differ ({err:.3g})")
+
+    # 成交量分布 POC：编译版本与字典实现逐位一致
+    close, volume = df['close'].values, df['volume'].values
+    expected_poc, t_vp = timed(kernels.rolling_volume_profile, close, volume, VP_WINDOW, VP_BIN_WIDTH)
+    poc, t_vp_jit = timed(jit.rolling_volume_profile, close, volume, VP_WINDOW, VP_BIN_WIDTH)
+    if not np.array_equal(poc, expected_poc, equal_nan=True):
+        failures.append(f"{name}: jit.rolling_volume_profile differs from kernels.rolling_volume_profile")
+    rows.append(('volume profile: kernels', t_vp, 0.0))
+    rows.append(('volume profile: jit', t_vp_jit, max_error(poc, expected_poc)))
+    failures += check_poc_slices(name, close, volume, expected_poc)
+    
+    # 仓位循环：与 kernels.simulate 逐根比较
+    signal = np.sign(np.nan_to_num(reference['macd'] - reference['macd_signal'])).astype(np.int8)
+    stop_distance = 2.0 * reference['atr']
+    expected, t_sim = timed(kernels.simulate, close, signal, STOP_LOSS_PCT, TAKE_PROFIT_PCT,
+                            10000.0, stop_distance)
+    (equity, _, _, pnls), t_run = timed(jit.run_positions, close, signal, stop_distance,
+                                        STOP_LOSS_PCT, TAKE_PROFIT_PCT, 10000.0)
+    err = max_error(equity, expected['equity'][:, 0])
+    if err > TOLERANCE or np.isfinite(pnls).sum() != expected['closed'][0]:
+        failures.append(f"{name}: run_positions differs from kernels.simulate ({err:.3g})")
+    batch, t_batch = timed(jit.simulate, close, signal, STOP_LOSS_PCT, TAKE_PROFIT_PCT, 10000.0, stop_distance)
+    batch_err = max_error(batch['equity'], expected['equity'])
+    if batch_err > TOLERANCE or not all(np.array_equal(batch[key], expected[key]) for key in ('entries', 'closed', 'wins')):
+        failures.append(f"{name}: jit.simulate differs from kernels.simulate ({batch_err:.3g})")
+    rows.append(('positions: simulate', t_sim, 0.0))
+    rows.append(('positions: run_positions', t_run, err))
+    rows.append(('positions: jit.simulate', t_batch, batch_err))
+
+    print(f"{name} ({len(df)} bars)")
+    for label, elapsed, err in rows:
+        print(f"  {label:<26} {elapsed:9.2f} ms   max rel err {err:.2e}")
+    return failures
+
+
+def check_poc_slices(name, close, volume, expected):
+    """The POC of a window must not depend on where the series starts
+
+    Compares the full-history POC with the POC computed on later starts,
+    on the trailing LIVE_WINDOW_BARS windows get_signal sees live, and on
+    consecutive blocks with carried state.
+    """
+    failures = []
+    n = len(close)
+    for start in (1, 137, n // 3):
+        if n - start < VP_WINDOW:
+            continue
+        for label, mod in (('jit', jit), ('kernels', kernels)):
+            poc = mod.rolling_volume_profile(close[start:], volume[start:], VP_WINDOW, VP_BIN_WIDTH)
+            if not np.array_equal(poc[VP_WINDOW - 1:], expected[start + VP_WINDOW - 1:]):
+                failures.append(f"{name}: {label} volume profile depends on the slice start ({start})")
+    ends = np.unique(np.linspace(LIVE_WINDOW_BARS, n, 50).astype(int)) if n >= LIVE_WINDOW_BARS else []
+    live = [jit.rolling_volume_profile(close[e - LIVE_WINDOW_BARS:e], volume[e - LIVE_WINDOW_BARS:e],
+                                       VP_WINDOW, VP_BIN_WIDTH)[-1] for e in ends]
+    if not np.array_equal(live, expected[np.asarray(ends, dtype=int) - 1]):
+        failures.append(f"{name}: volume profile of the live window differs from the full history")
+    state = kernels.new_volume_profile_state()
+    blocks = [kernels.rolling_volume_profile(close[a:a + 997], volume[a:a + 997], VP_WINDOW, VP_BIN_WIDTH, state)
+              for a in range(0, n, 997)]
+    if not np.array_equal(np.concatenate(blocks), expected, equal_nan=True):
+        failures.append(f"{name}: volume profile in blocks differs from one pass")
+    return failures
+
+
+def threaded_sweep(df, threads):
+    """Run the position loop for several stop settings in threads (nogil kernels scale)"""
+    close = df['close'].values
+    signal = np.sign(np.nan_to_num(np.diff(close, prepend=close[0]))).astype(np.int8)
+    tasks = [(close, signal, None, sl, TAKE_PROFIT_PCT) for sl in np.linspace(0.01, 0.05, threads * 4)]
+    run = lambda t: jit.run_positions(*t)
+    start = time.perf_counter()
+    for t in tasks:
+        run(t)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(run, tasks))
+    threaded = time.perf_counter() - start
+    print(f"sweep of {len(tasks)} runs: serial {serial * 1000:.1f} ms, "
+          f"{threads} threads {threaded * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare jit / NumPy kernels with pandas')
+    parser.add_argument('--data', default='data/btc_okx_2023_1d.csv')
+    parser.add_argument('--bars', type=int, default=100000, help='length of the synthetic series')
+    parser.add_argument('--threads', type=int, default=0, help='also time a threaded sweep')
+    args = parser.parse_args()
+
+    print(f"numba: {'yes' if jit.HAVE_NUMBA else 'no'}, jit enabled: {jit.JIT_ENABLED}")
+    # 首次调用触发编译（或读取缓存），不计入计时
+    jit.run_positions(np.ones(2), np.zeros(2))
+    module_indicators(jit, random_walk(100))
+
+    failures = []
+    df = pd.read_csv(args.data, index_col='timestamp', parse_dates=True)
+    failures += check(args.data, df)
+    synthetic = random_walk(args.bars)
+    failures += check('random walk', synthetic)
+    if args.threads:
+        threaded_sweep(synthetic, args.threads)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Check that incremental retraining stores the samples of a full retrain
+
+Feeds growing prefixes of the data to TradingStrategy.retrain_ai_models (as
+`train --incremental` does once per new batch of candles, through
+save_state / load_state) and compares the stored feature matrix, labels and
+sample times with labelled_rows on the indicators of the whole history.
+Labels and times must match exactly; the features within RTOL, because
+retrain only computes the new bars and the pandas rolling means / stds of
+the features round differently depending on where the window starts.
+Exits non-zero on a mismatch.
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from config.config import RETRAIN_WINDOW
+from scripts.check_kernel_parity import random_walk
+from strategy.strategy import TradingStrategy
+
+RTOL = 1e-9
+
+
+def check(name, df, step):
+    first = len(df) - 5 * step
+    with tempfile.TemporaryDirectory() as state_dir, contextlib.redirect_stdout(io.StringIO()):
+        for end in range(first, len(df) + 1, step):
+            # 每次重训都是新进程：载入上次保存的状态
+            strategy = TradingStrategy()
+            strategy.ai_models.load_state(state_dir)
+            strategy.retrain_ai_models(df.iloc[:end])
+            strategy.ai_models.save_state(state_dir)
+    models = strategy.ai_models
+
+    reference = TradingStrategy().ai_models
+    X, y, rows = reference.labelled_rows(strategy.calculate_indicators(df))
+    X, y, times = X[-RETRAIN_WINDOW:], y[-RETRAIN_WINDOW:], df.index.values[rows][-RETRAIN_WINDOW:]
+    print(f"{name}: {len(models.train_y)} stored samples after {len(range(first, len(df) + 1, step))} retrains")
+    if not (models.train_X.shape == X.shape and np.allclose(models.train_X, X, rtol=RTOL, atol=0, equal_nan=True)
+            and np.array_equal(models.train_y, y)
+            and np.array_equal(models.train_times, times)):
+        return [f"{name}: incremental samples differ from the full-history features"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental retrain vs full-history features')
+    parser.add_argument('--data', default='data/btc_okx_2023_1d.csv')
+    parser.add_argument('--bars', type=int, default=5000, help='length of the synthetic series')
+    parser.add_argument('--step', type=int, default=50, help='new bars per retrain')
+    args = parser.parse_args()
+
+    failures = []
+    df = pd.read_csv(args.data, index_col='timestamp', parse_dates=True)
+    failures += check(args.data, df, args.step)
+    failures += check('random walk', random_walk(args.bars), args.step)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,38 @@
-import ccxt
-import pandas as pd
+import os
 
-exchange = ccxt.okx()
-symbol = 'BTC/USDT'
-timeframe = '1d'
-since = exchange.parse8601('2023-01-01T00:00:00Z')
-all_bars = []
 
-# OKX单次最多只能取100根K线，所以要循环获取
-done = False
-while not done:
-    bars = exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=100)
-    if not bars:
-        break
-    all_bars += bars
-    if len(bars) < 100:
-        done = True
-    else:
-        since = bars[-1][0] + 24 * 60 * 60 * 1000  # 下一天
+def fetch_ohlcv(symbol='BTC/USDT', timeframe='1d', since='2023-01-01T00:00:00Z',
+                output='data/btc_okx_2023_1d.csv', limit=100):
+    """Download OHLCV candles from OKX and save them to a CSV file"""
+    import ccxt
+    import pandas as pd
+    from api.market_cache import preload_markets
 
-df = pd.DataFrame(all_bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-df.set_index('timestamp', inplace=True)
-df.to_csv('btc_okx_2023_1d.csv')
-print(df.head()) 
\ No newline at end of file
+    exchange = ccxt.okx()
+    preload_markets(exchange)  # 本地缓存的市场元数据，过期才重新下载
+    since_ms = exchange.parse8601(since)
+    step_ms = exchange.parse_timeframe(timeframe) * 1000
+    all_bars = []
+
+    # OKX单次最多只能取100根K线，所以要循环获取
+    while True:
+        bars = exchange.fetch_ohlcv(symbol, timeframe, since=since_ms, limit=limit)
+        if not bars:
+            break
+        all_bars += bars
+        if len(bars) < limit:
+            break
+        since_ms = bars[-1][0] + step_ms  # 下一根K线
+
+    df = pd.DataFrame(all_bars, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df.set_index('timestamp', inplace=True)
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    df.to_csv(output)
+    return df
+
+
+if __name__ == '__main__':
+    print(fetch_ohlcv().head())
@@ -1,93 +1,193 @@
-import pandas as pd
+"""Synthetic OHLCV data for testing and benchmarks
+
+Usage (from the project root):
+    python -m scripts.test_data --bars 10000000 --interval 1m --output data/synthetic_1m.parquet
+"""
+import argparse
 import numpy as np
-from datetime import datetime, timedelta
+import pandas as pd
+from scipy.signal import lfilter
+from backtest.metrics import timeframe_to_minutes, periods_per_year
+
+# 市场状态：牛市、熊市、震荡
+BULL, BEAR, SIDEWAYS = 0, 1, 2
+
+
+def _bar_minutes(interval):
+    """Bar size in minutes for a ccxt timeframe ('1h') or pandas frequency ('h', '15min')"""
+    try:
+        return timeframe_to_minutes(interval)
+    except (ValueError, IndexError):
+        return pd.Timedelta(pd.tseries.frequencies.to_offset(interval)).total_seconds() / 60
+
+
+class SyntheticMarket:
+    """Vectorized, seedable regime-switching price generator
+
+    Every chunk is produced with array operations only:
+    - regimes (bull / bear / sideways) with geometric durations, expanded by np.repeat
+    - volatility clustering from an AR(1) log-variance process run through
+      scipy's lfilter (a GARCH-style effect without GARCH's per-bar recursion)
+    - Student-t return shocks, OHLC built around consecutive closes so that
+      low <= open, close <= high always holds, and volume tied to volatility
+
+    State (last close, log-variance, current regime and its remaining bars) is
+    carried between generate() calls, so chunks concatenate into one
+    continuous series.
+    """
+
+    def __init__(self, interval='1h', seed=None, start_price=30000.0,
+                 annual_drift=(0.8, -0.6, 0.0), annual_vol=0.6,
+                 regime_vol=(1.0, 1.3, 0.7), mean_regime_days=90,
+                 vol_persistence_days=10, vol_of_vol=0.35,
+                 base_volume=200.0, tail_df=5):
+        self.rng = np.random.default_rng(seed)
+        self.bar_minutes = _bar_minutes(interval)
+        bars_per_year = periods_per_year(minutes=self.bar_minutes)
+        bars_per_day = 1440 / self.bar_minutes
+
+        # 年化参数换算为每根K线
+        self.drift = np.asarray(annual_drift, dtype=np.float64) / bars_per_year
+        self.base_sigma = annual_vol / np.sqrt(bars_per_year)
+        self.regime_vol = np.asarray(regime_vol, dtype=np.float64)
+        self.mean_regime_bars = max(mean_regime_days * bars_per_day, 1.0)
+        self.phi = np.exp(-1.0 / max(vol_persistence_days * bars_per_day, 1.0))
+        # 冲击方差使对数方差的平稳标准差等于 vol_of_vol
+        self.eta = vol_of_vol * np.sqrt(1 - self.phi ** 2)
+        self.base_volume = base_volume * self.bar_minutes / 60
+        self.tail_df = tail_df
+        self.t_scale = np.sqrt((tail_df - 2) / tail_df)
+
+        # Carried state
+        self.last_close = float(start_price)
+        self.log_var = 0.0
+        self.regime = int(self.rng.integers(3))
+        self.regime_left = int(self.rng.geometric(1 / self.mean_regime_bars))
+
+    def _regimes(self, n):
+        """Regime label per bar, continuing the current regime first"""
+        first = min(self.regime_left, n)
+        labels = [np.full(first, self.regime, dtype=np.int8)]
+        remaining = n - first
+        regime, left = self.regime, self.regime_left - first
+        if remaining > 0:
+            # 预估需要的状态段数量，不足时再补
+            expected = int(remaining / self.mean_regime_bars * 2) + 4
+            durations = self.rng.geometric(1 / self.mean_regime_bars, size=expected)
+            while durations.sum() < remaining:
+                durations = np.concatenate([durations, self.rng.geometric(1 / self.mean_regime_bars, size=expected)])
+            cut = int(np.searchsorted(np.cumsum(durations), remaining)) + 1
+            durations = durations[:cut]
+            # 状态切换时总是跳到另外两个状态之一
+            steps = self.rng.integers(1, 3, size=cut)
+            states = (regime + np.cumsum(steps)) % 3
+            left = int(durations.sum() - remaining)
+            durations[-1] -= left
+            labels.append(np.repeat(states.astype(np.int8), durations))
+            regime = int(states[-1])
+        self.regime, self.regime_left = regime, left
+        if left == 0:
+            self.regime_left = int(self.rng.geometric(1 / self.mean_regime_bars))
+            self.regime = int((regime + self.rng.integers(1, 3)) % 3)
+        return np.concatenate(labels)
+
+    def generate(self, n):
+        """Generate the next n bars as a dict of float64 arrays"""
+        rng = self.rng
+        regimes = self._regimes(n)
 
-def generate_test_data(start_date='2022-01-01', end_date='2023-12-31', interval='1h'):
-    """Generate test data for backtesting"""
-    # Convert dates to datetime
+        # AR(1) 对数方差：h_t = phi * h_{t-1} + eta * e_t
+        shocks = rng.standard_normal(n) * self.eta
+        log_var, zf = lfilter([1.0], [1.0, -self.phi], shocks, zi=[self.phi * self.log_var])
+        self.log_var = float(log_var[-1])
+        sigma = self.base_sigma * self.regime_vol[regimes] * np.exp(log_var / 2)
+
+        # 收益率与收盘价
+        z = rng.standard_t(self.tail_df, size=n) * self.t_scale
+        returns = self.drift[regimes] - 0.5 * sigma ** 2 + sigma * z
+        log_close = np.log(self.last_close) + np.cumsum(returns)
+        close = np.exp(log_close)
+        open_ = np.empty(n)
+        open_[0] = self.last_close
+        open_[1:] = close[:-1]
+        self.last_close = float(close[-1])
+
+        # 影线长度与波动率成比例
+        body_high = np.maximum(open_, close)
+        body_low = np.minimum(open_, close)
+        high = body_high * np.exp(np.abs(rng.standard_normal(n)) * sigma * 0.5)
+        low = body_low * np.exp(-np.abs(rng.standard_normal(n)) * sigma * 0.5)
+
+        # 成交量随波动率和价格变动放大
+        move = np.abs(returns) / sigma
+        volume = self.base_volume * (sigma / self.base_sigma) * (1 + move) * rng.lognormal(0, 0.3, n)
+
+        return {'open': open_, 'high': high, 'low': low, 'close': close,
+                'volume': volume, 'regime': regimes}
+
+
+def _to_frame(bars, timestamps):
+    df = pd.DataFrame({k: bars[k] for k in ('open', 'high', 'low', 'close', 'volume')}, index=timestamps)
+    df.index.name = 'timestamp'
+    return df
+
+
+def generate_test_data(start_date='2022-01-01', end_date='2023-12-31', interval='1h', seed=None, **params):
+    """Generate test data for backtesting
+
+    interval accepts any ccxt timeframe ('1m', '4h', '1d', ...) or pandas
+    frequency string; extra keyword arguments go to SyntheticMarket.
+    """
+    minutes = _bar_minutes(interval)
+    timestamps = pd.date_range(start=pd.to_datetime(start_date), end=pd.to_datetime(end_date),
+                               freq=pd.Timedelta(minutes=minutes))
+    market = SyntheticMarket(interval=interval, seed=seed, **params)
+    return _to_frame(market.generate(len(timestamps)), timestamps)
+
+
+def stream_test_data(path, n_bars, start_date='2020-01-01', interval='1m', seed=None,
+                     chunk_size=1_000_000, **params):
+    """Write n_bars synthetic candles to disk chunk by chunk
+
+    Memory stays bounded by chunk_size. '.parquet' paths are written with a
+    pyarrow ParquetWriter (one row group per chunk), anything else as CSV in
+    the same layout as data/btc_okx_2023_1d.csv.
+    """
+    market = SyntheticMarket(interval=interval, seed=seed, **params)
+    step = pd.Timedelta(minutes=market.bar_minutes)
     start = pd.to_datetime(start_date)
-    end = pd.to_datetime(end_date)
-    
-    # Generate timestamps
-    if interval == '1h':
-        timestamps = pd.date_range(start=start, end=end, freq='h')
-    elif interval == '1d':
-        timestamps = pd.date_range(start=start, end=end, freq='D')
-    else:
-        raise ValueError("Unsupported interval")
-    
-    # Generate random price data with trend and volatility
-    n = len(timestamps)
-    
-    # Create more realistic market cycles
-    total_periods = n
-    single_cycle_length = total_periods // 3  # Divide total length into 3 major cycles
-    phase_length = single_cycle_length // 3  # Each cycle has 3 phases
-    
-    cycles = []
-    for _ in range(3):  # Create 3 market cycles
-        # Bull market phase
-        bull_trend = np.linspace(0, 1, phase_length) * 5000
-        # Bear market phase
-        bear_trend = np.linspace(1, 0.7, phase_length) * 5000
-        # Sideways phase
-        side_trend = np.ones(phase_length) * 3500
-        cycles.extend([bull_trend, bear_trend, side_trend])
-    
-    # Combine cycles and ensure correct length
-    trend = np.concatenate(cycles)
-    if len(trend) < n:
-        # Pad with the last value if needed
-        padding = n - len(trend)
-        trend = np.pad(trend, (0, padding), mode='edge')
-    elif len(trend) > n:
-        # Truncate if too long
-        trend = trend[:n]
-    
-    # Add realistic volatility
-    volatility = np.random.normal(0, 100, n)  # Base volatility
-    # Add higher volatility during trend changes
-    for i in range(0, n, n//10):
-        end_idx = min(i + n//20, n)
-        volatility[i:end_idx] *= 2
-    
-    price = 30000 + trend + volatility  # Base price + trend + volatility
-    
-    # Generate OHLCV data with more realistic patterns
-    data = []
-    for i in range(n):
-        base_price = price[i]
-        
-        # Add realistic price movements
-        high = base_price * (1 + abs(np.random.normal(0, 0.01)))
-        low = base_price * (1 - abs(np.random.normal(0, 0.01)))
-        
-        # Ensure high > low
-        if high < low:
-            high, low = low, high
-            
-        # Generate open and close prices
-        open_price = np.random.uniform(low, high)
-        close = np.random.uniform(low, high)
-        
-        # Add realistic volume patterns
-        if i % (n//10) == 0:  # Every 10% of the data
-            volume = np.random.uniform(3, 8) * 100  # Higher volume during trend changes
-        else:
-            volume = np.random.uniform(1, 3) * 100  # Normal volume
-        
-        data.append([
-            timestamps[i],
-            open_price,
-            high,
-            low,
-            close,
-            volume
-        ])
-    
-    # Create DataFrame
-    df = pd.DataFrame(data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-    df.set_index('timestamp', inplace=True)
-    
-    print(df['close'].describe())  # 打印价格统计信息
-    return df 
\ No newline at end of file
+    writer = None
+    written = 0
+    try:
+        while written < n_bars:
+            n = min(chunk_size, n_bars - written)
+            timestamps = pd.date_range(start=start + step * written, periods=n, freq=step)
+            df = _to_frame(market.generate(n), timestamps)
+            if path.endswith('.parquet'):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(df)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            else:
+                df.to_csv(path, mode='w' if written == 0 else 'a', header=written == 0)
+            written += n
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic OHLCV data')
+    parser.add_argument('--bars', type=int, default=1_000_000)
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--output', default='data/synthetic.parquet')
+    args = parser.parse_args()
+    count = stream_test_data(args.output, args.bars, start_date=args.start, interval=args.interval,
+                             seed=args.seed, chunk_size=args.chunk_size)
+    print(f"Wrote {count} bars to {args.output}")
@@ -0,0 +1,253 @@
+"""Live trading loop step with session recording, and deterministic replay
+
+LiveSession.step() is one iteration of the live loop: the kline window of
+a poll goes through get_signal and update_position, and position changes
+become orders (sent through OKXAPI.place_order, or filled on paper). With a
+SessionRecorder attached every market message, indicator snapshot, signal
+and order request / response is written to the session log.
+
+replay() drives the same step from such a log as fast as it can (or at
+`speed` times the recorded pace) and reports every signal, indicator or
+order that differs from the recording. The latency fallback of get_signal
+depends on timing, so replay applies the recorded decision for each bar.
+Signals and orders must match exactly; indicators within `rtol`, since the
+compiled and NumPy kernels (USE_JIT) round differently.
+
+With several strategies on one host, run_ingestor() polls the exchange once
+and publishes closed candles on a shared-memory CandleBus
+(utils/candle_bus.py); LiveSession.consume() steps on every new candle of
+the bus instead of polling itself.
+"""
+import math
+import time
+import numpy as np
+from config.config import SYMBOL, TIMEFRAME, POSITION_SIZE, LIVE_WINDOW_BARS, CANDLE_BUS_POLL_SECONDS
+from utils import recorder as rec
+
+_OHLCV = ['open', 'high', 'low', 'close', 'volume']
+
+
+def candles_frame(window):
+    """DataFrame (timestamp index, OHLCV columns) of a kline window of rows [ms, o, h, l, c, v]"""
+    import pandas as pd
+    window = np.asarray(window, dtype=np.float64).reshape(-1, 6)
+    index = pd.DatetimeIndex(pd.to_datetime(window[:, 0].astype(np.int64), unit='ms'), name='timestamp')
+    # copy：window 可能是共享内存（CandleBus）的视图
+    return pd.DataFrame(window[:, 1:], index=index, columns=_OHLCV, copy=True)
+
+
+class LiveSession:
+    """One symbol traded by a TradingStrategy; api=None fills orders on paper"""
+
+    def __init__(self, strategy=None, api=None, recorder=None, symbol=SYMBOL, timeframe=TIMEFRAME,
+                 order_size=POSITION_SIZE):
+        if strategy is None:
+            from strategy.strategy import TradingStrategy
+            strategy = TradingStrategy()
+        self.strategy = strategy
+        self.api = api
+        self.recorder = recorder
+        strategy.recorder = recorder
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.order_size = order_size
+        self.orders = []  # (request, response)
+
+    def poll(self, limit=LIVE_WINDOW_BARS):
+        """Fetch the latest klines from the exchange and run one step"""
+        ohlcv = self.api.exchange.fetch_ohlcv(self.symbol, self.timeframe, limit=limit)
+        return self.step(ohlcv)
+
+    def consume(self, bus, window=LIVE_WINDOW_BARS, max_steps=None, timeout=None):
+        """Step on each candle published on a CandleBus; returns the number of steps
+
+        The kline window is read straight from the shared memory into the
+        strategy's DataFrame (the only copy). A session that falls behind
+        steps once on the latest candle; if the window was overwritten while
+        being read, it is read again. The bar close time (candle open +
+        bus.bar_ms) drives the bar_close_latency_seconds stages.
+        """
+        from utils.event_log import get_event_log
+        seq = bus.seq
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            new = bus.wait(seq, timeout)
+            if new == seq:
+                break  # 超时
+            if new - seq > 1:
+                get_event_log().warning('candle_bus_skipped', symbol=self.symbol, candles=new - seq - 1)
+            while True:
+                df = candles_frame(bus.window(window, new))
+                if bus.valid(new - len(df)):
+                    break
+                new = bus.seq  # 读取期间被覆盖，重新读取最新窗口
+            if self.recorder is not None:
+                times = df.index.values.astype('datetime64[ms]').astype(np.float64)
+                self.recorder.market(np.column_stack([times, df.values]))
+            bar_close = df.index[-1].timestamp() + bus.bar_ms / 1000 if bus.bar_ms else None
+            self._step(df, bar_close)
+            seq = new
+            steps += 1
+        return steps
+
+    def step(self, ohlcv, bar_close=None):
+        """Process one kline window; returns the signal"""
+        if self.recorder is not None:
+            self.recorder.market(ohlcv)
+        return self._step(candles_frame(ohlcv), bar_close)
+
+    def _step(self, df, bar_close=None):
+        signal = self.strategy.get_signal(df, bar_close)
+        price = float(df['close'].iloc[-1])
+        atr = self.strategy.last_indicators['atr']
+        before = self.strategy.position
+        self.strategy.update_position(price, signal, atr)
+        after = self.strategy.position
+        if before != after:
+            # 平仓再开仓（如有）
+            if before != 0:
+                self._order('sell' if before == 1 else 'buy', price, 'close', bar_close)
+            if after != 0:
+                self._order('buy' if after == 1 else 'sell', price, 'open', bar_close)
+        return signal
+
+    def _order(self, side, price, intent, bar_close=None):
+        """Send (or paper-fill) one order; with bar_close, the delay from bar
+        close to the order response is recorded as the order_ack stage"""
+        request = {'symbol': self.symbol, 'side': side, 'size': self.order_size, 'intent': intent}
+        if self.recorder is not None:
+            self.recorder.order_request(request)
+        if self.api is None:
+            response = {'status': 'filled', 'price': price, 'paper': True}
+        else:
+            response = self.api.place_order(side, self.order_size)
+        if bar_close is not None:
+            self.strategy.bar_latency['order_ack'].record(time.time() - bar_close)
+        if self.recorder is not None:
+            self.recorder.order_response(response)
+        self.orders.append((request, response))
+        return response
+
+
+def run_ingestor(bus, fetch, bar_ms, poll_seconds=CANDLE_BUS_POLL_SECONDS, max_polls=None, clock=time.time):
+    """Publish the closed candles of fetch() (kline rows, e.g. OKXAPI.exchange.fetch_ohlcv) on bus
+
+    Polls every poll_seconds; the forming candle (open + bar_ms after now)
+    is held back until it closes. Returns the number of polls.
+    """
+    from utils.event_log import get_event_log
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        started = clock()
+        try:
+            rows = np.asarray(fetch(), dtype=np.float64).reshape(-1, 6)
+            bus.publish(rows[rows[:, 0] + bar_ms <= started * 1000])
+        except Exception as e:
+            get_event_log().warning('candle_bus_fetch_failed', error=str(e))
+        polls += 1
+        if max_polls is None or polls < max_polls:
+            time.sleep(max(0.0, poll_seconds - (clock() - started)))
+    return polls
+
+
+def run_paper_session(df, path, bars=None, window=LIVE_WINDOW_BARS, strategy=None):
+    """Record a simulated live session: one poll per closed bar of df (last `bars` bars)
+
+    Record times follow the bar clock, so replay speed-ups are measured
+    against the trading time the session covers.
+    """
+    from backtest.jit import JIT_ENABLED
+    from backtest.metrics import timeframe_to_minutes
+    from utils.result_cache import code_version
+    times = df.index.values.astype('datetime64[ms]').astype(np.int64)
+    rows = np.column_stack([times.astype(np.float64), df[_OHLCV].values])
+    start = len(rows) - bars if bars else 1
+    bar_seconds = np.median(np.diff(times)) / 1000 if len(times) > 1 else timeframe_to_minutes(TIMEFRAME) * 60
+    clock = [0.0]
+    with rec.SessionRecorder(path, clock=lambda: clock[0]) as recorder:
+        session = LiveSession(strategy, recorder=recorder)
+        recorder.session(symbol=session.symbol, timeframe=session.timeframe, mode='paper',
+                         signal_mode=session.strategy.signal_mode, jit=JIT_ENABLED,
+                         code_version=code_version())
+        for i in range(max(start, 1), len(rows)):
+            clock[0] = times[i] / 1000 + bar_seconds  # K线收盘时刻
+            session.step(rows[max(0, i + 1 - window):i + 1], bar_close=clock[0])
+    return session
+
+
+def _same(a, b, rtol):
+    return math.isclose(a, b, rel_tol=rtol, abs_tol=rtol) or (math.isnan(a) and math.isnan(b))
+
+
+def replay(path, strategy=None, speed=None, max_mismatches=20, rtol=1e-9):
+    """Re-run the strategy on the market messages of a session log and compare
+
+    speed: None replays as fast as possible, else sleeps so that the
+    recorded time between polls is compressed by this factor.
+    Returns a summary dict (steps, mismatch counts and examples, elapsed
+    and recorded seconds, speed-up).
+    """
+    session = LiveSession(strategy)
+    strategy = session.strategy
+    strategy.recorder = None
+    budget = strategy.latency_budget_ms
+    summary = {'steps': 0, 'signal_mismatches': 0, 'indicator_mismatches': 0, 'order_mismatches': 0,
+               'examples': [], 'session': {}}
+    first_t = last_t = None
+    start = time.perf_counter()
+
+    def run(step):
+        window, t, records = step
+        indicators = next((b for k, _, b in records if k == rec.INDICATORS), None)
+        signal = next((b for k, _, b in records if k == rec.SIGNAL), None)
+        orders = [b for k, _, b in records if k == rec.ORDER_REQUEST]
+        if speed:
+            wait = (t - first_t) / speed - (time.perf_counter() - start)
+            if wait > 0:
+                time.sleep(wait)
+        # 与记录时相同的延迟降级决定
+        strategy.latency_budget_ms = -math.inf if signal and signal['fallback'] else math.inf
+        n_orders = len(session.orders)
+        replayed = session.step(window)
+        summary['steps'] += 1
+        problems = []
+        if signal is not None and replayed != signal['signal']:
+            summary['signal_mismatches'] += 1
+            problems.append(('signal', signal['signal'], replayed))
+        if indicators is not None:
+            current = strategy.last_indicators
+            diff = {k: (v, float(current[k])) for k, v in indicators['values'].items()
+                    if not _same(float(v), float(current[k]), rtol)}
+            if diff:
+                summary['indicator_mismatches'] += 1
+                problems.append(('indicators', diff))
+        new_orders = [r for r, _ in session.orders[n_orders:]]
+        if new_orders != orders:
+            summary['order_mismatches'] += 1
+            problems.append(('orders', orders, new_orders))
+        if problems and len(summary['examples']) < max_mismatches:
+            summary['examples'].append({'bar': str(candles_frame(window[-1:]).index[0]), 'problems': problems})
+
+    step = None
+    try:
+        for kind, t, body in rec.read_records(path):
+            if kind == rec.SESSION:
+                summary['session'] = body
+            elif kind == rec.MARKET:
+                if first_t is None:
+                    first_t = t
+                last_t = t
+                if step is not None:
+                    run(step)
+                step = (body, t, [])
+            elif step is not None:
+                step[2].append((kind, t, body))
+        if step is not None:
+            run(step)
+    finally:
+        strategy.latency_budget_ms = budget
+    elapsed = time.perf_counter() - start
+    recorded = (last_t - first_t) if first_t is not None else 0.0
+    summary.update(elapsed=elapsed, recorded_seconds=recorded,
+                   speedup=recorded / elapsed if elapsed > 0 else math.inf)
+    return summary
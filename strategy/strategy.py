@@ -1,72 +1,152 @@
+import time
 import pandas as pd
 import numpy as np
-from ai_models import AIModels
-from config import (
+from ai.ai_models import AIModels, HORIZON
+from ai.lstm_model import LSTMModel
+from ai.ensemble import ModelEnsemble
+from backtest import jit
+from backtest.kernels import SIGNAL_THRESHOLD, new_volume_profile_state
+from utils.trade_log import TradeLog, TradeType
+from utils.event_log import get_event_log
+from utils.runtime_metrics import get_registry
+from config.config import (
     STOP_LOSS_PCT, TAKE_PROFIT_PCT, MAX_DRAWDOWN_PCT,
     RSI_PERIOD, RSI_OVERBOUGHT, RSI_OVERSOLD,
     MACD_FAST, MACD_SLOW, MACD_SIGNAL,
-    BB_PERIOD, BB_STD, MA_PERIOD
+    BB_PERIOD, BB_STD, MA_PERIOD,
+    ATR_PERIOD, ATR_MULTIPLIER, USE_ATR_STOPS,
+    VP_WINDOW, VP_BIN_WIDTH,
+    SIGNAL_MODE, HYBRID_AI_WEIGHT, SIGNAL_LATENCY_BUDGET_MS,
+    ENSEMBLE_ENABLED, RETRAIN_WINDOW, WALK_FORWARD_STEP, LIVE_WINDOW_BARS
 )
 
+SIGNAL_MODES = ('technical', 'hybrid', 'ai')
+# 窗口类指标所需的历史K线数（RSI / ATR 还需要前一根收盘价）
+INDICATOR_TAIL = max(RSI_PERIOD + 1, BB_PERIOD, MA_PERIOD, ATR_PERIOD + 1)
+
+
+def new_indicator_state():
+    """Carried state of calculate_indicators between consecutive blocks of one series"""
+    return {'tail': None, 'macd': {}, 'vp': new_volume_profile_state()}
+
 class TradingStrategy:
     def __init__(self):
         self.ai_models = AIModels()
+        self.lstm_model = LSTMModel()
+        self.ensemble = ModelEnsemble()
+        self.use_ensemble = ENSEMBLE_ENABLED
+        if SIGNAL_MODE not in SIGNAL_MODES:
+            raise ValueError(f"SIGNAL_MODE must be one of {SIGNAL_MODES}, got {SIGNAL_MODE!r}")
+        self.signal_mode = SIGNAL_MODE
+        self.latency_budget_ms = SIGNAL_LATENCY_BUDGET_MS
+        self.latency_fallbacks = 0  # 超出延迟预算而退回技术信号的次数
+        self.walk_forward_info = {}  # 最近一次走步训练的样本外准确率等（报告用）
+        self.events = get_event_log()
+        # 实时路径的延迟直方图（/metrics 导出）
+        registry = get_registry()
+        self.stage_latency = {
+            stage: registry.histogram('signal_stage_seconds', 'get_signal stage duration', stage=stage)
+            for stage in ('indicators', 'model', 'total')
+        }
+        self.bar_latency = {
+            stage: registry.histogram('bar_close_latency_seconds', 'Time from bar close to stage completion',
+                                      stage=stage)
+            for stage in ('indicators', 'signal', 'order_ack')
+        }
+        self.fallback_counter = registry.counter('signal_latency_fallbacks_total',
+                                                 'Bars scored without the model (latency budget)')
         self.position = 0  # 0: no position, 1: long, -1: short
         self.entry_price = 0
         self.stop_loss = 0
         self.take_profit = 0
         self.max_drawdown = 0
-        self.trades = []
+        self.trades = TradeLog()
+        self.recorder = None  # utils.recorder.SessionRecorder：记录指标快照和信号
+        self.last_indicators = None  # get_signal 最近一根K线的指标
         
-    def calculate_indicators(self, df):
-        """Calculate technical indicators"""
-        # Create a copy of the dataframe
-        df = df.copy()
+    def calculate_indicators(self, df, state=None):
+        """Calculate technical indicators (compiled kernels from backtest.jit)
+
+        state: dict from new_indicator_state() to process a long series in
+        consecutive blocks. The last INDICATOR_TAIL bars of the previous
+        block are prepended for the rolling windows, the EMA and volume
+        profile state is carried, and only the rows of df are returned;
+        the result equals one pass over the whole series.
+        """
+        close = df['close'].values
+        high = df['high'].values
+        low = df['low'].values
+        n_tail = 0
+        if state is not None and state['tail'] is not None:
+            tail = state['tail']
+            n_tail = len(tail)
+            close = np.concatenate([tail['close'].values, close])
+            high = np.concatenate([tail['high'].values, high])
+            low = np.concatenate([tail['low'].values, low])
+        # 先收集所有指标列，最后一次性构建新的 DataFrame（逐列插入在实时路径上开销很大）
+        columns = {}
         
         # RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=RSI_PERIOD).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=RSI_PERIOD).mean()
-        rs = gain / loss
-        df.loc[:, 'rsi'] = 100 - (100 / (1 + rs))
+        columns['rsi'] = jit.rsi(close, RSI_PERIOD)[n_tail:]
         
         # MACD
-        exp1 = df['close'].ewm(span=MACD_FAST, adjust=False).mean()
-        exp2 = df['close'].ewm(span=MACD_SLOW, adjust=False).mean()
-        df.loc[:, 'macd'] = exp1 - exp2
-        df.loc[:, 'macd_signal'] = df['macd'].ewm(span=MACD_SIGNAL, adjust=False).mean()
-        df.loc[:, 'macd_hist'] = df['macd'] - df['macd_signal']
+        macd_line, macd_signal = jit.macd(df['close'].values, MACD_FAST, MACD_SLOW, MACD_SIGNAL,
+                                          None if state is None else state['macd'])
+        columns['macd'] = macd_line
+        columns['macd_signal'] = macd_signal
+        columns['macd_hist'] = macd_line - macd_signal
         
         # Bollinger Bands
-        df.loc[:, 'bb_middle'] = df['close'].rolling(window=BB_PERIOD).mean()
-        df.loc[:, 'bb_std'] = df['close'].rolling(window=BB_PERIOD).std()
-        df.loc[:, 'bb_upper'] = df['bb_middle'] + (df['bb_std'] * BB_STD)
-        df.loc[:, 'bb_lower'] = df['bb_middle'] - (df['bb_std'] * BB_STD)
+        bb_middle, bb_std = jit.bollinger(close, BB_PERIOD)
+        bb_middle, bb_std = bb_middle[n_tail:], bb_std[n_tail:]
+        columns['bb_middle'] = bb_middle
+        columns['bb_std'] = bb_std
+        columns['bb_upper'] = bb_middle + bb_std * BB_STD
+        columns['bb_lower'] = bb_middle - bb_std * BB_STD
         
         # Moving Average
-        df.loc[:, 'ma'] = df['close'].rolling(window=MA_PERIOD).mean()
+        columns['ma'] = jit.rolling_mean(close, MA_PERIOD)[n_tail:]
         
-        return df
+        # ATR
+        columns['atr'] = jit.atr(high, low, close, ATR_PERIOD)[n_tail:]
+        
+        # Volume Profile point of control (incremental rolling histogram)
+        columns['vp_poc'] = jit.rolling_volume_profile(
+            df['close'].values, df['volume'].values, VP_WINDOW, VP_BIN_WIDTH,
+            None if state is None else state['vp']
+        )
+        
+        if state is not None and len(df):
+            raw = df[['high', 'low', 'close']]
+            if state['tail'] is not None:
+                raw = pd.concat([state['tail'], raw])
+            state['tail'] = raw.iloc[-INDICATOR_TAIL:]
+        # 新 DataFrame（复制输入列），已有的同名指标列被覆盖
+        return pd.DataFrame({**{c: df[c].values for c in df.columns}, **columns}, index=df.index)
         
     def generate_signals(self, df):
         """Generate trading signals"""
-        df = df.copy()
+        # 直接在 NumPy 数组上比较（不复制 DataFrame）
+        close = df['close'].values
+        rsi = df['rsi'].values
+        macd, macd_line_signal = df['macd'].values, df['macd_signal'].values
+        ma = df['ma'].values
         
         # RSI signals
-        rsi_signal = np.where(df['rsi'] > RSI_OVERBOUGHT, -1,
-                            np.where(df['rsi'] < RSI_OVERSOLD, 1, 0))
+        rsi_signal = np.where(rsi > RSI_OVERBOUGHT, -1,
+                            np.where(rsi < RSI_OVERSOLD, 1, 0))
         
         # MACD signals
-        macd_signal = np.where(df['macd'] > df['macd_signal'], 1,
-                             np.where(df['macd'] < df['macd_signal'], -1, 0))
+        macd_signal = np.where(macd > macd_line_signal, 1,
+                             np.where(macd < macd_line_signal, -1, 0))
         
         # Bollinger Bands signals
-        bb_signal = np.where(df['close'] > df['bb_upper'], -1,
-                           np.where(df['close'] < df['bb_lower'], 1, 0))
+        bb_signal = np.where(close > df['bb_upper'].values, -1,
+                           np.where(close < df['bb_lower'].values, 1, 0))
         
         # Moving Average signals
-        ma_signal = np.where(df['close'] > df['ma'], 1,
-                           np.where(df['close'] < df['ma'], -1, 0))
+        ma_signal = np.where(close > ma, 1,
+                           np.where(close < ma, -1, 0))
         
         # Combine signals with weights
         signals = (
@@ -89,89 +169,323 @@ class TradingStrategy:
         df = self.calculate_indicators(df)
         accuracy = self.ai_models.train_random_forest(df)
         print(f"AI model training accuracy: {accuracy:.2%}")
+        if self.use_ensemble:
+            self.train_ensemble(df, indicators_ready=True)
+        
+    def retrain_ai_models(self, df):
+        """Incremental retrain on new candles
+
+        The carried indicator state (new_indicator_state()) and the last
+        feature-lookback + HORIZON rows of the indicator frame are kept in
+        ai_models.indicator_state and persisted by save_state, so only the
+        bars of df after the last processed one go through
+        calculate_indicators; the first call, or a df that does not contain
+        that bar, computes the whole history. Only the samples after the
+        newest stored one reach the model, so the cost does not grow with
+        the length of df.
+        """
+        models = self.ai_models
+        carried = models.indicator_state
+        last = None if carried is None else carried['frame'].index[-1]
+        if last is not None and last in df.index:
+            new = df[df.index > last]
+            frame = carried['frame']
+            if len(new):
+                frame = pd.concat([frame, self.calculate_indicators(new, carried['state'])])
+        else:
+            carried = {'state': new_indicator_state()}
+            frame = self.calculate_indicators(df, carried['state'])
+        # 下次只需要补齐特征窗口和尚未打标签的最后 HORIZON 根K线
+        keep = models.features.lookback(models.feature_names) + HORIZON
+        carried['frame'] = frame.iloc[-keep:]
+        models.indicator_state = carried
+        accuracy = models.retrain_incremental(frame)
+        info = models.train_info
+        print(f"Incremental retrain: +{info.get('added', 0)} samples, {info.get('samples', 0)} in window, "
+              f"{info.get('trees', 0)} trees, out-of-sample accuracy on new samples: {accuracy:.2%}")
+        return accuracy
+        
+    def tune_ai_models(self, df, workers=None):
+        """Hyperparameter search for the random forest; best parameters are applied to ai_models
+
+        The search data is cached by a fingerprint of the raw candles, so a
+        repeated search on the same data skips indicators and features.
+        """
+        from ai.ai_models import HORIZON
+        from ai.feature_store import fingerprint
+        from ai.hyperparameter_search import dataset_key, search_random_forest
+        from config.config import RF_SEARCH_SPLITS, RF_SEARCH_EMBARGO
+        
+        key = dataset_key(fingerprint(df, ['open', 'high', 'low', 'close', 'volume']),
+                          self.ai_models.feature_names, RF_SEARCH_SPLITS, HORIZON, RF_SEARCH_EMBARGO)
+        result = search_random_forest(
+            key, lambda: self.ai_models.labelled_rows(self.calculate_indicators(df)),
+            horizon=HORIZON, workers=workers
+        )
+        self.ai_models.rf_model.set_params(**result['best_params'])
+        for r in result['rounds']:
+            print(f"  {r['candidates']:3d} candidates x {r['n_estimators']:3d} trees: "
+                  f"best CV accuracy {r['best_score']:.2%}")
+        print(f"Best parameters: {result['best_params']} "
+              f"({'cached folds' if result['cache_hit'] else 'folds built'}, {result['time']:.2f}s)")
+        return result
         
-    def get_signal(self, df):
-        """Get trading signal"""
+    def train_ensemble(self, df, indicators_ready=False):
+        """Train every ensemble model on the shared (cached) feature matrix"""
+        if not indicators_ready:
+            df = self.calculate_indicators(df)
+        X, y = self.ai_models.feature_matrix(df)
+        accuracy = self.ensemble.train(X, y)
+        for name, info in self.ensemble.train_info.get('models', {}).items():
+            print(f"  {name}: accuracy {info['accuracy']:.2f}%, {info['time']:.2f}s")
+        print(f"Ensemble accuracy: {accuracy:.2%}")
+        return accuracy
+        
+    def train_lstm_model(self, df):
+        """Train the LSTM sequence model"""
         df = self.calculate_indicators(df)
-        tech_signal = self.generate_signals(df).iloc[-1]
-        if tech_signal > 0.7:
-            return 1  # Buy signal
-        elif tech_signal < -0.7:
-            return -1  # Sell signal
+        accuracy = self.lstm_model.train(df)
+        print(f"LSTM model validation accuracy: {accuracy:.2%}")
+        return accuracy
+        
+    def ai_probability(self, df):
+        """Buy probability of the latest bar from the ensemble or the random forest (single-row path)"""
+        if self.use_ensemble and self.ensemble.is_trained:
+            X = self.ai_models.latest_features(df)
+            return np.nan if X is None else float(self.ensemble.predict_proba(X)[0])
+        return self.ai_models.predict_proba(df)
+        
+    def ai_probabilities(self, df):
+        """Buy probability for every bar of an indicator frame in one batch (NaN during warm-up)"""
+        if self.use_ensemble and self.ensemble.is_trained:
+            features = self.ai_models.feature_frame(df)
+            probs = np.full(len(df), np.nan)
+            valid = np.isfinite(features).all(axis=1)
+            if valid.any():
+                probs[valid] = self.ensemble.predict_proba(features[valid])
+            return probs
+        return self.ai_models.predict_proba_frame(df)
+        
+    def walk_forward_probabilities(self, df, start=0, step=WALK_FORWARD_STEP, window=RETRAIN_WINDOW):
+        """Out-of-sample buy probabilities of the bars from position start of an indicator frame
+
+        The model (ensemble or random forest) is refitted every `step` bars on
+        the last `window` labelled samples whose label horizon ends before the
+        block, so no bar is scored by a model that saw its future returns.
+        Bars before the first such fit are NaN (technical score). The last
+        fit stays in the model. If prediction exceeds the latency budget per
+        bar, every probability is NaN, as in precompute_signals.
+        walk_forward_info gets the out-of-sample accuracy over the scored
+        labelled bars, the number of fits, their total time and the training
+        samples (with class counts) of the last fit.
+        """
+        started = time.time()
+        X, y, rows = self.ai_models.labelled_rows(df)
+        features = self.ai_models.feature_frame(df)
+        valid = np.isfinite(features).all(axis=1)
+        probs = np.full(len(df), np.nan)
+        predict_seconds, fits = 0.0, 0
+        last = np.empty(0, dtype=np.int64)
+        for a in range(start, len(df), step):
+            # 标签用到 rows + HORIZON 的收盘价，必须早于本块第一根K线
+            known = np.flatnonzero(rows + HORIZON < a)[-window:]
+            if len(known) < 10 or len(np.unique(y[known])) < 2:
+                continue
+            last = known
+            if self.use_ensemble:
+                self.ensemble.train(X[known], y[known])
+            else:
+                self.ai_models.fit(X[known], y[known])
+            if not self._ai_ready():
+                continue
+            fits += 1
+            block = a + np.flatnonzero(valid[a:a + step])
+            if len(block):
+                t = time.perf_counter()
+                if self.use_ensemble:
+                    probs[block] = self.ensemble.predict_proba(features[block])
+                else:
+                    probs[block] = self.ai_models.predict_rows(features[block])
+                predict_seconds += time.perf_counter() - t
+        scored = int(np.isfinite(probs[start:]).sum())
+        print(f"Walk-forward: {fits} fits every {step} bars, {scored}/{len(df) - start} bars scored out of sample")
+        # 样本外准确率：已打分且有买/卖标签的K线
+        tested = (rows >= start) & np.isfinite(probs[rows])
+        hits = (probs[rows[tested]] > 0.5) == (y[tested] == 1)
+        self.walk_forward_info = {
+            'accuracy': round(float(hits.mean()) * 100, 2) if len(hits) else None,
+            'tested': int(tested.sum()),
+            'fits': fits,
+            'time': round(time.time() - started, 2),
+            'samples': len(last),
+            'buy': int((y[last] == 1).sum()),
+            'sell': int((y[last] == 0).sum())
+        }
+        if scored and predict_seconds * 1000 / scored > self.latency_budget_ms:
+            self._latency_fallback(predict_seconds * 1000 / scored, 'batch')
+            probs[:] = np.nan
+        return probs
+        
+    def combine_scores(self, tech_score, prob):
+        """Blend technical score and AI probability according to signal_mode
+
+        The probability is mapped to the [-2, 2] range of generate_signals;
+        where it is unavailable (NaN) the technical score is used.
+        """
+        if self.signal_mode == 'technical':
+            return tech_score
+        ai_score = (np.asarray(prob, dtype=np.float64) - 0.5) * 4
+        if self.signal_mode == 'ai':
+            combined = ai_score
         else:
-            return 0  # Hold
+            combined = (1 - HYBRID_AI_WEIGHT) * tech_score + HYBRID_AI_WEIGHT * ai_score
+        return np.where(np.isfinite(combined), combined, tech_score)
+        
+    def _ai_ready(self):
+        if self.use_ensemble:
+            return self.ensemble.is_trained
+        return self.ai_models.is_trained
+        
+    def _latency_fallback(self, elapsed_ms, path):
+        self.latency_fallbacks += 1
+        self.fallback_counter.inc()
+        self.events.warning('signal_latency', path=path, mode=self.signal_mode,
+                            elapsed_ms=round(elapsed_ms, 3), budget_ms=self.latency_budget_ms)
+        
+    def get_signal(self, df, bar_close=None):
+        """Get trading signal (live path: indicators and model on the latest bar)
+
+        bar_close: epoch seconds at which the latest bar closed; when given,
+        the delay from bar close to indicators and to the signal is recorded
+        in bar_close_latency_seconds. Only the last LIVE_WINDOW_BARS bars of df
+        are used. The latency budget is a hard limit: the model is skipped
+        when the indicators already used it up.
+        """
+        start = time.perf_counter()
+        df = self.calculate_indicators(df.iloc[-LIVE_WINDOW_BARS:])
+        score = self.generate_signals(df).iloc[-1]
+        indicators_done = time.perf_counter()
+        self.stage_latency['indicators'].record(indicators_done - start)
+        if bar_close is not None:
+            self.bar_latency['indicators'].record(time.time() - bar_close)
+        self.last_indicators = df.iloc[-1]
+        if self.recorder is not None:
+            self.recorder.indicators(df.index[-1], self.last_indicators.drop(['open', 'high', 'low', 'close', 'volume']))
+        
+        fallback = False
+        if self.signal_mode != 'technical' and self._ai_ready():
+            elapsed_ms = (indicators_done - start) * 1000
+            if elapsed_ms > self.latency_budget_ms:
+                # 指标阶段已超出预算：不再调用模型
+                self._latency_fallback(elapsed_ms, 'live')
+                fallback = True
+            else:
+                prob = self.ai_probability(df)
+                now = time.perf_counter()
+                self.stage_latency['model'].record(now - indicators_done)
+                elapsed_ms = (now - start) * 1000
+                if elapsed_ms > self.latency_budget_ms:
+                    # 超出预算：本根K线只用技术信号
+                    self._latency_fallback(elapsed_ms, 'live')
+                    fallback = True
+                else:
+                    score = float(self.combine_scores(score, prob))
+        
+        self.stage_latency['total'].record(time.perf_counter() - start)
+        if bar_close is not None:
+            self.bar_latency['signal'].record(time.time() - bar_close)
+        if score > SIGNAL_THRESHOLD:
+            signal = 1  # Buy signal
+        elif score < -SIGNAL_THRESHOLD:
+            signal = -1  # Sell signal
+        else:
+            signal = 0  # Hold
+        if self.recorder is not None:
+            self.recorder.signal(df.index[-1], signal, score, fallback)
+        return signal
+            
+    def precompute_signals(self, df, indicators_ready=False, probs=None):
+        """Signals for every bar at once (backtest path)
+
+        Indicators and model features only look backwards, so the technical
+        score of each bar does not depend on later bars (get_signal differs
+        only by the EMA warm-up of its LIVE_WINDOW_BARS window). Without
+        probs, model probabilities come from one batched predict of the
+        trained model; if their cost per bar exceeds the latency budget the
+        technical signal is used throughout. probs: per-bar probabilities
+        computed elsewhere (the out-of-sample walk_forward_probabilities of
+        run_backtest).
+        """
+        if not indicators_ready:
+            df = self.calculate_indicators(df)
+        scores = self.generate_signals(df).values
+        
+        if self.signal_mode != 'technical' and probs is not None:
+            scores = self.combine_scores(scores, probs)
+        elif self.signal_mode != 'technical' and self._ai_ready() and len(df):
+            start = time.perf_counter()
+            probs = self.ai_probabilities(df)
+            per_bar_ms = (time.perf_counter() - start) * 1000 / len(df)
+            if per_bar_ms > self.latency_budget_ms:
+                self._latency_fallback(per_bar_ms, 'batch')
+            else:
+                scores = self.combine_scores(scores, probs)
+        
+        return np.where(scores > SIGNAL_THRESHOLD, 1,
+                        np.where(scores < -SIGNAL_THRESHOLD, -1, 0)).astype(np.int8)
             
-    def update_position(self, price, signal):
+    def _trade_pnl(self, price):
+        """Fractional return of closing the current position at price"""
+        if self.position == 1:
+            return price / self.entry_price - 1
+        return self.entry_price / price - 1
+        
+    @staticmethod
+    def stop_distance(price, atr=None):
+        """Stop loss distance: ATR based when enabled and available, else STOP_LOSS_PCT"""
+        if USE_ATR_STOPS and atr is not None and np.isfinite(atr):
+            return ATR_MULTIPLIER * atr
+        return price * STOP_LOSS_PCT
+        
+    def update_position(self, price, signal, atr=None):
         """Update position based on signal"""
         if self.position == 0:  # No position
             if signal == 1:  # Buy signal
                 self.position = 1
                 self.entry_price = price
-                self.stop_loss = price * (1 - STOP_LOSS_PCT)
+                self.stop_loss = price - self.stop_distance(price, atr)
                 self.take_profit = price * (1 + TAKE_PROFIT_PCT)
                 self.max_drawdown = price
-                self.trades.append({
-                    'type': 'buy',
-                    'price': price,
-                    'time': pd.Timestamp.now()
-                })
+                self.trades.append(TradeType.BUY, price, pd.Timestamp.now())
             elif signal == -1:  # Sell signal
                 self.position = -1
                 self.entry_price = price
-                self.stop_loss = price * (1 + STOP_LOSS_PCT)
+                self.stop_loss = price + self.stop_distance(price, atr)
                 self.take_profit = price * (1 - TAKE_PROFIT_PCT)
                 self.max_drawdown = price
-                self.trades.append({
-                    'type': 'sell',
-                    'price': price,
-                    'time': pd.Timestamp.now()
-                })
+                self.trades.append(TradeType.SELL, price, pd.Timestamp.now())
         else:  # Has position
             if self.position == 1:  # Long position
                 if price < self.stop_loss:
+                    self.trades.append(TradeType.STOP_LOSS, price, pd.Timestamp.now(), self._trade_pnl(price))
                     self.position = 0
-                    self.trades.append({
-                        'type': 'stop_loss',
-                        'price': price,
-                        'time': pd.Timestamp.now()
-                    })
                 elif price > self.take_profit:
+                    self.trades.append(TradeType.TAKE_PROFIT, price, pd.Timestamp.now(), self._trade_pnl(price))
                     self.position = 0
-                    self.trades.append({
-                        'type': 'take_profit',
-                        'price': price,
-                        'time': pd.Timestamp.now()
-                    })
                 elif price > self.max_drawdown:
                     self.max_drawdown = price
                 elif (self.max_drawdown - price) / self.max_drawdown > MAX_DRAWDOWN_PCT:
+                    self.trades.append(TradeType.MAX_DRAWDOWN, price, pd.Timestamp.now(), self._trade_pnl(price))
                     self.position = 0
-                    self.trades.append({
-                        'type': 'max_drawdown',
-                        'price': price,
-                        'time': pd.Timestamp.now()
-                    })
             else:  # Short position
                 if price > self.stop_loss:
+                    self.trades.append(TradeType.STOP_LOSS, price, pd.Timestamp.now(), self._trade_pnl(price))
                     self.position = 0
-                    self.trades.append({
-                        'type': 'stop_loss',
-                        'price': price,
-                        'time': pd.Timestamp.now()
-                    })
                 elif price < self.take_profit:
+                    self.trades.append(TradeType.TAKE_PROFIT, price, pd.Timestamp.now(), self._trade_pnl(price))
                     self.position = 0
-                    self.trades.append({
-                        'type': 'take_profit',
-                        'price': price,
-                        'time': pd.Timestamp.now()
-                    })
                 elif price < self.max_drawdown:
                     self.max_drawdown = price
                 elif (price - self.max_drawdown) / self.max_drawdown > MAX_DRAWDOWN_PCT:
-                    self.position = 0
-                    self.trades.append({
-                        'type': 'max_drawdown',
-                        'price': price,
-                        'time': pd.Timestamp.now()
-                    }) 
\ No newline at end of file
+                    self.trades.append(TradeType.MAX_DRAWDOWN, price, pd.Timestamp.now(), self._trade_pnl(price))
+                    self.position = 0 
\ No newline at end of file
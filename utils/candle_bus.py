@@ -0,0 +1,326 @@
+"""Shared-memory ring buffer of closed candles (one writer, any number of readers)
+
+One ingestion process polls the exchange and publishes each closed candle
+once; strategy processes on the same host attach to the bus by name and
+read it without locks or copies. The shared block holds a small int64
+header and a float64 array of 2 * slots rows (timestamp ms, OHLCV):
+
+    header = magic, version, slots, bar ms, begin, end, writer pid, -
+    rows   = candle k is written to rows k % slots and k % slots + slots
+
+Because every candle is stored twice, any run of up to `slots` consecutive
+candles is one contiguous slice, so window() returns a NumPy view of the
+shared memory (strategy.live.candles_frame copies it once into the
+strategy's DataFrame). `end` counts published candles and `begin` the candles the
+writer has started; the writer raises begin, writes the rows, then raises
+end (a sequence lock). A reader takes a view of candles [a, b) with b <= end
+and afterwards checks valid(a): the rows are intact as long as
+begin <= a + slots. Readers that fall further behind than `slots` candles
+get an overrun instead of torn data.
+
+The sequence lock relies on the writer's aligned 8-byte stores becoming
+visible to other processes in program order, as they do on x86-64.
+Views returned by window() pin the shared memory: drop them before close().
+
+Wake-up: candles arrive minutes apart, so a waiting reader cannot keep
+spinning. Every reader binds a Unix datagram socket in wakeup_dir(name);
+after raising `end` the writer sends one byte to each of them, and wait()
+blocks in select() on its socket after a short spin. Fan-out latency is
+then the OS wake-up and scheduling latency (p50 around 0.4 ms for one
+reader on a single-core VM), and readers beyond the number of cores are
+served one after another. Only a candle that lands
+during the spin is seen within microseconds. Without AF_UNIX (Windows)
+readers fall back to polling every 0.5 ms.
+"""
+import os
+import select
+import socket
+import sys
+import tempfile
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from config.config import CANDLE_BUS_SLOTS, CANDLE_BUS_SPIN_SECONDS, CANDLE_BUS_SLEEP_SECONDS
+
+MAGIC = 0x4342555331  # 'CBUS1'
+VERSION = 1
+_HEADER_FIELDS = 8
+_MAGIC, _VERSION, _SLOTS, _BAR_MS, _BEGIN, _END, _PID = range(7)
+_COLUMNS = 6
+
+
+class BusOverrun(Exception):
+    """The reader fell more than `slots` candles behind the writer"""
+
+
+class BusInUse(FileExistsError):
+    """The bus already has a writer process that is still running"""
+
+
+def bus_name(symbol, timeframe, prefix='candles'):
+    """Shared memory name of the bus of one symbol / timeframe ('candles_BTC-USDT_1h')"""
+    return f"{prefix}_{symbol.replace('/', '-')}_{timeframe}"
+
+
+def wakeup_dir(name):
+    """Directory of the wake-up sockets of the readers of bus name"""
+    return os.path.join(tempfile.gettempdir(), f'{name}.wakeup')
+
+
+def _open_untracked(name):
+    """Open an existing block without registering it with the resource tracker"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # 没有 track 参数：登记后本进程退出时会 unlink 别人的共享内存
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _writer_pid(name):
+    """Writer pid stored in the header of an existing block, None if it is not a candle bus"""
+    shm = _open_untracked(name)
+    try:
+        if shm.size < _HEADER_FIELDS * 8:
+            return None
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        pid = int(header[_PID]) if header[_MAGIC] == MAGIC else None
+        del header
+        return pid
+    finally:
+        shm.close()
+
+
+def _alive(pid):
+    if os.name != 'posix':
+        return True  # Windows 在最后一个句柄关闭时释放共享内存：块还在说明写入端还在
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 进程存在，属于其他用户
+    return True
+
+
+class CandleBus:
+    """Ring of closed candles in a named shared memory block
+
+    CandleBus.create() makes the writer side, CandleBus.attach() a reader.
+    Sequence numbers count published candles from 0; candle k stays
+    readable until candle k + slots is published.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        if self.header[_MAGIC] != MAGIC or self.header[_VERSION] != VERSION:
+            raise ValueError(f"shared memory {shm.name!r} is not a candle bus")
+        self.slots = int(self.header[_SLOTS])
+        self.rows = np.ndarray((2 * self.slots, _COLUMNS), dtype=np.float64, buffer=shm.buf,
+                               offset=_HEADER_FIELDS * 8)
+        self.last = None  # 写入端：最后发布的K线时间戳
+        self.wakeup = None  # 读取端：唤醒用的 Unix 数据报套接字
+        self.wakeup_path = None
+        self.notifier = None  # 写入端：发送唤醒的套接字和读取端地址缓存
+        self.readers = []
+        self.readers_mtime = None
+
+    @classmethod
+    def create(cls, name, slots=CANDLE_BUS_SLOTS, bar_ms=0):
+        """New bus (writer side)
+
+        An existing block of the same name is replaced only when the writer
+        pid in its header is no longer running (a crashed writer); raises
+        BusInUse while that writer is alive.
+        """
+        size = _HEADER_FIELDS * 8 + 2 * slots * _COLUMNS * 8
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            pid = _writer_pid(name)
+            if pid is not None and _alive(pid):
+                raise BusInUse(f"candle bus {name!r} is in use by writer process {pid}") from None
+            # 上一个写入进程异常退出留下的块
+            old = shared_memory.SharedMemory(name=name)
+            old.close()
+            old.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_SLOTS] = slots
+        header[_BAR_MS] = bar_ms
+        header[_PID] = os.getpid()
+        header[_VERSION] = VERSION
+        header[_MAGIC] = MAGIC
+        bus = cls(shm, owner=True)
+        os.makedirs(wakeup_dir(name), exist_ok=True)
+        return bus
+
+    @classmethod
+    def attach(cls, name):
+        """Reader side of an existing bus; FileNotFoundError if no writer created it"""
+        bus = cls(_open_untracked(name), owner=False)
+        bus._register_wakeup(name)
+        return bus
+
+    def _register_wakeup(self, name):
+        if not hasattr(socket, 'AF_UNIX'):
+            return  # 无 Unix 套接字：wait() 轮询
+        directory = wakeup_dir(name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}-{id(self):x}')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(path)
+        except OSError:
+            sock.close()
+            return
+        sock.setblocking(False)
+        self.wakeup, self.wakeup_path = sock, path
+
+    def _notify(self):
+        """Wake the readers blocked in wait(); sockets of exited readers are removed"""
+        directory = wakeup_dir(self.shm.name)
+        try:
+            # 读取端列表只在目录变化（挂载 / 退出）时重新读取
+            mtime = os.stat(directory).st_mtime_ns
+            if mtime != self.readers_mtime:
+                self.readers = [os.path.join(directory, e) for e in os.listdir(directory)]
+                self.readers_mtime = mtime
+        except FileNotFoundError:
+            return
+        if self.notifier is None:
+            self.notifier = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.notifier.setblocking(False)
+        for path in self.readers:
+            try:
+                self.notifier.sendto(b'\0', path)
+            except BlockingIOError:
+                pass  # 读取端还有未处理的唤醒
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.remove(path)  # 读取进程已退出
+                except OSError:
+                    pass
+
+    @property
+    def seq(self):
+        """Number of candles published so far"""
+        return int(self.header[_END])
+
+    @property
+    def bar_ms(self):
+        return int(self.header[_BAR_MS])
+
+    def publish(self, rows):
+        """Append candles (rows of timestamp ms, open, high, low, close, volume); returns the new seq
+
+        Candles not newer than the last published one are skipped, so the
+        full kline window of every poll can be passed.
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, _COLUMNS)
+        if self.last is not None:
+            rows = rows[rows[:, 0] > self.last]
+        header, slots = self.header, self.slots
+        for row in rows:
+            k = int(header[_END])
+            header[_BEGIN] = k + 1
+            i = k % slots
+            self.rows[i] = row
+            self.rows[i + slots] = row
+            header[_END] = k + 1
+        if len(rows):
+            self.last = rows[-1, 0]
+            if hasattr(socket, 'AF_UNIX'):
+                self._notify()
+        return self.seq
+
+    def window(self, n, end=None):
+        """View (no copy) of the n candles before sequence number end (default: latest)
+
+        Check valid(end - n) after using it if the reader may lag.
+        """
+        end = self.seq if end is None else end
+        n = min(n, end, self.slots)
+        start = (end - n) % self.slots
+        return self.rows[start:start + n]
+
+    def valid(self, start):
+        """Whether candles from sequence number start on are still intact"""
+        return int(self.header[_BEGIN]) <= start + self.slots
+
+    def read(self, since):
+        """Copy of the candles published after sequence number since: (rows, new seq)
+
+        Raises BusOverrun if some of them were already overwritten.
+        """
+        end = self.seq
+        if end - since > self.slots:
+            raise BusOverrun(f"{end - since} candles behind, bus holds {self.slots}")
+        rows = self.window(end - since, end).copy()
+        if not self.valid(since):
+            raise BusOverrun(f"candles after {since} were overwritten while reading")
+        return rows, end
+
+    def wait(self, since, timeout=None, spin=CANDLE_BUS_SPIN_SECONDS):
+        """Block until seq > since; busy-polls for `spin` seconds, then blocks on the wake-up socket
+
+        Returns the new seq, or since on timeout.
+        """
+        header = self.header
+        start = time.perf_counter()
+        while header[_END] <= since:
+            elapsed = time.perf_counter() - start
+            if timeout is not None and elapsed >= timeout:
+                return since
+            if elapsed <= spin:
+                continue
+            # 写入端先提高 end 再发送唤醒，检查 end 之后到达的唤醒不会丢失
+            limit = CANDLE_BUS_SLEEP_SECONDS if timeout is None else min(CANDLE_BUS_SLEEP_SECONDS, timeout - elapsed)
+            if self.wakeup is None:
+                time.sleep(min(limit, 0.0005))
+            elif select.select([self.wakeup], [], [], limit)[0]:
+                self._drain()
+        return int(header[_END])
+
+    def _drain(self):
+        try:
+            while True:
+                self.wakeup.recv(64)
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        if self.wakeup is not None:
+            self.wakeup.close()
+            try:
+                os.remove(self.wakeup_path)
+                if not _alive(int(self.header[_PID])):
+                    os.rmdir(os.path.dirname(self.wakeup_path))  # 写入端先退出时由最后一个读取端清理
+            except OSError:
+                pass
+            self.wakeup = None
+        if self.notifier is not None:
+            self.notifier.close()
+            self.notifier = None
+        # 视图必须先释放，否则 SharedMemory.close() 报 BufferError
+        self.header = self.rows = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            try:
+                os.rmdir(wakeup_dir(self.shm.name))  # 读取端都已退出时
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
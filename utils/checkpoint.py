@@ -0,0 +1,68 @@
+"""Atomic checkpoint files for long-running jobs
+
+A checkpoint is one .npz file holding named arrays plus a JSON metadata
+entry. It is written to a temporary file and renamed over the previous one,
+so an interrupted write never leaves a corrupt checkpoint behind.
+"""
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from config.config import CHECKPOINT_INTERVAL_SECONDS
+
+CHECKPOINT_VERSION = 1
+
+
+def array_fingerprint(*arrays):
+    """Content hash of arrays (used to check a checkpoint belongs to the same data)"""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str(a.dtype).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def save_checkpoint(path, arrays, meta, compressed=False):
+    """Write arrays (name -> ndarray) and JSON-serializable meta to path atomically"""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = dict(meta, version=CHECKPOINT_VERSION, saved_at=time.time())
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        (np.savez_compressed if compressed else np.savez)(f, __meta__=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+def load_checkpoint(path):
+    """(arrays, meta) from save_checkpoint, or None if path does not exist"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        arrays = {k: data[k] for k in data.files if k != '__meta__'}
+        meta = json.loads(data['__meta__'].tobytes().decode())
+    if meta.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version {meta.get('version')} in {path}")
+    return arrays, meta
+
+
+class CheckpointTimer:
+    """Decides when the next periodic snapshot is due and tracks time spent saving"""
+
+    def __init__(self, interval=CHECKPOINT_INTERVAL_SECONDS):
+        self.interval = interval
+        self.last = time.perf_counter()
+        self.saves = 0
+        self.save_time = 0.0
+
+    def due(self):
+        return time.perf_counter() - self.last >= self.interval
+
+    def save(self, path, arrays, meta):
+        start = time.perf_counter()
+        save_checkpoint(path, arrays, meta)
+        self.last = time.perf_counter()
+        self.saves += 1
+        self.save_time += self.last - start
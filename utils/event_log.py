@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+# 日志级别（与标准库 logging 数值一致）
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+_NAME_LEVELS = {name: level for level, name in _LEVEL_NAMES.items()}
+
+_STOP = object()
+
+
+def parse_level(level):
+    """Accept a level number or name ('INFO', 'debug', ...)"""
+    if isinstance(level, str):
+        return _NAME_LEVELS[level.upper()]
+    return int(level)
+
+
+class EventLog:
+    """Structured event log with an in-memory ring buffer and a JSONL writer
+
+    emit() is cheap: events below `level` are dropped immediately, the rest
+    go into a bounded ring buffer and, when a file is open, onto a queue that
+    a background thread drains in batches. Only events at or above
+    `console_level` are printed, so the backtest loop stays silent by default.
+    """
+
+    def __init__(self, level=INFO, console_level=WARNING, buffer_size=10000,
+                 batch_size=512, flush_interval=1.0):
+        self.level = parse_level(level)
+        self.console_level = parse_level(console_level)
+        self.buffer = deque(maxlen=buffer_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.path = None
+        self._queue = None
+        self._writer = None
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, level, event, **fields):
+        """Record one event with arbitrary JSON-serializable fields"""
+        if level < self.level:
+            return
+        record = (time.time(), level, event, fields)
+        self.buffer.append(record)
+        if self._queue is not None:
+            self._queue.put(record)
+        if level >= self.console_level:
+            details = ' '.join(f"{k}={v}" for k, v in fields.items())
+            print(f"[{_LEVEL_NAMES.get(level, level)}] {event} {details}".rstrip())
+
+    def debug(self, event, **fields):
+        self.emit(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.emit(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.emit(WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.emit(ERROR, event, **fields)
+
+    @staticmethod
+    def _to_dict(record):
+        ts, level, event, fields = record
+        return {'ts': ts, 'level': _LEVEL_NAMES.get(level, level), 'event': event,
+                'pid': os.getpid(), **fields}
+
+    def recent(self, n=None, event=None):
+        """Latest events from the ring buffer as dicts, optionally filtered by name"""
+        records = [r for r in self.buffer if event is None or r[2] == event]
+        if n is not None:
+            records = records[-n:]
+        return [self._to_dict(r) for r in records]
+
+    def open(self, path):
+        """Start the background writer appending batches to a JSONL file
+
+        A '{pid}' placeholder in path is replaced by the process id, so
+        parallel sweep workers write to separate files.
+        """
+        self.close()
+        self.path = path.replace('{pid}', str(os.getpid()))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name='event-log-writer', daemon=True)
+        self._writer.start()
+
+    def close(self):
+        """Flush pending events and stop the writer thread"""
+        if self._writer is None:
+            return
+        self._queue.put(_STOP)
+        self._writer.join()
+        self._writer = None
+        self._queue = None
+
+    def _write_loop(self):
+        q = self._queue
+        with open(self.path, 'a', encoding='utf-8') as f:
+            running = True
+            while running:
+                batch = []
+                try:
+                    item = q.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+                while True:
+                    if item is _STOP:
+                        running = False
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    f.write(''.join(json.dumps(self._to_dict(r), ensure_ascii=False, default=str) + '\n'
+                                    for r in batch))
+                    f.flush()
+
+
+_event_log = None
+
+
+def get_event_log():
+    """Process-wide event log configured from config.py"""
+    global _event_log
+    if _event_log is None:
+        from config.config import EVENT_LOG_LEVEL, EVENT_CONSOLE_LEVEL, EVENT_BUFFER_SIZE
+        _event_log = EventLog(level=EVENT_LOG_LEVEL, console_level=EVENT_CONSOLE_LEVEL,
+                              buffer_size=EVENT_BUFFER_SIZE)
+    return _event_log
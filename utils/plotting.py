@@ -0,0 +1,140 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# 单线程后台绘图执行器（Agg 渲染不依赖 GUI，串行执行避免 matplotlib 全局状态竞争）
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """Get the shared background plotting executor"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plot-worker')
+        return _executor
+
+
+def lttb_downsample(y, n_out, x=None):
+    """Downsample a curve with Largest-Triangle-Three-Buckets
+
+    Returns (x, y) arrays with at most n_out points. The first and last
+    points are always kept; each bucket in between keeps the point that
+    forms the largest triangle with its neighbours, which preserves peaks
+    and troughs far better than plain striding.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if x is None:
+        x = np.arange(n, dtype=np.float64)
+    else:
+        x = np.asarray(x, dtype=np.float64)
+
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # Bucket boundaries for the n-2 interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # Average point of every bucket, used as the third triangle vertex
+    counts = np.diff(edges)
+    counts[counts == 0] = 1
+    x_avg = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    y_avg = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if end <= start:
+            end = start + 1
+        if i + 1 < n_out - 2:
+            cx, cy = x_avg[i + 1], y_avg[i + 1]
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        ax, ay = x[prev], y[prev]
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return x[selected], y[selected]
+
+
+def _plot_series(ax, y, label, color, title, ylabel, max_points):
+    """Plot one (downsampled) series onto an axis"""
+    xs, ys = lttb_downsample(y, max_points)
+    ax.plot(xs, ys, label=label, color=color)
+    ax.set_title(title)
+    ax.set_xlabel('Time')
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    ax.legend()
+
+
+def render_backtest_charts(equity_curve, price_curve, output_dir='reports',
+                           formats=('png', 'svg'), max_points=2000, dpi=100):
+    """Render equity and price charts to files without any GUI backend
+
+    Uses matplotlib's object-oriented API with the Agg canvas directly, so it
+    never touches pyplot's global figure manager and is safe to call from a
+    worker thread on a headless machine. Returns the list of written paths.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    os.makedirs(output_dir, exist_ok=True)
+    charts = [
+        ('equity_curve', equity_curve, 'Equity Curve', 'blue', 'Equity Curve', 'Equity (USDT)'),
+        ('price_chart', price_curve, 'Price', 'green', 'Price Chart', 'Price (USDT)'),
+    ]
+
+    paths = []
+    for name, series, label, color, title, ylabel in charts:
+        fig = Figure(figsize=(12, 5))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(1, 1, 1)
+        _plot_series(ax, series, label, color, title, ylabel, max_points)
+        fig.tight_layout()
+        for fmt in formats:
+            path = os.path.join(output_dir, f'{name}.{fmt}')
+            fig.savefig(path, format=fmt, dpi=dpi)
+            paths.append(path)
+    return paths
+
+
+def render_charts_async(equity_curve, price_curve, **kwargs):
+    """Render charts on the background plotting worker
+
+    The curves are copied before submission so the caller can keep mutating
+    its buffers. Returns a Future resolving to the list of written paths.
+    """
+    equity = np.array(equity_curve, dtype=np.float64, copy=True)
+    price = np.array(price_curve, dtype=np.float64, copy=True)
+    return _get_executor().submit(render_backtest_charts, equity, price, **kwargs)
+
+
+def show_interactive(equity_curve, price_curve, max_points=2000):
+    """Show the charts in a blocking GUI window (desktop use only)"""
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8), gridspec_kw={'height_ratios': [2, 1]})
+    # 最大化窗口（Windows下）
+    try:
+        fig.canvas.manager.window.state('zoomed')
+    except Exception:
+        try:
+            fig.canvas.manager.window.showMaximized()
+        except Exception:
+            pass  # 兼容不同平台
+    _plot_series(ax1, equity_curve, 'Equity Curve', 'blue', 'Equity Curve', 'Equity (USDT)', max_points)
+    _plot_series(ax2, price_curve, 'Price', 'green', 'Price Chart', 'Price (USDT)', max_points)
+    # 自适应布局
+    plt.tight_layout()
+    fig.autofmt_xdate()
+    plt.show(block=True)
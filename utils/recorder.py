@@ -0,0 +1,203 @@
+"""Append-only binary session log of the live loop
+
+A session file starts with MAGIC and holds compressed blocks:
+
+    block  = <u32 compressed size> <u32 raw size> <u8 codec> <payload>
+    record = <u32 body size> <u8 kind> <f64 wall-clock time> <body>
+
+Records are buffered and written as one block when RECORD_BLOCK_BYTES is
+reached (and on flush / close), so a crash loses at most the last block and
+a truncated trailing block is ignored by read_records(). Blocks are zstd
+compressed when the optional `zstandard` package is installed, else zlib;
+the codec is stored per block.
+
+MARKET bodies are binary: the kline window (timestamp ms, OHLCV as float64)
+delta-encoded against the previous window, since every poll returns mostly
+the same candles. The other kinds carry JSON.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from config.config import RECORD_BLOCK_BYTES
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'BTCREC1\n'
+# 记录类型
+SESSION, MARKET, INDICATORS, SIGNAL, ORDER_REQUEST, ORDER_RESPONSE = range(6)
+KIND_NAMES = ('session', 'market', 'indicators', 'signal', 'order_request', 'order_response')
+CODEC_ZLIB, CODEC_ZSTD = 1, 2
+
+_BLOCK = struct.Struct('<IIB')
+_RECORD = struct.Struct('<IBd')
+_MARKET = struct.Struct('<III')  # skip, reuse, new rows
+
+
+def _compress(raw):
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress(raw)
+    return CODEC_ZLIB, zlib.compress(raw, 6)
+
+
+def _decompress(codec, payload, raw_size):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ImportError("this session log is zstd compressed: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload, max_output_size=raw_size)
+    return zlib.decompress(payload)
+
+
+def _to_json(obj):
+    return json.dumps(obj, default=lambda v: v.item() if hasattr(v, 'item') else str(v)).encode()
+
+
+class SessionRecorder:
+    """Writes the records of one live session to path (appending)
+
+    Calls are thread-safe; each one only packs bytes into the current
+    block, compression and the write happen once per block. clock supplies
+    the record timestamps (simulated sessions pass the bar clock).
+    """
+
+    def __init__(self, path, block_bytes=RECORD_BLOCK_BYTES, clock=time.time, **session):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.path = path
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(MAGIC)
+        self.block_bytes = block_bytes
+        self.clock = clock
+        self.buffer = bytearray()
+        self.window = None  # 上一次收到的K线窗口（增量编码）
+        self.records = 0
+        self.blocks = 0
+        self.bytes_raw = 0
+        self.lock = threading.Lock()
+        if session:
+            self.session(**session)
+
+    def _append(self, kind, body, t=None):
+        with self.lock:
+            self._append_locked(kind, body, t)
+
+    def _append_locked(self, kind, body, t=None):
+        # 调用方持有 self.lock
+        self.buffer += _RECORD.pack(len(body), kind, self.clock() if t is None else t)
+        self.buffer += body
+        self.records += 1
+        if len(self.buffer) >= self.block_bytes:
+            self._write_block()
+
+    def _write_block(self):
+        if not self.buffer:
+            return
+        raw = bytes(self.buffer)
+        codec, payload = _compress(raw)
+        self.file.write(_BLOCK.pack(len(payload), len(raw), codec))
+        self.file.write(payload)
+        self.bytes_raw += len(raw)
+        self.blocks += 1
+        self.buffer.clear()
+
+    def session(self, **info):
+        """Session header: symbol, timeframe, settings, ..."""
+        self._append(SESSION, _to_json(info))
+
+    def market(self, ohlcv, t=None):
+        """Kline window as received (rows of timestamp ms, open, high, low, close, volume)"""
+        window = np.asarray(ohlcv, dtype=np.float64).reshape(-1, 6)
+        # 增量以上一条记录为基准：比较、替换和写入必须在同一把锁内完成
+        with self.lock:
+            skip = reuse = 0
+            prev = self.window
+            if prev is not None and len(window):
+                # 只记录与上一窗口不同的部分：丢弃开头 skip 行，复用随后 reuse 行
+                skip = int(np.searchsorted(prev[:, 0], window[0, 0]))
+                n = min(len(prev) - skip, len(window))
+                same = (window[:n] == prev[skip:skip + n]).all(axis=1)
+                reuse = n if same.all() else int(np.argmin(same))
+            self.window = window
+            body = _MARKET.pack(skip, reuse, len(window) - reuse) + window[reuse:].tobytes()
+            self._append_locked(MARKET, body, t)
+
+    def indicators(self, bar_time, values, t=None):
+        """Indicator snapshot of the latest bar (dict or Series of floats)"""
+        self._append(INDICATORS, _to_json({'time': str(bar_time), 'values': dict(values)}), t)
+
+    def signal(self, bar_time, signal, score, fallback=False, t=None):
+        """Decision of get_signal; fallback: the model was skipped (latency budget)"""
+        self._append(SIGNAL, _to_json({'time': str(bar_time), 'signal': int(signal),
+                                       'score': float(score), 'fallback': bool(fallback)}), t)
+
+    def order_request(self, request, t=None):
+        self._append(ORDER_REQUEST, _to_json(request), t)
+
+    def order_response(self, response, t=None):
+        self._append(ORDER_RESPONSE, _to_json(response), t)
+
+    def flush(self):
+        with self.lock:
+            self._write_block()
+            self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_blocks(path):
+    """Decompressed blocks of a session file; stops at a truncated trailing block"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        while True:
+            header = f.read(_BLOCK.size)
+            if len(header) < _BLOCK.size:
+                return
+            size, raw_size, codec = _BLOCK.unpack(header)
+            payload = f.read(size)
+            if len(payload) < size:
+                return  # 写入中断留下的半个块
+            yield _decompress(codec, payload, raw_size)
+
+
+def read_records(path, decode=True):
+    """Yield (kind, time, body) for every record
+
+    With decode, MARKET bodies become the full kline window (ndarray of
+    shape (n, 6)) and the other bodies dicts; otherwise bodies stay bytes.
+    """
+    window = np.empty((0, 6))
+    for raw in iter_blocks(path):
+        view = memoryview(raw)
+        pos = 0
+        while pos < len(raw):
+            size, kind, t = _RECORD.unpack_from(view, pos)
+            pos += _RECORD.size
+            body = view[pos:pos + size]
+            pos += size
+            if not decode:
+                yield kind, t, bytes(body)
+            elif kind == MARKET:
+                skip, reuse, rows = _MARKET.unpack_from(body)
+                new = np.frombuffer(body, dtype=np.float64, offset=_MARKET.size).reshape(rows, 6)
+                window = np.concatenate([window[skip:skip + reuse], new])
+                yield kind, t, window
+            else:
+                yield kind, t, json.loads(bytes(body))
@@ -1,17 +1,17 @@
 import os
 import json
 from datetime import datetime
-import pandas as pd
 
 class ReportGenerator:
-    def __init__(self):
+    def __init__(self, report_dir='reports'):
+        self.report_dir = report_dir
         self.report_data = {}
         self.run_count = 0
         self.load_run_history()
     
     def load_run_history(self):
         """加载运行历史记录"""
-        history_file = 'run_history.json'
+        history_file = self._path('run_history.json')
         if os.path.exists(history_file):
             try:
                 with open(history_file, 'r', encoding='utf-8') as f:
@@ -22,9 +22,23 @@ class ReportGenerator:
         else:
             self.report_data = {'runs': []}
     
+    def _path(self, filename):
+        """报告文件路径"""
+        return os.path.join(self.report_dir, filename)
+    
+    @staticmethod
+    def _profit_factor(metrics):
+        """盈亏比的 Markdown 文本：None（没有亏损交易）显示为 ∞"""
+        if 'profit_factor' not in metrics:
+            return 'N/A'
+        value = metrics['profit_factor']
+        # 旧版本的运行历史里可能是 Infinity
+        return '∞' if value is None or value == float('inf') else f'{value:.2f}'
+    
     def save_run_history(self):
         """保存运行历史记录"""
-        with open('run_history.json', 'w', encoding='utf-8') as f:
+        os.makedirs(self.report_dir, exist_ok=True)
+        with open(self._path('run_history.json'), 'w', encoding='utf-8') as f:
             json.dump(self.report_data, f, ensure_ascii=False, indent=2)
     
     def update_report(self, metrics, ai_models_info, run_time=None):
@@ -53,6 +67,7 @@ class ReportGenerator:
     
     def generate_reports(self):
         """生成所有报告文件"""
+        os.makedirs(self.report_dir, exist_ok=True)
         self.generate_detailed_report()
         self.generate_executive_summary()
         self.generate_trend_analysis()
@@ -108,10 +123,10 @@ class ReportGenerator:
 
 ## AI模型训练结果
 
-### 模型1性能指标
-- **训练样本数**: {ai_models.get('model1_samples', 'N/A')}个
+### 模型1性能指标（随机森林，回测中走步训练）
+- **训练样本数**: {ai_models.get('model1_samples', 'N/A')}个（最后一次训练）
 - **类别分布**: 买入信号 {ai_models.get('model1_buy', 'N/A')}个, 卖出信号 {ai_models.get('model1_sell', 'N/A')}个
-- **训练准确率**: {ai_models.get('model1_accuracy', 'N/A')}%
+- **样本外准确率**: {ai_models.get('model1_accuracy', 'N/A')}%
 - **训练时间**: {ai_models.get('model1_time', 'N/A')}秒
 
 ### 模型2性能指标
@@ -130,6 +145,7 @@ class ReportGenerator:
 | **最大回撤** | {metrics.get('max_drawdown', 'N/A')}% | {'⚠️ 风险较高' if metrics.get('max_drawdown', 0) > 20 else '✅ 风险可控'} |
 | **夏普比率** | {metrics.get('sharpe_ratio', 'N/A')} | {'❌ 负值，表现不佳' if metrics.get('sharpe_ratio', 0) < 0 else '✅ 表现良好'} |
 | **胜率** | {metrics.get('win_rate', 'N/A')}% | {'❌ 过低' if metrics.get('win_rate', 0) < 30 else '✅ 可接受'} |
+| **盈亏比** | {self._profit_factor(metrics)} | {'❌ 低于 1' if (metrics.get('profit_factor') is not None and metrics['profit_factor'] < 1) else '✅ 盈利大于亏损'} |
 | **总交易次数** | {metrics.get('total_trades', 'N/A')}次 | ✅ 交易活跃 |
 
 ### 交易活动详情
@@ -150,7 +166,7 @@ class ReportGenerator:
 
 ### 🟡 中等风险因素
 1. **交易频率**: {metrics.get('total_trades', 'N/A')}次交易显示策略较为活跃
-2. **模型准确率**: {ai_models.get('model1_accuracy', 'N/A')}-{ai_models.get('model2_accuracy', 'N/A')}%的训练准确率有提升空间
+2. **模型准确率**: {ai_models.get('model1_accuracy', 'N/A')}-{ai_models.get('model2_accuracy', 'N/A')}%的模型准确率有提升空间
 
 ## 优化建议
 
@@ -219,7 +235,7 @@ AI Trader BTC-USDT项目在技术实现上表现良好，所有核心功能正
 **运行次数**: 第{self.run_count}次
 """
         
-        with open('test_report.md', 'w', encoding='utf-8') as f:
+        with open(self._path('test_report.md'), 'w', encoding='utf-8') as f:
             f.write(report_content)
     
     def generate_executive_summary(self):
@@ -255,7 +271,7 @@ AI Trader BTC-USDT项目在技术实现上表现良好，所有核心功能正
 
 ## 🤖 AI模型表现
 
-- **模型1准确率**: {ai_models.get('model1_accuracy', 'N/A')}% ({ai_models.get('model1_samples', 'N/A')}样本)
+- **模型1样本外准确率**: {ai_models.get('model1_accuracy', 'N/A')}% ({ai_models.get('model1_samples', 'N/A')}样本)
 - **模型2准确率**: {ai_models.get('model2_accuracy', 'N/A')}% ({ai_models.get('model2_samples', 'N/A')}样本)
 - **训练时间**: <2秒
 - **状态**: ✅ 运行正常，需优化
@@ -299,7 +315,7 @@ AI Trader BTC-USDT项目在技术实现上表现良好，所有核心功能正
 *运行次数: 第{self.run_count}次*
 """
         
-        with open('executive_summary.md', 'w', encoding='utf-8') as f:
+        with open(self._path('executive_summary.md'), 'w', encoding='utf-8') as f:
             f.write(summary_content)
     
     def generate_trend_analysis(self):
@@ -357,7 +373,7 @@ AI Trader BTC-USDT项目在技术实现上表现良好，所有核心功能正
 *报告生成: {datetime.now().strftime("%Y年%m月%d日 %H:%M:%S")}*
 """
         
-        with open('trend_analysis.md', 'w', encoding='utf-8') as f:
+        with open(self._path('trend_analysis.md'), 'w', encoding='utf-8') as f:
             f.write(trend_content)
     
     def calculate_trend(self):
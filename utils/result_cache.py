@@ -0,0 +1,127 @@
+"""On-disk cache of backtest results
+
+A result is keyed by a hash of everything that determines it: the candles
+of the backtested range, the engine parameters, the public values of
+config.config (credentials excluded) and the source of the strategy,
+backtest and AI modules. Entries are compressed .npz files (curves and
+trade log as arrays, metrics as JSON metadata) written atomically with
+utils.checkpoint; the directory is kept under RESULT_CACHE_MAX_MB by
+deleting the least recently used entries.
+"""
+import glob
+import hashlib
+import json
+import os
+from config.config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB
+from utils.checkpoint import array_fingerprint, load_checkpoint, save_checkpoint
+
+# 参与代码版本哈希的源码（修改任何一个都会使缓存失效）
+CODE_PATHS = ('ai/*.py', 'backtest/*.py', 'strategy/*.py', 'config/config.py', 'utils/trade_log.py')
+_SECRET_WORDS = ('KEY', 'SECRET', 'PASSPHRASE', 'PASSWORD')
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_code_version = None
+
+
+def code_version():
+    """Hash of the source files in CODE_PATHS (computed once per process)"""
+    global _code_version
+    if _code_version is None:
+        h = hashlib.blake2b(digest_size=16)
+        for pattern in CODE_PATHS:
+            for path in sorted(glob.glob(os.path.join(_ROOT, pattern))):
+                h.update(os.path.relpath(path, _ROOT).encode())
+                with open(path, 'rb') as f:
+                    h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def config_params():
+    """Public upper-case settings of config.config (env overrides included)"""
+    from config import config
+    params = {}
+    for name in dir(config):
+        if not name.isupper() or any(word in name for word in _SECRET_WORDS):
+            continue
+        value = getattr(config, name)
+        if isinstance(value, (bool, int, float, str, tuple, list, dict, type(None))):
+            params[name] = value
+    return params
+
+
+def result_key(times, *arrays, **params):
+    """Cache key of a backtest over the given per-bar arrays with params"""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(array_fingerprint(times, *arrays).encode())
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(json.dumps(config_params(), sort_keys=True, default=str).encode())
+    h.update(code_version().encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded directory of results; get() marks an entry as recently used"""
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_mb=RESULT_CACHE_MAX_MB):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        """(arrays, meta) stored under key, or None"""
+        path = self._path(key)
+        try:
+            entry = load_checkpoint(path)
+        except (OSError, ValueError, KeyError):
+            entry = None  # 损坏或旧版本的条目按未命中处理
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # LRU：按修改时间淘汰
+        except OSError:
+            pass  # 其他进程刚刚淘汰了该条目
+        self.hits += 1
+        return entry
+
+    def put(self, key, arrays, meta):
+        save_checkpoint(self._path(key), arrays, meta, compressed=True)
+        self.evict()
+
+    def entries(self):
+        """[(path, size, mtime)] oldest first"""
+        out = []
+        for path in glob.glob(os.path.join(self.directory, '*.npz')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            out.append((path, st.st_size, st.st_mtime))
+        return sorted(out, key=lambda e: e[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits max_mb"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
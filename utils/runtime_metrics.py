@@ -0,0 +1,272 @@
+"""In-process runtime metrics: counters, gauges and latency histograms
+
+Meant for the live trading loop: recording is a few integer operations on
+a per-thread shard (no locks; every thread writes only its own shard and
+readers sum the shards), so a histogram sample costs well under a
+microsecond. Histograms use HDR-style log-linear buckets over integer
+nanoseconds (2**HISTOGRAM_SUB_BITS buckets per power of two, about 3%
+relative error) and report quantiles without storing samples.
+
+The registry is exported as Prometheus text on /metrics and as JSON on
+/metrics.json by start_http_server(); `main.py metrics` prints a snapshot.
+"""
+import json
+import threading
+import time
+from config.config import METRICS_HOST, METRICS_PORT
+
+HISTOGRAM_SUB_BITS = 5
+_SUB = 1 << HISTOGRAM_SUB_BITS
+_N_BUCKETS = 64 * _SUB
+# Prometheus 导出的桶边界（秒）
+EXPORT_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket_bounds(idx):
+    """[lower, upper) of a histogram bucket in nanoseconds"""
+    if idx < 2 * _SUB:
+        return idx, idx + 1
+    shift = idx // _SUB - 1
+    mantissa = idx - shift * _SUB
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self._shards = {}
+
+    def inc(self, n=1):
+        shard = self._shards.get(threading.get_ident())
+        if shard is None:
+            shard = self._shards.setdefault(threading.get_ident(), [0])
+        shard[0] += n
+
+    @property
+    def value(self):
+        return sum(s[0] for s in list(self._shards.values()))
+
+
+class Gauge:
+    """Last value wins"""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Latency histogram in seconds with HDR-style buckets"""
+
+    def __init__(self):
+        self._shards = {}  # thread id -> [bucket counts, [count, sum_ns, max_ns]]
+
+    def _shard(self):
+        return self._shards.setdefault(threading.get_ident(), ([0] * _N_BUCKETS, [0, 0, 0]))
+
+    def record(self, seconds):
+        ns = int(seconds * 1e9)
+        if ns < 0:
+            ns = 0
+        shift = ns.bit_length() - HISTOGRAM_SUB_BITS - 1
+        idx = ns if shift <= 0 else shift * _SUB + (ns >> shift)
+        shard = self._shards.get(threading.get_ident()) or self._shard()
+        shard[0][idx if idx < _N_BUCKETS else _N_BUCKETS - 1] += 1
+        stats = shard[1]
+        stats[0] += 1
+        stats[1] += ns
+        if ns > stats[2]:
+            stats[2] = ns
+
+    def time(self):
+        """Context manager recording the duration of the block (convenience, not for hot loops)"""
+        return _Timer(self)
+
+    def merged(self):
+        """(bucket counts, count, sum_ns, max_ns) over all threads"""
+        counts = [0] * _N_BUCKETS
+        count = total = peak = 0
+        for buckets, stats in list(self._shards.values()):
+            for i, c in enumerate(buckets):
+                if c:
+                    counts[i] += c
+            count += stats[0]
+            total += stats[1]
+            peak = max(peak, stats[2])
+        return counts, count, total, peak
+
+    def summary(self, quantiles=QUANTILES):
+        """count, mean, max and quantiles in seconds"""
+        counts, count, total, peak = self.merged()
+        out = {'count': count, 'mean': total / count / 1e9 if count else 0.0, 'max': peak / 1e9}
+        targets = sorted(quantiles)
+        seen = 0
+        q = 0
+        for idx, c in enumerate(counts):
+            if not c:
+                continue
+            seen += c
+            while q < len(targets) and seen >= targets[q] * count:
+                lower, upper = _bucket_bounds(idx)
+                out[f'p{targets[q] * 100:g}'] = min((lower + upper) / 2, peak) / 1e9
+                q += 1
+        for t in targets[q:]:
+            out[f'p{t * 100:g}'] = 0.0
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+
+
+_TYPES = {Counter: 'counter', Gauge: 'gauge', Histogram: 'histogram'}
+
+
+class MetricsRegistry:
+    """Named metrics with optional labels, created on first use"""
+
+    def __init__(self):
+        self._metrics = {}  # (name, labels) -> metric
+        self._help = {}
+        self._lock = threading.Lock()  # 只在创建指标时加锁
+
+    def _get(self, cls, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls()
+                    self._help.setdefault(name, (help, _TYPES[cls]))
+        if not isinstance(metric, cls):
+            raise TypeError(f"metric {name} is a {type(metric).__name__}, not a {cls.__name__}")
+        return metric
+
+    def counter(self, name, help='', **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help='', **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help='', **labels):
+        return self._get(Histogram, name, help, labels)
+
+    def snapshot(self):
+        """JSON-serializable dict: name -> list of {labels, value | summary}"""
+        out = {}
+        for (name, labels), metric in sorted(self._metrics.items()):
+            entry = {'labels': dict(labels)}
+            if isinstance(metric, Histogram):
+                entry.update(metric.summary())
+            else:
+                entry['value'] = metric.value
+            out.setdefault(name, []).append(entry)
+        return out
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        families = {}
+        for (name, labels), metric in sorted(self._metrics.items()):
+            families.setdefault(name, []).append((labels, metric))
+        for name, members in families.items():
+            help, kind = self._help[name]
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, metric in members:
+                if isinstance(metric, Histogram):
+                    counts, count, total, _ = metric.merged()
+                    cumulative = 0
+                    idx = 0
+                    for bound in EXPORT_BUCKETS:
+                        # 中点不超过边界的 HDR 桶计入该 le
+                        while idx < _N_BUCKETS and sum(_bucket_bounds(idx)) / 2 <= bound * 1e9:
+                            cumulative += counts[idx]
+                            idx += 1
+                        lines.append(f'{name}_bucket{_labels(labels, le=f"{bound:g}")} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {total / 1e9:.9g}')
+                    lines.append(f'{name}_count{_labels(labels)} {count}')
+                else:
+                    lines.append(f'{name}{_labels(labels)} {metric.value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+_REGISTRY = MetricsRegistry()
+
+
+def get_registry():
+    """Process-wide metrics registry"""
+    return _REGISTRY
+
+
+def start_http_server(port=METRICS_PORT, host=METRICS_HOST, registry=None):
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread
+
+    Returns the server; server.server_address holds the bound address
+    (port=0 picks a free port).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    registry = registry or _REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body = registry.render_prometheus().encode()
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                body = json.dumps(registry.snapshot()).encode()
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # 不在终端打印每次抓取
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def format_snapshot(snapshot):
+    """Plain-text table of a registry snapshot (latencies in milliseconds)"""
+    lines = []
+    for name, entries in snapshot.items():
+        for e in entries:
+            labels = ','.join(f'{k}={v}' for k, v in e['labels'].items())
+            title = f'{name}{{{labels}}}' if labels else name
+            if 'value' in e:
+                lines.append(f'{title:<60} {e["value"]:g}')
+            else:
+                quantiles = ' '.join(f'{k}={v * 1000:.3f}' for k, v in e.items() if k.startswith('p'))
+                lines.append(f'{title:<60} n={e["count"]} mean={e["mean"] * 1000:.3f} '
+                             f'{quantiles} max={e["max"] * 1000:.3f} ms')
+    return '\n'.join(lines)
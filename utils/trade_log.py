@@ -0,0 +1,165 @@
+from enum import IntEnum
+import numpy as np
+
+
+class TradeType(IntEnum):
+    """Trade record types, stored as uint8 codes in TradeLog"""
+    BUY = 0
+    SELL = 1
+    STOP_LOSS = 2
+    TAKE_PROFIT = 3
+    MAX_DRAWDOWN = 4
+    SIGNAL_EXIT = 5
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+
+_LABELS = np.array([t.label for t in TradeType])
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("pyarrow is required for Arrow/Parquet export: pip install pyarrow") from e
+    return pa
+
+
+class TradeLog:
+    """Growable columnar trade log
+
+    Each field lives in its own preallocated NumPy array (time as
+    datetime64[ns], type as uint8 TradeType code, price and pnl as float64)
+    that doubles in capacity when full. Keeping the columns contiguous lets
+    to_arrow() wrap them without copying. Entry records carry pnl = NaN,
+    exit records carry the fractional return of the closed trade.
+    """
+
+    def __init__(self, capacity=64):
+        capacity = max(int(capacity), 1)
+        self._time = np.empty(capacity, dtype='datetime64[ns]')
+        self._type = np.empty(capacity, dtype=np.uint8)
+        self._price = np.empty(capacity, dtype=np.float64)
+        self._pnl = np.empty(capacity, dtype=np.float64)
+        self._size = 0
+
+    @classmethod
+    def from_arrays(cls, times, types, prices, pnls):
+        """Log holding the given columns (as returned by times / types / prices / pnls)"""
+        log = cls(len(prices))
+        n = len(prices)
+        log._time[:n] = times
+        log._type[:n] = types
+        log._price[:n] = prices
+        log._pnl[:n] = pnls
+        log._size = n
+        return log
+
+    def _grow(self):
+        capacity = len(self._price) * 2
+        for name in ('_time', '_type', '_price', '_pnl'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, trade_type, price, time, pnl=np.nan):
+        """Append one trade record"""
+        if self._size == len(self._price):
+            self._grow()
+        i = self._size
+        self._time[i] = time if isinstance(time, np.datetime64) else np.datetime64(time, 'ns')
+        self._type[i] = trade_type
+        self._price[i] = price
+        self._pnl[i] = pnl
+        self._size += 1
+
+    def clear(self):
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __getitem__(self, i):
+        """Single record as a dict (compatible with the old list-of-dicts format)"""
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('trade index out of range')
+        record = {
+            'type': str(_LABELS[self._type[i]]),
+            'price': float(self._price[i]),
+            'time': self._time[i]
+        }
+        if not np.isnan(self._pnl[i]):
+            record['pnl'] = float(self._pnl[i])
+        return record
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self[i]
+
+    # Column views (no copies)
+    @property
+    def times(self):
+        return self._time[:self._size]
+
+    @property
+    def types(self):
+        return self._type[:self._size]
+
+    @property
+    def prices(self):
+        return self._price[:self._size]
+
+    @property
+    def pnls(self):
+        return self._pnl[:self._size]
+
+    def closed_pnls(self):
+        """Fractional returns of all closed trades"""
+        pnls = self.pnls
+        return pnls[~np.isnan(pnls)]
+
+    def count(self, trade_type):
+        """Number of records of the given TradeType"""
+        return int(np.count_nonzero(self.types == trade_type))
+
+    def to_frame(self):
+        """Export as a pandas DataFrame with string type labels"""
+        import pandas as pd
+        return pd.DataFrame({
+            'time': self.times,
+            'type': _LABELS[self.types],
+            'price': self.prices,
+            'pnl': self.pnls
+        })
+
+    def to_arrow(self):
+        """Export as a pyarrow Table; numeric columns are zero-copy views"""
+        pa = _import_pyarrow()
+        return pa.table({
+            'time': pa.array(self.times),
+            'type': pa.array(self.types),
+            'price': pa.array(self.prices),
+            'pnl': pa.array(self.pnls)
+        })
+
+    def to_parquet(self, path):
+        """Write the log to a Parquet file"""
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), path)
+
+
+def curves_to_arrow(times, **columns):
+    """Build a pyarrow Table from per-bar float64 arrays without copying"""
+    pa = _import_pyarrow()
+    data = {'time': pa.array(np.asarray(times))}
+    for name, values in columns.items():
+        data[name] = pa.array(np.ascontiguousarray(values))
+    return pa.table(data)